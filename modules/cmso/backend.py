@@ -38,6 +38,8 @@ class CmsoBackend(BaseBackend, ICapBank):
     CONFIG = BackendConfig(ValueBackendPassword('login',    label='Identifiant', masked=False),
                            ValueBackendPassword('password', label='Mot de passe'))
     BROWSER = Cmso
+    # History pages are loaded one by one, newest transactions first.
+    SORTED_RESULTS = {'iter_history': ('date', True)}
 
     def create_default_browser(self):
         return self.create_browser(self.config['login'].get(),
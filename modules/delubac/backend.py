@@ -35,6 +35,8 @@ class DelubacBackend(BaseBackend, ICapBank):
     VERSION = '0.i'
 
     BROWSER = DelubacBrowser
+    # History pages are loaded one by one, newest transactions first.
+    SORTED_RESULTS = {'iter_history': ('date', True)}
 
     CONFIG = BackendConfig(ValueBackendPassword('login',    label='Identifiant', masked=False),
                            ValueBackendPassword('password', label='Mot de passe'))
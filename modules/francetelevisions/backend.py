@@ -18,6 +18,8 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from threading import local
+
 from weboob.capabilities.video import ICapVideo, BaseVideo
 from weboob.capabilities.collection import ICapCollection, CollectionNotFound
 from weboob.tools.backend import BaseBackend
@@ -36,6 +38,21 @@ class PluzzBackend(BaseBackend, ICapVideo, ICapCollection):
     DESCRIPTION = u'France Télévisions video website'
     LICENSE = 'AGPLv3+'
     BROWSER = PluzzBrowser
+    # Videos are filled by several threads, each one with its own browser.
+    FILL_WORKERS = 4
+
+    def __init__(self, *args, **kwargs):
+        BaseBackend.__init__(self, *args, **kwargs)
+        self._fill_browsers = local()
+
+    def get_fill_browser(self):
+        """
+        Get the browser of the current thread, used to fill videos.
+        """
+        browser = getattr(self._fill_browsers, 'browser', None)
+        if browser is None:
+            browser = self._fill_browsers.browser = self.create_default_browser()
+        return browser
 
     def get_video(self, _id):
         return self.browser.get_video(_id)
@@ -44,11 +61,12 @@ class PluzzBackend(BaseBackend, ICapVideo, ICapCollection):
         return self.browser.search_videos(pattern)
 
     def fill_video(self, video, fields):
+        browser = self.get_fill_browser()
         if fields != ['thumbnail']:
             # if we don't want only the thumbnail, we probably want also every fields
-            video = self.browser.get_video(video.id, video)
+            video = browser.get_video(video.id, video)
         if 'thumbnail' in fields and video.thumbnail:
-            video.thumbnail.data = self.browser.open(video.thumbnail.url).content
+            video.thumbnail.data = browser.open(video.thumbnail.url).content
 
         return video
 
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of WebNip.do() on fake in-process backends.
+
+Usage: bench_bcall.py [BACKENDS [RESULTS [CALLS [DELAY]]]]
+
+It reports the mean time of a call and the mean delay between the end of
+the last backend and the end of the iteration on results.
+"""
+
+from __future__ import print_function
+
+import sys
+from time import time, sleep
+
+from weboob.core.ouiboube import WebNip
+from weboob.tools.backend import BaseBackend
+
+
+class FakeBackend(BaseBackend):
+    NAME = 'fake'
+
+    def iter_results(self, count, delay, ends):
+        if delay:
+            sleep(delay)
+        for i in xrange(count):
+            yield i
+        ends.append(time())
+
+
+def main(nb_backends=50, nb_results=10, nb_calls=100, delay=0.0):
+    weboob = WebNip(modules_path=False)
+    for i in xrange(nb_backends):
+        name = 'fake%d' % i
+        weboob.backend_instances[name] = FakeBackend(weboob, name, {})
+
+    total = 0.0
+    tail = 0.0
+    try:
+        for i in xrange(nb_calls):
+            ends = []
+            start = time()
+            count = sum(1 for _ in weboob.do('iter_results', nb_results, delay, ends))
+            end = time()
+            assert count == nb_backends * nb_results
+
+            total += end - start
+            tail += end - max(ends)
+    finally:
+        weboob.deinit()
+
+    print('%d backends, %d results, %d calls' % (nb_backends, nb_results, nb_calls))
+    print('mean call:  %8.3f ms' % (total / nb_calls * 1000))
+    print('mean tail:  %8.3f ms' % (tail / nb_calls * 1000))
+    stats = getattr(weboob, 'pool', None)
+    if stats is not None:
+        print('pool: %r' % stats.get_stats())
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    types = (int, int, int, float)
+    main(*[t(a) for t, a in zip(types, args)])
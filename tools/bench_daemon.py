@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of calls served by the weboob daemon.
+
+Usage: bench_daemon.py [-n CALLS] [-r RESULTS] [-l LOGIN]
+
+A backend whose login takes LOGIN seconds (default: 1.0) is called CALLS
+times (default: 100), like a CLI run several times: once by building the
+backend and logging in for each call, and once through a daemon which
+keeps it logged in. The throughput of a call returning RESULTS
+transactions (default: 10000) through the daemon is also reported.
+"""
+
+from __future__ import print_function
+
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from optparse import OptionParser
+from threading import Thread
+from time import sleep, time
+
+from weboob.capabilities.bank import Transaction
+from weboob.core.daemon import DaemonClient, DaemonServer
+from weboob.core.ouiboube import WebNip
+
+
+class Backend(object):
+    SORTED_RESULTS = {}
+
+    def __init__(self, name, login):
+        self.name = name
+        self.login = login
+        self.logged = False
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, t, v, tb):
+        pass
+
+    def has_caps(self, caps):
+        return True
+
+    def iter_history(self, count):
+        if not self.logged:
+            sleep(self.login)
+            self.logged = True
+        for i in xrange(count):
+            tr = Transaction(i)
+            tr.date = date(2014, 1, 1 + i % 28)
+            tr.raw = u'CB CARREFOUR %d' % i
+            tr.label = u'CARREFOUR'
+            tr.amount = Decimal(i) / 100
+            yield tr
+
+
+def main():
+    parser = OptionParser('%prog [-n CALLS] [-r RESULTS] [-l LOGIN]')
+    parser.add_option('-n', '--calls', type='int', default=100)
+    parser.add_option('-r', '--results', type='int', default=10000)
+    parser.add_option('-l', '--login', type='float', default=1.0)
+    options, args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_bench_')
+    weboob = WebNip(modules_path=tmpdir)
+    weboob.workdir = tmpdir
+    try:
+        # Without daemon, each call builds a backend which logs in. Only
+        # one call is timed, as they all wait for the login.
+        start = time()
+        weboob.backend_instances = {'bank': Backend('bank', options.login)}
+        list(weboob.do('iter_history', 10))
+        cold = time() - start
+
+        weboob.backend_instances = {'bank': Backend('bank', options.login)}
+        server = DaemonServer(weboob)
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        client = DaemonClient(weboob)
+        list(client.do('iter_history', 10))
+
+        start = time()
+        for i in xrange(options.calls):
+            list(client.do('iter_history', 10))
+        warm = (time() - start) / options.calls
+
+        start = time()
+        count = len(list(client.do('iter_history', options.results)))
+        stream = time() - start
+
+        server.shutdown()
+        server.server_close()
+    finally:
+        weboob.pool.stop(wait=True)
+        shutil.rmtree(tmpdir)
+
+    print('call with login:     %8.1f ms' % (cold * 1000))
+    print('call through daemon: %8.1f ms' % (warm * 1000))
+    print('streaming:           %8.0f objects/s' % (count / stream))
+
+
+if __name__ == '__main__':
+    main()
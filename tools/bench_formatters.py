@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the export of transactions to a file with formatters.
+
+Usage: bench_formatters.py [-n COUNT] [FORMATTER...]
+
+COUNT transactions (default: 100000) are formatted, like with the -O
+option of applications, with each formatter (default: simple, csv,
+multiline, json, json_line, table).
+"""
+
+from __future__ import print_function
+
+import os
+import tempfile
+import warnings
+from datetime import date
+from decimal import Decimal
+from optparse import OptionParser
+from time import time
+
+from weboob.capabilities.bank import Transaction
+from weboob.tools.application.formatters.load import FormattersLoader
+
+
+DEFAULT_FORMATTERS = ['simple', 'csv', 'multiline', 'json', 'json_line', 'table']
+
+
+def build(count):
+    transactions = []
+    for i in xrange(count):
+        tr = Transaction(i)
+        tr.date = date(2014, 1, 1 + i % 28)
+        tr.rdate = tr.date
+        tr.vdate = tr.date
+        tr.type = Transaction.TYPE_CARD
+        tr.raw = u'CB CARREFOUR %d' % i
+        tr.category = u'Courses'
+        tr.label = u'CARREFOUR'
+        tr.amount = Decimal(i) / 100
+        tr.commission = Decimal(0)
+        tr.set_empty_fields(None)
+        transactions.append(tr)
+    return transactions
+
+
+def bench(name, transactions):
+    fd, path = tempfile.mkstemp(prefix='weboob_bench_')
+    os.close(fd)
+    try:
+        formatter = FormattersLoader().build_formatter(name)
+        formatter.outfile = path
+
+        start = time()
+        formatter.start_format()
+        for tr in transactions:
+            formatter.format(tr)
+        formatter.flush()
+        flush_output = getattr(formatter, 'flush_output', None)
+        if flush_output is not None:
+            flush_output()
+        formatter.outfile = None
+        elapsed = time() - start
+
+        return elapsed, os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = OptionParser('%prog [-n COUNT] [FORMATTER...]')
+    parser.add_option('-n', '--count', type='int', default=100000)
+    options, formatters = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    transactions = build(options.count)
+    for name in formatters or DEFAULT_FORMATTERS:
+        elapsed, size = bench(name, transactions)
+        print('%-10s %8.0f objects/s %8.1f MB/s' % (name, len(transactions) / elapsed, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the construction, the memory usage and the access to fields
+of CapBaseObject instances.
+
+Usage: bench_objects.py [COUNT]
+
+COUNT transactions (default: 200000) are built and kept in memory. The
+memory usage is the growth of the resident set size of the process, so
+it is only available on Linux.
+"""
+
+from __future__ import print_function
+
+import gc
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+from time import time
+
+from weboob.capabilities.bank import Transaction
+
+
+def get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except IOError:
+        return None
+
+
+def build(count):
+    transactions = []
+    for i in xrange(count):
+        tr = Transaction(i)
+        tr.date = date(2014, 1, 1 + i % 28)
+        tr.rdate = tr.date
+        tr.type = Transaction.TYPE_CARD
+        tr.raw = u'CB CARREFOUR %d' % i
+        tr.label = u'CARREFOUR'
+        tr.amount = Decimal(i) / 100
+        transactions.append(tr)
+    return transactions
+
+
+def main(count=200000):
+    gc.collect()
+    rss = get_rss()
+
+    start = time()
+    transactions = build(count)
+    elapsed = time() - start
+
+    gc.collect()
+    if rss is not None:
+        rss = get_rss() - rss
+
+    start = time()
+    total = Decimal(0)
+    for tr in transactions:
+        total += tr.amount
+        tr.label, tr.category, tr.date
+    read = time() - start
+
+    start = time()
+    for tr in transactions:
+        list(tr.iter_fields())
+    iterate = time() - start
+
+    print('%d transactions' % count)
+    print('construction:  %8.2f us/object' % (elapsed * 1e6 / count))
+    if rss is not None:
+        print('memory:        %8.0f bytes/object' % (float(rss) / count))
+    print('read 4 fields: %8.2f us/object' % (read * 1e6 / count))
+    print('iter_fields:   %8.2f us/object' % (iterate * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the navigation on pages of a PagesBrowser, and of the parsing
+of a large XML export.
+
+Usage: bench_pages.py [-n PAGES] [-r ROWS]
+
+The browser goes on PAGES HTML pages (default: 200) of ROWS rows (default:
+2000), served from memory, and only checks on which page it is, like
+during a login. Then an XML export of 50 times more rows is read with
+page.doc and with page.iterparse().
+
+Each benchmark is run in a new process, to report its own peak memory
+usage.
+"""
+
+from __future__ import print_function
+
+import resource
+import subprocess
+import sys
+from datetime import timedelta
+from optparse import OptionParser
+from time import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+from weboob.tools.browser2.page import HTMLPage, PagesBrowser, URL, XMLPage
+
+
+class MemoryAdapter(BaseAdapter):
+    def __init__(self, content, content_type):
+        super(MemoryAdapter, self).__init__()
+        self.content = content
+        self.content_type = content_type
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = self.content_type
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response._content = self.content
+        response._content_consumed = True
+        response.request = request
+        response.elapsed = timedelta(0)
+        return response
+
+    def close(self):
+        pass
+
+
+class ListPage(HTMLPage):
+    pass
+
+
+class ExportPage(XMLPage):
+    pass
+
+
+class Browser(PagesBrowser):
+    BASEURL = 'http://example.org'
+
+    list = URL('/list/(?P<num>\d+)', ListPage)
+    export = URL('/export\.xml', ExportPage)
+
+    def __init__(self, content, content_type):
+        super(Browser, self).__init__()
+        self.session.mount('http://', MemoryAdapter(content, content_type))
+
+
+def navigate(pages, rows):
+    content = '<html><body><table>%s</table></body></html>' % ''.join(
+              '<tr><td>%d</td><td>label %d</td><td>%d.00</td></tr>' % (i, i, i) for i in xrange(rows))
+    b = Browser(content, 'text/html')
+    history = []
+    for i in xrange(pages):
+        b.list.go(num=i)
+        assert b.list.is_here()
+        history.append(b.page)
+
+
+def export(rows, mode):
+    content = '<?xml version="1.0"?><operations>%s</operations>' % ''.join(
+              '<operation id="%d"><label>label %d</label><amount>%d.00</amount></operation>' % (i, i, i)
+              for i in xrange(rows))
+    b = Browser(content, 'text/xml')
+    page = b.export.go()
+    if mode == 'doc':
+        elements = page.doc.xpath('//operation')
+    else:
+        elements = page.iterparse('operation')
+    total = 0
+    for el in elements:
+        total += float(el.find('amount').text)
+    return total
+
+
+def child(mode, pages, rows):
+    start = time()
+    if mode == 'navigate':
+        navigate(pages, rows)
+    else:
+        export(rows * 50, mode)
+    elapsed = time() - start
+    print('%f %d' % (elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main():
+    parser = OptionParser('%prog [-n PAGES] [-r ROWS]')
+    parser.add_option('-n', '--pages', type='int', default=200)
+    parser.add_option('-r', '--rows', type='int', default=2000)
+    parser.add_option('--child', help='internal option')
+    options, args = parser.parse_args()
+
+    if options.child:
+        child(options.child, options.pages, options.rows)
+        return
+
+    for mode, title in (('navigate', '%d pages' % options.pages),
+                        ('doc', 'export with doc'),
+                        ('iterparse', 'export with iterparse')):
+        out = subprocess.check_output([sys.executable, __file__, '--child', mode,
+                                       '-n', str(options.pages), '-r', str(options.rows)])
+        elapsed, maxrss = out.split()
+        print('%-22s %8.1f ms %8.1f MB peak' % (title + ':', float(elapsed) * 1000, int(maxrss) / 1024.))
+
+
+if __name__ == '__main__':
+    main()
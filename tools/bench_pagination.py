@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the pagination of a list, with and without prefetching of
+the next page.
+
+Usage: bench_pagination.py [-p PAGES] [-r ROWS] [-l LATENCY] [-w WORK]
+
+A local server serves PAGES pages (default: 20) of ROWS rows (default: 50),
+each one after LATENCY ms (default: 100), and sets a cookie. Each row is
+processed during WORK ms (default: 2) by the caller. Results of both modes
+are checked to be the same.
+"""
+
+from __future__ import print_function
+
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from optparse import OptionParser
+from SocketServer import ThreadingMixIn
+from threading import Thread
+
+from weboob.capabilities.base import CapBaseObject
+from weboob.tools.browser2.filters import CleanText, Link
+from weboob.tools.browser2.page import HTMLPage, ItemElement, ListElement, PagesBrowser, URL, method, pagination
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(pages, rows, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            num = int(self.path.rsplit('/', 1)[1])
+            time.sleep(latency)
+            items = ''.join('<li>%d.%d</li>' % (num, i) for i in xrange(rows))
+            link = '<a class="next" href="/list/%d">next</a>' % (num + 1) if num + 1 < pages else ''
+            content = '<html><body><ul>%s</ul>%s</body></html>' % (items, link)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('Set-Cookie', 'page=%d; Path=/' % num)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class Rows(ListElement):
+    item_xpath = '//li'
+    next_page = Link('//a[@class="next"]')
+
+    class item(ItemElement):
+        klass = CapBaseObject
+
+        obj_id = CleanText('.')
+
+
+class PrefetchRows(Rows):
+    prefetch_next_page = True
+
+
+class ListPage(HTMLPage):
+    iter_rows = pagination(method(Rows))
+    iter_rows_prefetch = pagination(method(PrefetchRows))
+
+
+def bench(server, method, work):
+    class Browser(PagesBrowser):
+        BASEURL = 'http://127.0.0.1:%d' % server.server_address[1]
+        list = URL('/list/(?P<num>\d+)', ListPage)
+
+    b = Browser()
+    start = time.time()
+    b.list.go(num=0)
+    ids = []
+    for obj in getattr(b.page, method)():
+        # check that cookies are the ones of the current page
+        assert b.session.cookies['page'] == obj.id.split('.')[0]
+        ids.append(obj.id)
+        time.sleep(work)
+    return time.time() - start, ids
+
+
+def main():
+    parser = OptionParser('%prog [-p PAGES] [-r ROWS] [-l LATENCY] [-w WORK]')
+    parser.add_option('-p', '--pages', type='int', default=20)
+    parser.add_option('-r', '--rows', type='int', default=50)
+    parser.add_option('-l', '--latency', type='float', default=100.0)
+    parser.add_option('-w', '--work', type='float', default=2.0)
+    options, args = parser.parse_args()
+
+    server = serve(options.pages, options.rows, options.latency / 1000)
+    try:
+        serial, expected = bench(server, 'iter_rows', options.work / 1000)
+        prefetch, ids = bench(server, 'iter_rows_prefetch', options.work / 1000)
+    finally:
+        server.shutdown()
+
+    assert ids == expected and len(ids) == options.pages * options.rows
+    print('%d pages of %d rows' % (options.pages, options.rows))
+    print('serial:   %8.1f ms' % (serial * 1000))
+    print('prefetch: %8.1f ms' % (prefetch * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the parsing of a transactions table with browser2 elements.
+
+Usage: bench_parsing.py [-n RUNS] [-r ROWS] [-e ENV] [FILE...]
+
+Each FILE is a saved HTML page (for example from a directory written with
+the save_responses option) with a table of transactions with Date, Label
+and Amount columns. Without any file, a page of ROWS generated
+transactions is used. ENV is the number of parameters of the page, which
+are in the environment of every elements.
+
+The time to create an item element, without parsing anything, is also
+reported.
+"""
+
+from __future__ import print_function
+
+import random
+from datetime import date, timedelta
+from optparse import OptionParser
+from time import time
+
+from weboob.capabilities.bank import Transaction
+from weboob.tools.browser2.filters import CleanDecimal, CleanText, Date, TableCell
+from weboob.tools.browser2.page import HTMLPage, ItemElement, ListElement, TableElement, method
+
+
+class FakeResponse(object):
+    encoding = 'utf-8'
+
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+
+
+class FakeBrowser(object):
+    logger = None
+
+
+class TransactionsPage(HTMLPage):
+    @method
+    class iter_history(TableElement):
+        head_xpath = '//table//thead//th'
+        item_xpath = '//table//tbody/tr'
+
+        col_date = [u'Date', u'Date opération']
+        col_label = [u'Label', u'Libellé', u'Opération']
+        col_amount = [u'Amount', u'Montant']
+
+        class item(ItemElement):
+            klass = Transaction
+
+            obj_date = Date(CleanText(TableCell('date')), dayfirst=True)
+            obj_raw = CleanText(TableCell('label'))
+            obj_amount = CleanDecimal(TableCell('amount'))
+
+            def obj_label(self):
+                return self.obj.raw.title()
+
+
+def generate(rows):
+    labels = [u'CB CARREFOUR %s', u'PRLV SEPA EDF %s', u'VIR SALAIRE %s', u'CHQ %s', u'RETRAIT DAB %s']
+    lines = []
+    day = date(2014, 1, 1)
+    for i in xrange(rows):
+        day += timedelta(days=random.randint(0, 1))
+        lines.append(u'<tr><td>%s</td><td>%s</td><td>%s</td></tr>' % (
+                     day.strftime('%d/%m/%Y'),
+                     random.choice(labels) % i,
+                     (u'%.2f' % random.uniform(-500, 500)).replace('.', ',')))
+    return (u'<html><body><table><thead><tr><th>Date</th><th>Libellé</th><th>Montant</th></tr></thead>'
+            u'<tbody>%s</tbody></table></body></html>' % u'\n'.join(lines)).encode('utf-8')
+
+
+def bench(content, runs, env_size):
+    params = dict(('param%d' % i, u'value %d' % i) for i in xrange(env_size))
+    page = TransactionsPage(FakeBrowser(), FakeResponse('http://example.org/', content), params)
+    best = None
+    for i in xrange(runs):
+        start = time()
+        count = len(list(page.iter_history()))
+        elapsed = time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def bench_elements(env_size, count=10000):
+    params = dict(('param%d' % i, u'value %d' % i) for i in xrange(env_size))
+    page = TransactionsPage(FakeBrowser(), FakeResponse('http://example.org/', '<html></html>'), params)
+    parent = ListElement(page)
+    start = time()
+    for i in xrange(count):
+        ItemElement(page, parent)
+    return (time() - start) / count
+
+
+def main():
+    parser = OptionParser('%prog [-n RUNS] [-r ROWS] [-e ENV] [FILE...]')
+    parser.add_option('-n', '--runs', type='int', default=5)
+    parser.add_option('-r', '--rows', type='int', default=5000)
+    parser.add_option('-e', '--env', type='int', default=5)
+    options, files = parser.parse_args()
+
+    pages = []
+    for filename in files:
+        with open(filename, 'rb') as f:
+            pages.append((filename, f.read()))
+    if not pages:
+        random.seed(0)
+        pages.append(('%d generated rows' % options.rows, generate(options.rows)))
+
+    for name, content in pages:
+        count, elapsed = bench(content, options.runs, options.env)
+        print('%s: %d transactions in %.1f ms (%.1f us/row)' % (name, count, elapsed * 1000,
+                                                              elapsed * 1e6 / count if count else 0))
+    print('item element creation: %.1f us' % (bench_elements(options.env) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of a module, without any network, on responses it has saved.
+
+Usage: bench_replay.py [-n RUNS] DIR APPLICATION [ARGS...]
+
+First, record a session with the -a option of an application:
+
+    $ boobank -b bnporc -a list
+    Debug data will be saved in this directory: /tmp/weboob_session_XXXX
+
+Then, the same command is run RUNS times (default: 5) with the
+--replay-responses option, so every request is served from DIR, and the
+best time is reported:
+
+    $ tools/bench_replay.py /tmp/weboob_session_XXXX boobank -b bnporc list
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+from optparse import OptionParser
+from time import time
+
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+
+def count_responses(dirname):
+    count = 0
+    for path, dirnames, filenames in os.walk(dirname):
+        if 'url_response_match.txt' in filenames:
+            with open(os.path.join(path, 'url_response_match.txt')) as f:
+                count += sum(1 for line in f if '\t' in line and not line.startswith('#'))
+    return count
+
+
+def run(dirname, application, args, runs):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, env.get('PYTHONPATH', '')])
+    script = os.path.join(ROOT, 'scripts', application)
+    if not os.path.exists(script):
+        script = application
+    command = [sys.executable, script, '--replay-responses', dirname] + args
+
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for i in xrange(runs):
+            start = time()
+            subprocess.check_call(command, env=env, stdout=devnull)
+            elapsed = time() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = OptionParser('%prog [-n RUNS] DIR APPLICATION [ARGS...]')
+    parser.add_option('-n', '--runs', type='int', default=5)
+    parser.disable_interspersed_args()
+    options, args = parser.parse_args()
+    if len(args) < 2:
+        parser.error('a directory and an application are required')
+
+    dirname, application, args = args[0], args[1], args[2:]
+    responses = count_responses(dirname)
+    elapsed = run(dirname, application, args, options.runs)
+    print('%s: %.1f ms, %d saved responses (%.1f responses/s)' % (' '.join([application] + args), elapsed * 1000,
+                                                                   responses, responses / elapsed))
+
+
+if __name__ == '__main__':
+    main()
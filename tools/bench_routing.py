@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the routing of responses to pages, and of the building of
+urls, in a PagesBrowser.
+
+Usage: bench_routing.py [-n COUNT] [-u URLS]
+
+A browser with URLS URL objects (default: 60) is declared, some of them on
+other hosts than BASEURL. COUNT urls (default: 20000), of every pages and
+of unknown pages, are routed with the routing table of the browser and
+with a linear scan of URL objects, and the results are checked to be the
+same. Then COUNT urls are built.
+"""
+
+from __future__ import print_function
+
+import re
+from optparse import OptionParser
+from time import time
+
+from weboob.tools.browser2.page import HTMLPage, PagesBrowser, URL
+
+
+class Page(HTMLPage):
+    pass
+
+
+def declare(count):
+    attrs = {'BASEURL': 'https://www.example.org/'}
+    for i in xrange(count):
+        if i % 5 == 4:
+            regexps = [r'https://secure%d\.example\.com/auth/step(?P<step>\d+)\.do' % i]
+        elif i % 5 == 3:
+            regexps = [r'/accounts/(?P<account>\w+)/page%d\.html\?p=(?P<page>\d+)' % i,
+                       r'/accounts/page%d\.html' % i]
+        else:
+            regexps = [r'/section%d/(?P<id>\d+)\.html' % i]
+        attrs['url%d' % i] = URL(*(regexps + [Page]))
+    return type('Browser', (PagesBrowser,), attrs)
+
+
+def urls(browser, count):
+    names = list(browser._urls)
+    result = []
+    for i in xrange(count):
+        name = names[i % len(names)]
+        index = int(name[3:])
+        if i % 10 == 9:
+            result.append('https://www.example.org/unknown/%d.html' % i)
+        elif index % 5 == 4:
+            result.append('https://secure%d.example.com/auth/step%d.do' % (index, i % 3))
+        elif index % 5 == 3:
+            result.append('https://www.example.org/accounts/a%d/page%d.html?p=%d' % (i, index, i))
+        else:
+            result.append('https://www.example.org/section%d/%d.html' % (index, i))
+    return result
+
+
+def linear_route(browser, url):
+    # how PagesBrowser.open used to find the page of a response
+    for name, url_obj in browser._urls.iteritems():
+        for regex in url_obj.urls:
+            if not re.match(r'^\w+://.*', regex):
+                regex = re.escape(browser.BASEURL).rstrip('/') + '/' + regex.lstrip('/')
+            m = re.match(regex, url)
+            if m:
+                return name, m.groupdict()
+
+
+def table_route(browser, url):
+    for name, m in browser.get_router().iter_matches(url):
+        return name, m.groupdict()
+
+
+def bench(func, *args):
+    start = time()
+    result = func(*args)
+    return time() - start, result
+
+
+def main():
+    parser = OptionParser('%prog [-n COUNT] [-u URLS]')
+    parser.add_option('-n', '--count', type='int', default=20000)
+    parser.add_option('-u', '--urls', type='int', default=60)
+    options, args = parser.parse_args()
+
+    browser = declare(options.urls)()
+    targets = urls(browser, options.count)
+
+    linear, expected = bench(lambda: [linear_route(browser, url) for url in targets])
+    table, routed = bench(lambda: [table_route(browser, url) for url in targets])
+    assert routed == expected
+    print('%d urls, %d routes' % (options.urls, options.count))
+    print('linear scan:   %8.1f us/route' % (linear * 1e6 / options.count))
+    print('routing table: %8.1f us/route' % (table * 1e6 / options.count))
+
+    url_objs = list(browser._urls.itervalues())
+    builds = []
+    for i in xrange(options.count):
+        url_obj = url_objs[i % len(url_objs)]
+        if url_obj.urls[0].startswith('/accounts/'):
+            builds.append((url_obj, {}))
+        elif url_obj.urls[0].startswith('/'):
+            builds.append((url_obj, {'id': i}))
+        else:
+            builds.append((url_obj, {'step': i}))
+    elapsed, _ = bench(lambda: [url_obj.build(**kwargs) for url_obj, kwargs in builds])
+    print('build:         %8.1f us/url' % (elapsed * 1e6 / options.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the startup of an application: create the Weboob object and
+load backends, with and without lazy loading.
+
+Usage: bench_startup.py [-n RUNS] [-c CAPABILITY] [MODULE...]
+
+Modules are copied in a temporary repository, and a backend with dummy
+parameters is configured for each of them. Each run is made in a new
+process, so modules are really imported.
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from optparse import OptionParser
+
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+DEFAULT_MODULES = ['banqueaccord', 'carrefourbanque', 'creditmutuel', 'groupamaes', 'hsbc', 'ing']
+
+RUN = """
+import sys
+from time import time
+start = time()
+from weboob.core import Weboob
+weboob = Weboob(workdir=sys.argv[1])
+weboob.load_backends(caps=[sys.argv[2]], lazy=sys.argv[3] == 'lazy')
+end = time()
+print('%f %d %d' % (end - start, len(weboob.backend_instances), len(weboob.modules_loader.loaded)))
+"""
+
+
+def setup(tmpdir, modules):
+    repo = os.path.join(tmpdir, 'modules')
+    workdir = os.path.join(tmpdir, 'workdir')
+    os.makedirs(repo)
+    os.makedirs(workdir)
+    for name in modules:
+        shutil.copytree(os.path.join(ROOT, 'modules', name), os.path.join(repo, name))
+
+    with open(os.path.join(workdir, 'sources.list'), 'w') as f:
+        f.write('file://%s\n' % repo)
+
+    from weboob.core import Weboob
+    from weboob.core.repositories import IProgress
+
+    class QuietProgress(IProgress):
+        def progress(self, percent, message):
+            pass
+
+    weboob = Weboob(workdir=workdir)
+    weboob.update(QuietProgress())
+    with open(weboob.backends_config.confpath, 'w') as f:
+        for name in modules:
+            minfo = weboob.repositories.get_module_info(name)
+            if minfo is None:
+                continue
+            f.write('[%s]\n_module = %s\n' % (name, name))
+            for key in minfo.config or ():
+                f.write('%s = dummy\n' % key.rstrip('*'))
+    os.chmod(weboob.backends_config.confpath, 0o600)
+
+    return workdir
+
+
+def run(workdir, cap, mode, runs):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, env.get('PYTHONPATH', '')])
+    results = []
+    for i in xrange(runs):
+        out = subprocess.check_output([sys.executable, '-c', RUN, workdir, cap, mode], env=env)
+        elapsed, backends, modules = out.split()
+        results.append((float(elapsed), int(backends), int(modules)))
+    return min(results)
+
+
+def main():
+    parser = OptionParser('%prog [-n RUNS] [-c CAPABILITY] [MODULE...]')
+    parser.add_option('-n', '--runs', type='int', default=5)
+    parser.add_option('-c', '--cap', default='ICapBank')
+    options, modules = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_bench_')
+    try:
+        workdir = setup(tmpdir, modules or DEFAULT_MODULES)
+        for mode in ('eager', 'lazy'):
+            elapsed, backends, imported = run(workdir, options.cap, mode, options.runs)
+            print('%-5s: %8.1f ms, %d backends, %d modules imported' % (mode, elapsed * 1000, backends, imported))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
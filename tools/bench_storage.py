@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmark of the save of a storage, with YAML (StandardStorage) and
+SQLite (SQLiteStorage).
+
+Usage: bench_storage.py [-n RUNS] [SIZE...]
+
+A backend storage is filled with SIZE (default: 1000, 10000, 100000)
+seen threads, like with monboob. Then, RUNS times, a thread is marked as
+seen and the storage is saved. The 'exposed' column is the same after a
+get() of the whole 'seen' tree, which must not make SQLiteStorage write it
+again. The 'append' column is the save after appending an id to a list of
+SIZE ids, like the 'seen' list of newsfeed.
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+from optparse import OptionParser
+from time import time
+
+from weboob.tools.storage import StandardStorage, SQLiteStorage
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def populate(storage, size):
+    storage.load('backends', 'bench', {'seen': {}, 'ids': []})
+    for i in xrange(size):
+        storage.set('backends', 'bench', 'seen', u'thread%d' % i, 'comments', [i, i + 1])
+    storage.set('backends', 'bench', 'ids', [u'id%d' % i for i in xrange(size)])
+    storage.save('backends', 'bench')
+
+
+def bench(storage, size, runs, exposed=False):
+    timings = []
+    for i in xrange(runs):
+        if exposed:
+            u'thread0' in storage.get('backends', 'bench', 'seen')
+        storage.set('backends', 'bench', 'seen', u'new%d' % i, 'comments', [i])
+        start = time()
+        storage.save('backends', 'bench')
+        timings.append(time() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def bench_append(storage, runs):
+    timings = []
+    for i in xrange(runs):
+        storage.get('backends', 'bench', 'ids').append(u'new%d' % i)
+        start = time()
+        storage.save('backends', 'bench')
+        timings.append(time() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = OptionParser('%prog [-n RUNS] [SIZE...]')
+    parser.add_option('-n', '--runs', type='int', default=5)
+    options, sizes = parser.parse_args()
+
+    print('%-8s %-8s %12s %12s %12s %12s' % ('storage', 'keys', 'load', 'save', 'exposed', 'append'))
+    tmpdir = tempfile.mkdtemp(prefix='weboob_bench_')
+    try:
+        for size in [int(s) for s in sizes] or DEFAULT_SIZES:
+            for name, klass in (('yaml', StandardStorage), ('sqlite', SQLiteStorage)):
+                path = os.path.join(tmpdir, '%s-%d' % (name, size))
+                populate(klass(path), size)
+
+                start = time()
+                storage = klass(path)
+                storage.load('backends', 'bench', {'seen': {}, 'ids': []})
+                load = time() - start
+
+                save = bench(storage, size, options.runs)
+                exposed = bench(storage, size, options.runs, exposed=True)
+                append = bench_append(storage, options.runs)
+                print('%-8s %-8d %9.1f ms %9.1f ms %9.1f ms %9.1f ms' % (name, size, load * 1000, save * 1000,
+                                                                         exposed * 1000, append * 1000))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmark of the matching of transaction labels against the PATTERNS of
+bank modules.
+
+Usage: bench_transactions.py [-n COUNT] [MODULE...]
+
+PATTERNS lists are read from the sources of modules (default: all), and
+COUNT labels (default: 20000) are matched against each of them, by trying
+every pattern in order, and with FrenchTransaction's PatternsMatcher.
+Both must find the same pattern.
+"""
+
+from __future__ import print_function
+
+import ast
+import os
+import random
+import re
+from optparse import OptionParser
+from time import time
+
+from weboob.tools.capabilities.bank.transactions import FrenchTransaction, PatternsMatcher
+
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+LABELS = [u'CB CARREFOUR MARKET 12/03',
+          u'CARTE X1234 12/03 AUCHAN',
+          u'PAIEMENT CB 1203 PARIS SNCF',
+          u'FACTURE CARTE DU 120314 MONOPRIX CARTE 4974XXXXXXXX1234',
+          u'RETRAIT DAB 1203 PARIS CARTE 1234',
+          u'RET DAB 12/03/14 BNP PARIBAS',
+          u'VIR SEPA M. DUPONT',
+          u'VIREMENT RECU DE MME MARTIN',
+          u'VIR RECU 1234567 DE: SALAIRE',
+          u'PRLV SEPA EDF CLIENTS PARTICULIERS',
+          u'PRELEVEMENT FREE MOBILE',
+          u'CHEQUE 1234567',
+          u'CHQ. 1234567',
+          u'REMISE CHEQUES 12345',
+          u'REM CHQ 12345',
+          u'COTIS CARTE VISA',
+          u'F COTIS EUROCOMPTE',
+          u'FRAIS TENUE DE COMPTE',
+          u'INTERETS CREDITEURS',
+          u'ECHEANCE PRET 12345678',
+          u'AVOIR CB AMAZON',
+          u'DEPOT ESPECES',
+          u'TIP ORANGE',
+          u'ASSURANCE HABITATION',
+          u'IMPOT REVENUS 2013',
+         ]
+
+
+def iter_patterns(modules):
+    """
+    Find PATTERNS assignments in classes of modules sources.
+    """
+    for name in modules:
+        path = os.path.join(ROOT, 'modules', name)
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                if not filename.endswith('.py'):
+                    continue
+                filename = os.path.join(dirpath, filename)
+                with open(filename) as f:
+                    source = f.read()
+                if 'PATTERNS' not in source:
+                    continue
+                for node in ast.walk(ast.parse(source, filename)):
+                    if not isinstance(node, ast.ClassDef):
+                        continue
+                    for stmt in node.body:
+                        if isinstance(stmt, ast.Assign) and \
+                           any(isinstance(t, ast.Name) and t.id == 'PATTERNS' for t in stmt.targets):
+                            try:
+                                patterns = eval(compile(ast.Expression(stmt.value), filename, 'eval'),
+                                                {'re': re, 'FrenchTransaction': FrenchTransaction,
+                                                 'Transaction': FrenchTransaction})
+                            except Exception:
+                                continue
+                            yield '%s.%s' % (name, node.name), patterns
+
+
+def sequential(patterns, text):
+    for pattern, value in patterns:
+        m = pattern.match(text)
+        if m:
+            return m, value
+    return None, None
+
+
+def bench(function, labels):
+    start = time()
+    results = [function(label) for label in labels]
+    return time() - start, results
+
+
+def main():
+    parser = OptionParser('%prog [-n COUNT] [MODULE...]')
+    parser.add_option('-n', '--count', type='int', default=20000)
+    options, modules = parser.parse_args()
+
+    random.seed(0)
+    labels = [random.choice(LABELS) for i in xrange(options.count)]
+
+    total_seq = total_idx = 0
+    for name, patterns in iter_patterns(sorted(modules or os.listdir(os.path.join(ROOT, 'modules')))):
+        matcher = PatternsMatcher(patterns)
+        seq, expected = bench(lambda text: sequential(patterns, text), labels)
+        idx, results = bench(matcher.match, labels)
+        assert [v for m, v in results] == [v for m, v in expected], name
+        assert [m and m.re for m, v in results] == [m and m.re for m, v in expected], name
+        total_seq += seq
+        total_idx += idx
+        print('%-45s %3d patterns %6.2f us %6.2f us' % (name, len(patterns), seq * 1e6 / len(labels),
+                                                        idx * 1e6 / len(labels)))
+    print('%-45s              %6.2f us %6.2f us' % ('total', total_seq * 1e6 / len(labels),
+                                                    total_idx * 1e6 / len(labels)))
+
+
+if __name__ == '__main__':
+    main()
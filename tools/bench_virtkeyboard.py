@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmark of the decoding of virtual keyboards.
+
+Usage: bench_virtkeyboard.py [-n RUNS] [-g COLSxROWS] [-c COLOR] [FILE...]
+
+Each FILE is a keyboard image, split in a grid of COLS x ROWS keys, whose
+symbols are in COLOR (hexadecimal RGB, default: 000000). Without any file,
+a keyboard of 4x4 keys with random digits is generated.
+
+The time to build a VirtKeyboard is measured without and with the cache of
+decoded images.
+"""
+
+from __future__ import print_function
+
+import random
+from optparse import OptionParser
+from StringIO import StringIO
+from time import time
+
+from PIL import Image, ImageDraw
+
+from weboob.tools.captcha.virtkeyboard import VirtKeyboard
+
+
+def generate(cols, rows, size=60):
+    img = Image.new('RGB', (cols * size, rows * size), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for i in xrange(cols * rows):
+        x, y = (i % cols) * size, (i // cols) * size
+        draw.rectangle((x + 2, y + 2, x + size - 3, y + size - 3), outline=(180, 180, 180), fill=(240, 240, 240))
+        draw.text((x + random.randint(10, size - 20), y + random.randint(10, size - 20)),
+                  str(random.randint(0, 9)), fill=(0, 0, 0))
+    f = StringIO()
+    img.save(f, 'PNG')
+    return f.getvalue()
+
+
+def get_coords(data, cols, rows):
+    width, height = Image.open(StringIO(data)).size
+    w, h = width // cols, height // rows
+    return dict(('%d' % i, ((i % cols) * w, (i // cols) * h, (i % cols + 1) * w - 1, (i // cols + 1) * h - 1))
+                for i in xrange(cols * rows))
+
+
+def bench(data, coords, color, runs, cache):
+    VirtKeyboard.CACHE_SIZE = 20 if cache else 0
+    best = None
+    for i in xrange(runs):
+        start = time()
+        VirtKeyboard(StringIO(data), coords, color)
+        elapsed = time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = OptionParser('%prog [-n RUNS] [-g COLSxROWS] [-c COLOR] [FILE...]')
+    parser.add_option('-n', '--runs', type='int', default=20)
+    parser.add_option('-g', '--grid', default='4x4')
+    parser.add_option('-c', '--color', default='000000')
+    options, files = parser.parse_args()
+
+    cols, rows = [int(v) for v in options.grid.split('x')]
+    color = tuple(int(options.color[i:i + 2], 16) for i in (0, 2, 4))
+
+    images = []
+    for filename in files:
+        with open(filename, 'rb') as f:
+            images.append((filename, f.read()))
+    if not images:
+        random.seed(0)
+        images.append(('generated %dx%d keyboard' % (cols, rows), generate(cols, rows)))
+
+    for name, data in images:
+        coords = get_coords(data, cols, rows)
+        print('%s: %.2f ms, %.2f ms with cache' % (name,
+                                                   bench(data, coords, color, options.runs, False) * 1000,
+                                                   bench(data, coords, color, options.runs, True) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Migrate the storage of an application from a YAML file to a SQLite
+database, used by weboob.tools.storage.SQLiteStorage.
+
+Usage: migrate_storage.py SOURCE [DEST]
+
+SOURCE is the YAML file (for example ~/.config/weboob/monboob.storage)
+and DEST the database, by default SOURCE with a .db suffix. Namespaces
+already in DEST are replaced.
+"""
+
+from __future__ import print_function
+
+import sys
+
+from weboob.tools.storage import SQLiteStorage
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print('Usage: %s SOURCE [DEST]' % sys.argv[0], file=sys.stderr)
+        return 1
+
+    source = sys.argv[1]
+    dest = sys.argv[2] if len(sys.argv) > 2 else source + '.db'
+
+    storage = SQLiteStorage(dest)
+    try:
+        count = storage.import_yaml(source)
+    except IOError as e:
+        print('Unable to read %s: %s' % (source, e), file=sys.stderr)
+        return 1
+    finally:
+        storage.close()
+
+    print('%d namespaces imported from %s to %s' % (count, source, dest))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -33,7 +33,7 @@ import subprocess
 import socket
 
 from weboob.core import Weboob, CallErrors
-from weboob.core.scheduler import Scheduler
+from weboob.core.scheduler import HeapScheduler
 from weboob.capabilities.messages import ICapMessages, ICapMessagesPost, Thread, Message
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.misc import html2text, get_backtrace, utc2local, to_unicode
@@ -52,9 +52,9 @@ class FakeSMTPD(SMTPServer):
         self.app.process_incoming_mail(msg)
 
 
-class MonboobScheduler(Scheduler):
+class MonboobScheduler(HeapScheduler):
     def __init__(self, app):
-        Scheduler.__init__(self)
+        HeapScheduler.__init__(self)
         self.app = app
 
     def run(self):
@@ -70,19 +70,13 @@ class MonboobScheduler(Scheduler):
                 self.logger.error('Unable to start the SMTP daemon: %s' % e)
                 return False
 
-        # XXX Fuck, we shouldn't copy this piece of code from
-        # weboob.scheduler.Scheduler.run().
-        try:
-            while True:
-                self.stop_event.wait(0.1)
-                if self.app.options.smtpd:
-                    asyncore.loop(timeout=0.1, count=1)
-        except KeyboardInterrupt:
-            self._wait_to_stop()
-            raise
+        return HeapScheduler.run(self)
+
+    def idle(self):
+        if self.app.options.smtpd:
+            asyncore.loop(timeout=1, count=1)
         else:
-            self._wait_to_stop()
-        return True
+            HeapScheduler.idle(self)
 
 
 class Monboob(ReplApplication):
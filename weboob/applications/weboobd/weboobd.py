@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+import signal
+import sys
+
+from weboob.core.daemon import DaemonError, DaemonServer
+from weboob.tools.application.base import BaseApplication
+
+
+__all__ = ['Weboobd']
+
+
+class Weboobd(BaseApplication):
+    APPNAME = 'weboobd'
+    VERSION = '0.i'
+    COPYRIGHT = 'Copyright(C) 2014 Romain Bignon'
+    DESCRIPTION = "Weboobd is a daemon which keeps backends loaded and logged in, " \
+                  "and serves calls of console applications run with the --daemon option."
+    SHORT_DESCRIPTION = "serve backends to applications"
+
+    def __init__(self, option_parser=None):
+        super(Weboobd, self).__init__(option_parser)
+        self._parser.add_option('--socket', help='path of the socket (default: daemon.sock in the weboob directory)')
+
+    def main(self, argv):
+        self.load_backends(lazy=True)
+
+        try:
+            server = DaemonServer(self.weboob, self.options.socket)
+        except DaemonError as e:
+            print >>sys.stderr, e
+            return 1
+
+        def stop(signum, frame):
+            sys.exit(0)
+        signal.signal(signal.SIGTERM, stop)
+
+        logging.info(u'Listening on %s' % server.server_address)
+        try:
+            server.serve_forever()
+        finally:
+            # Sessions of backends are saved when the application is
+            # deinitialized.
+            server.server_close()
@@ -24,7 +24,7 @@ import re
 from decimal import Decimal
 from copy import deepcopy, copy
 
-from weboob.tools.compat import unicode, long
+from weboob.tools.compat import unicode, long, basestring
 from weboob.tools.misc import to_unicode
 from weboob.tools.date import new_date, new_datetime
 from weboob.tools.ordereddict import OrderedDict
@@ -113,6 +113,9 @@ class NotAvailableType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        return 'NotAvailable'
+
     def __unicode__(self):
         return u'Not available'
 
@@ -139,6 +142,9 @@ class NotLoadedType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        return 'NotLoaded'
+
     def __unicode__(self):
         return u'Not loaded'
 
@@ -190,6 +196,12 @@ class Field(object):
         """
         return value
 
+    def normalize(self, value):
+        """
+        Adjust a value of the right type before it is stored.
+        """
+        return value
+
 
 class IntField(Field):
     """
@@ -259,14 +271,18 @@ class DateField(Field):
 
     def __setattr__(self, name, value):
         if name == 'value':
-            # Force use of our date and datetime types, to fix bugs in python2
-            # with strftime on year<1900.
-            if type(value) is datetime.datetime:
-                value = new_datetime(value)
-            if type(value) is datetime.date:
-                value = new_date(value)
+            value = self.normalize(value)
         return object.__setattr__(self, name, value)
 
+    def normalize(self, value):
+        # Force use of our date and datetime types, to fix bugs in python2
+        # with strftime on year<1900.
+        if type(value) is datetime.datetime:
+            value = new_datetime(value)
+        if type(value) is datetime.date:
+            value = new_date(value)
+        return value
+
 
 class TimeField(Field):
     """
@@ -284,6 +300,32 @@ class DeltaField(Field):
         Field.__init__(self, doc, datetime.timedelta, **kwargs)
 
 
+_IMMUTABLE_TYPES = (NotLoadedType, NotAvailableType, type(None), basestring, int, long, float,
+                    bool, Decimal, datetime.date, datetime.time, datetime.timedelta)
+
+
+class _FieldValue(object):
+    """
+    Private descriptor used to read fields of :class:`CapBaseObject`.
+
+    Values set on an object are stored in its ``__dict__``, and are read
+    directly, as this descriptor does not define ``__set__``. It is only used
+    to get the default value of fields which have not been set.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return objtype._fields[self.name]
+        try:
+            return obj._fields[self.name].value
+        except KeyError:
+            # field has been removed from this object
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                objtype.__name__, self.name))
+
+
 class _CapBaseObjectMeta(type):
     def __new__(cls, name, bases, attrs):
         fields = [(field_name, attrs.pop(field_name)) for field_name, obj in attrs.items() if isinstance(obj, Field)]
@@ -295,6 +337,10 @@ class _CapBaseObjectMeta(type):
         else:
             new_class._fields = deepcopy(new_class._fields)
         new_class._fields.update(fields)
+        for field_name, field in fields:
+            setattr(new_class, field_name, _FieldValue(field_name))
+        new_class._mutable_fields = [field_name for field_name, field in new_class._fields.iteritems()
+                                     if not isinstance(field.value, _IMMUTABLE_TYPES)]
 
         if new_class.__doc__ is None:
             new_class.__doc__ = ''
@@ -335,11 +381,17 @@ class CapBaseObject(object):
     id = None
     backend = None
     _fields = None
+    _mutable_fields = ()
 
     def __init__(self, id=u'', backend=None):
         self.id = to_unicode(id)
         self.backend = backend
-        self._fields = deepcopy(self._fields)
+        # Objects share the fields of their class, and only store values
+        # which have been set. Mutable default values are copied, so they
+        # are not shared.
+        for name in self._mutable_fields:
+            if name not in self.__dict__:
+                self.__dict__[name] = deepcopy(self._fields[name].value)
 
     @property
     def fullid(self):
@@ -364,9 +416,7 @@ class CapBaseObject(object):
         return True
 
     def copy(self):
-        obj = copy(self)
-        obj._fields = copy(self._fields)
-        return obj
+        return copy(self)
 
     def set_empty_fields(self, value, excepts=()):
         """
@@ -390,8 +440,9 @@ class CapBaseObject(object):
 
         if hasattr(self, 'id') and self.id is not None:
             yield 'id', self.id
+        values = self.__dict__
         for name, field in self._fields.iteritems():
-            yield name, field.value
+            yield name, values[name] if name in values else field.value
 
     def __eq__(self, obj):
         if isinstance(obj, CapBaseObject):
@@ -400,17 +451,14 @@ class CapBaseObject(object):
             return False
 
     def __getattr__(self, name):
-        if self._fields is not None and name in self._fields:
-            return self._fields[name].value
-        else:
-            raise AttributeError("'%s' object has no attribute '%s'" % (
-                self.__class__.__name__, name))
+        raise AttributeError("'%s' object has no attribute '%s'" % (
+            self.__class__.__name__, name))
 
     def __setattr__(self, name, value):
         try:
             attr = (self._fields or {})[name]
         except KeyError:
-            if not name in dir(self) and not name.startswith('_'):
+            if not name.startswith('_') and name not in self.__dict__ and not hasattr(type(self), name):
                 warnings.warn('Creating a non-field attribute %s. Please prefix it with _' % name,
                               AttributeCreationWarning, stacklevel=2)
             object.__setattr__(self, name, value)
@@ -435,12 +483,16 @@ class CapBaseObject(object):
                 raise ValueError(
                     'Value for "%s" needs to be of type %r, not %r' % (
                         name, attr.types, type(value)))
-            attr.value = value
+            self.__dict__[name] = attr.normalize(value)
 
     def __delattr__(self, name):
-        try:
-            self._fields.pop(name)
-        except KeyError:
+        if self._fields is not None and name in self._fields:
+            # The fields of the class are shared, so give to this object
+            # its own fields without this one.
+            self.__dict__.pop(name, None)
+            object.__setattr__(self, '_fields', OrderedDict((key, field) for key, field in self._fields.iteritems()
+                                                            if key != name))
+        else:
             object.__delattr__(self, name)
 
     def to_dict(self):
@@ -19,18 +19,39 @@
 
 
 from copy import copy
-from threading import Thread
+from threading import Lock, Thread
+import errno
+import os
+import select
+from time import time
 try:
     import Queue
 except ImportError:
     import queue as Queue
+try:
+    import asyncio
+except ImportError:
+    try:
+        # backport of asyncio for Python 2
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+try:
+    from builtins import StopAsyncIteration
+except ImportError:
+    class StopAsyncIteration(Exception):
+        """
+        Raised by :func:`AsyncBackendsCall.__anext__` at the end of results,
+        before Python 3.5.
+        """
 
-from weboob.capabilities.base import CapBaseObject
+from weboob.capabilities.base import CapBaseObject, UserError
+from weboob.tools.compat import basestring
 from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors']
+__all__ = ['AsyncBackendsCall', 'BackendsCall', 'CallErrors', 'CallTimeout', 'StopAsyncIteration']
 
 
 class CallErrors(Exception):
@@ -46,33 +67,99 @@ class CallErrors(Exception):
         return self.errors.__iter__()
 
 
+class CallTimeout(UserError):
+    """
+    A backend has not finished its call before the timeout.
+    """
+    def __init__(self, timeout):
+        UserError.__init__(self, 'Timeout after %ss' % timeout)
+        self.timeout = timeout
+
+
 class BackendsCall(object):
+    # Marker put in the responses queue by a backend when it has finished.
+    FINISHED = object()
+
     def __init__(self, backends, function, *args, **kwargs):
         """
         :param backends: List of backends to call
         :type backends: list[:class:`BaseBackend`]
         :param function: backends' method name, or callable object.
         :type function: :class:`str` or :class:`callable`
+        :param call_pool: pool of threads to run calls; if None, one thread
+                          is started for each backend
+        :type call_pool: :class:`weboob.core.workers.WorkersPool`
+        :param call_timeout: if specified, delay in seconds after which
+                             backends which have not finished are abandoned,
+                             and a :class:`CallTimeout` error is reported for
+                             each of them
+        :type call_timeout: :class:`float`
+        :param call_min_results: when the timeout is reached, wait until at
+                                 least this number of results has been
+                                 received
+        :type call_min_results: :class:`int`
+
+        Other arguments are given to function. Like with
+        :func:`weboob.core.ouiboube.WebNip.do`, names of the keyword
+        arguments of the call are prefixed to not collide with them.
         """
+        pool = kwargs.pop('call_pool', None)
+        timeout = kwargs.pop('call_timeout', None)
+        min_results = kwargs.pop('call_min_results', 0)
+
         self.logger = getLogger('bcall')
 
         self.responses = Queue.Queue()
         self.errors = []
-        self.tasks = Queue.Queue()
+
+        # Backends which are still running.
+        self.running = list(backends)
+        # Backends whose FINISHED marker hasn't been read yet.
+        self.remaining = list(backends)
+
+        self.timeout = timeout
+        self.deadline = time() + timeout if timeout is not None else None
+        self.min_results = min_results
+        self.count = 0
+        self.cancelled = False
+
+        # On Python 2, waiting on a lock can't be interrupted by ^C, and
+        # waiting on a lock with a timeout is done by polling. So the caller
+        # waits for results by selecting a pipe, on which backends threads
+        # write when it sleeps.
+        self.mutex = Lock()
+        self.sleeping = False
+        self.wakeup = None
 
         for backend in backends:
-            Thread(target=self.backend_process, args=(function, args, kwargs)).start()
-            self.tasks.put(backend)
+            if pool is not None:
+                pool.submit(backend, self.backend_process, backend, function, args, kwargs)
+            else:
+                Thread(target=self.backend_process, args=(backend, function, args, kwargs)).start()
 
     def store_result(self, backend, result):
         if isinstance(result, CapBaseObject):
             result.backend = backend.name
-        self.responses.put((backend, result))
+        with self.mutex:
+            if self.cancelled:
+                return
+            self.count += 1
+            # Put while locked, so results stored before cancel() are in
+            # the queue when it returns.
+            self.responses.put((backend, result))
+        self._notify()
+
+    def store_error(self, backend, error, backtrace):
+        with self.mutex:
+            if not self.cancelled:
+                self.errors.append((backend, error, backtrace))
 
-    def backend_process(self, function, args, kwargs):
-        backend = self.tasks.get()
+    def backend_process(self, backend, function, args, kwargs):
         with backend:
             try:
+                if self.cancelled:
+                    return
+
                 # Call method on backend
                 try:
                     self.logger.debug('%s: Calling function %s' % (backend, function))
@@ -82,7 +169,7 @@ class BackendsCall(object):
                         result = getattr(backend, function)(*args, **kwargs)
                 except Exception as error:
                     self.logger.debug('%s: Called function %s raised an error: %r' % (backend, function, error))
-                    self.errors.append((backend, error, get_backtrace(error)))
+                    self.store_error(backend, error, get_backtrace(error))
                 else:
                     self.logger.debug('%s: Called function %s returned: %r' % (backend, function, result))
 
@@ -90,24 +177,146 @@ class BackendsCall(object):
                         # Loop on iterator
                         try:
                             for subresult in result:
+                                if self.cancelled:
+                                    # Stop consuming the generator.
+                                    if hasattr(result, 'close'):
+                                        result.close()
+                                    break
                                 self.store_result(backend, subresult)
                         except Exception as error:
-                            self.errors.append((backend, error, get_backtrace(error)))
+                            self.store_error(backend, error, get_backtrace(error))
                     else:
                         self.store_result(backend, result)
             finally:
-                self.tasks.task_done()
+                self.backend_finished(backend)
+
+    def backend_finished(self, backend):
+        with self.mutex:
+            self.running.remove(backend)
+        self.responses.put((backend, self.FINISHED))
+        self._notify()
+
+    def is_expired(self):
+        """
+        Check if the timeout is reached and enough results have been received.
+        """
+        return self.deadline is not None and time() >= self.deadline and \
+               self.count >= self.min_results
+
+    def cancel(self, backends=()):
+        """
+        Abandon calls.
+
+        Results and errors of backends which are still running are ignored,
+        and they stop as soon as possible.
+
+        :param backends: backends to report as timed out
+        :type backends: list[:class:`BaseBackend`]
+        """
+        with self.mutex:
+            self._cancel(backends)
+
+    def _cancel(self, backends):
+        self.cancelled = True
+        for backend in backends:
+            self.logger.debug('%s: Call timed out' % backend)
+            self.errors.append((backend, CallTimeout(self.timeout), ''))
+
+    def _cancel_running(self):
+        """
+        Abandon calls, and report backends which are still running as timed
+        out.
+        """
+        with self.mutex:
+            self._cancel(list(self.running))
+
+    def _notify(self):
+        with self.mutex:
+            if self.sleeping:
+                self.sleeping = False
+                os.write(self.wakeup[1], b'.')
+
+    def _sleep_until(self, predicate):
+        while True:
+            with self.mutex:
+                if predicate() or self.is_expired():
+                    return
+                if self.wakeup is None:
+                    self.wakeup = os.pipe()
+                self.sleeping = True
+
+            # Once the deadline is passed, only new results can stop the wait.
+            timeout = None
+            if self.deadline is not None:
+                delay = self.deadline - time()
+                if delay > 0:
+                    timeout = delay
 
-    def _callback_thread_run(self, callback, errback):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
             try:
-                callback(*self.responses.get(timeout=0.1))
-            except Queue.Empty:
-                continue
+                ready, _, _ = select.select([self.wakeup[0]], [], [], timeout)
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+            else:
+                if ready:
+                    os.read(self.wakeup[0], 512)
+
+    def _close_wakeup(self):
+        with self.mutex:
+            self.sleeping = False
+            if self.wakeup is not None:
+                os.close(self.wakeup[0])
+                os.close(self.wakeup[1])
+                self.wakeup = None
+
+    def _read_response(self):
+        backend, result = self.responses.get_nowait()
+        if result is self.FINISHED:
+            self.remaining.remove(backend)
+            return None
+        return backend, result
+
+    def iter_responses(self):
+        """
+        Iter on results, until every backends have finished or the timeout
+        is reached.
+        """
+        try:
+            while self.remaining:
+                if self.is_expired():
+                    self._cancel_running()
+                    # Results received before the timeout are still returned.
+                    while True:
+                        try:
+                            response = self._read_response()
+                        except Queue.Empty:
+                            break
+                        if response is not None:
+                            yield response
+                    return
+
+                try:
+                    response = self._read_response()
+                except Queue.Empty:
+                    self._sleep_until(lambda: not self.responses.empty())
+                    continue
+
+                if response is not None:
+                    yield response
+        finally:
+            self._close_wakeup()
+
+    def _callback_thread_run(self, callback, errback):
+        for backend, result in self.iter_responses():
+            callback(backend, result)
 
         # Raise errors
-        while self.errors:
-            errback(*self.errors.pop(0))
+        while True:
+            with self.mutex:
+                if not self.errors:
+                    break
+                error = self.errors.pop(0)
+            errback(*error)
 
         callback(None, None)
 
@@ -129,17 +338,230 @@ class BackendsCall(object):
         return thread
 
     def wait(self):
-        self.tasks.join()
+        try:
+            self._sleep_until(lambda: not self.running)
+        finally:
+            self._close_wakeup()
+
+        with self.mutex:
+            if self.running:
+                self._cancel(list(self.running))
 
         if self.errors:
             raise CallErrors(self.errors)
 
     def __iter__(self):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
+        for response in self.iter_responses():
+            yield response
+
+        if self.errors:
+            raise CallErrors(self.errors)
+
+
+
+class AsyncBackendsCall(BackendsCall):
+    """
+    Asynchronous iterator on results of backends, for asyncio event loops.
+
+    Backends are still called in threads, which wake up the event loop when
+    they store a result, so coroutines never poll::
+
+        async for backend, account in weboob.ado('iter_accounts', caps=ICapBank):
+            print(account)
+
+    With Python 2, it requires trollius, the backport of asyncio, and
+    results are read with :func:`__anext__` until
+    :class:`StopAsyncIteration` is raised::
+
+        @trollius.coroutine
+        def print_accounts():
+            call = weboob.ado('iter_accounts', caps=ICapBank)
+            while True:
+                try:
+                    backend, account = yield trollius.From(call.__anext__())
+                except StopAsyncIteration:
+                    break
+                print(account)
+
+    If the iteration is stopped before its end, :func:`aclose` should be
+    called to stop backends as soon as possible.
+
+    :class:`ImportError` is raised if neither asyncio nor trollius is
+    available.
+
+    :param loop: event loop where results are delivered; if None, the
+                 current event loop
+    :type loop: :class:`asyncio.AbstractEventLoop`
+
+    Other parameters are the ones of :class:`BackendsCall`.
+    """
+
+    def __init__(self, loop, *args, **kwargs):
+        if asyncio is None:
+            raise ImportError('AsyncBackendsCall requires asyncio, or trollius with Python 2')
+        if loop is None:
+            loop = asyncio.get_event_loop()
+
+        # Set before calling backends, as they may store results at once.
+        self.loop = loop
+        self.waiter = None
+        self.expired = False
+
+        BackendsCall.__init__(self, *args, **kwargs)
+
+        self.timer = None
+        if self.deadline is not None:
+            self.timer = self.loop.call_later(self.timeout, self._wake)
+
+    def _notify(self):
+        with self.mutex:
+            if self.sleeping:
+                self.sleeping = False
+                self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        with self.mutex:
+            self.sleeping = False
+            waiter, self.waiter = self.waiter, None
+
+        if waiter is not None:
+            self._next(waiter)
+
+    def _finish(self, future):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        if self.errors:
+            future.set_exception(CallErrors(self.errors))
+        else:
+            future.set_exception(StopAsyncIteration())
+
+    def _next(self, future):
+        if future.done():
+            # The waiting coroutine has been cancelled.
+            return
+
+        while True:
+            if not self.expired and self.remaining and self.is_expired():
+                # Results received before the timeout are still returned.
+                self.expired = True
+                self._cancel_running()
+
             try:
-                yield self.responses.get(timeout=0.1)
+                response = self._read_response()
             except Queue.Empty:
+                if self.expired or not self.remaining:
+                    return self._finish(future)
+
+                with self.mutex:
+                    if self.responses.empty() and not self.is_expired():
+                        self.sleeping = True
+                        self.waiter = future
+                        return
                 continue
 
-        if self.errors:
-            raise CallErrors(self.errors)
+            if response is not None:
+                return future.set_result(response)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = asyncio.Future(loop=self.loop)
+        self._next(future)
+        return future
+
+    def aclose(self):
+        """
+        Stop backends and the iteration.
+
+        :rtype: :class:`asyncio.Future`
+        """
+        self.cancel()
+        with self.mutex:
+            self.expired = True
+            waiter, self.waiter = self.waiter, None
+
+        if waiter is not None:
+            self._next(waiter)
+
+        future = asyncio.Future(loop=self.loop)
+        future.set_result(None)
+        return future
+
+
+def test():
+    from time import sleep
+    from weboob.core.ouiboube import WebNip
+    from weboob.tools.backend import BaseBackend
+
+    class SleepBackend(BaseBackend):
+        NAME = 'sleep'
+
+        def iter_numbers(self, delays):
+            for i in xrange(3):
+                sleep(delays[self.name])
+                yield i
+
+    weboob = WebNip(modules_path=False)
+    delays = {}
+    for name, delay in (('fast', 0), ('slow', 1)):
+        weboob.backend_instances[name] = SleepBackend(weboob, name, {})
+        delays[name] = delay
+
+    results = []
+    try:
+        for backend, result in weboob.do('iter_numbers', delays, call_timeout=0.2):
+            results.append((backend.name, result))
+    except CallErrors as e:
+        assert [(backend.name, type(error)) for backend, error, _ in e] == [('slow', CallTimeout)]
+    else:
+        assert False, 'CallTimeout not raised'
+    assert results == [('fast', 0), ('fast', 1), ('fast', 2)]
+
+    if asyncio is None:
+        try:
+            weboob.ado('iter_numbers', delays)
+        except ImportError:
+            pass
+        else:
+            assert False, 'ImportError not raised'
+    else:
+        loop = asyncio.new_event_loop()
+        call = weboob.ado('iter_numbers', delays, loop=loop, call_timeout=0.2)
+        results = []
+        try:
+            while True:
+                backend, result = loop.run_until_complete(call.__anext__())
+                results.append((backend.name, result))
+        except CallErrors as e:
+            assert [(backend.name, type(error)) for backend, error, _ in e] == [('slow', CallTimeout)]
+        else:
+            assert False, 'CallTimeout not raised'
+        assert results == [('fast', 0), ('fast', 1), ('fast', 2)]
+
+        # the end of results without errors, and aclose()
+        del delays['slow']
+        call = weboob.ado('iter_numbers', delays, loop=loop, backends=['fast'])
+        results = []
+        try:
+            while True:
+                backend, result = loop.run_until_complete(call.__anext__())
+                results.append(result)
+        except StopAsyncIteration:
+            pass
+        assert results == [0, 1, 2]
+
+        call = weboob.ado('iter_numbers', {'fast': 0, 'slow': 1}, loop=loop)
+        backend, result = loop.run_until_complete(call.__anext__())
+        assert backend.name == 'fast'
+        loop.run_until_complete(call.aclose())
+        try:
+            while True:
+                loop.run_until_complete(call.__anext__())
+        except StopAsyncIteration:
+            pass
+        loop.close()
+
+    weboob.deinit()
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import socket
+import struct
+import sys
+from SocketServer import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from weboob.capabilities.base import CapBaseObject
+from weboob.core.bcall import CallErrors
+from weboob.tools.log import getLogger
+
+
+__all__ = ['DaemonClient', 'DaemonError', 'DaemonServer', 'RemoteCall', 'get_socket_path']
+
+
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17 if sys.platform.startswith('linux') else None)
+
+_HEADER = struct.Struct('>I')
+
+
+class DaemonError(Exception):
+    pass
+
+
+def get_socket_path(weboob):
+    """
+    Get the default path of the socket of the daemon of this weboob
+    instance.
+    """
+    return os.path.join(weboob.workdir, 'daemon.sock')
+
+
+def _portable_class(cls, modules):
+    """
+    Get the first class of *cls* MRO which is not defined in a weboob
+    module, as a client may not be able to import them.
+    """
+    for klass in cls.__mro__:
+        if klass.__module__.split('.')[0] not in modules:
+            return klass
+    return object
+
+
+def _dumps(obj, modules=()):
+    f = StringIO()
+    pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+
+    def persistent_id(o):
+        if not isinstance(o, (CapBaseObject, BaseException)) or \
+           type(o).__module__.split('.')[0] not in modules:
+            return None
+        klass = _portable_class(type(o), modules)
+        if isinstance(o, BaseException):
+            return ('error', klass, o.args, o.__dict__)
+        return ('obj', klass, o.__dict__)
+
+    if modules:
+        pickler.persistent_id = persistent_id
+    pickler.dump(obj)
+    data = f.getvalue()
+    return _HEADER.pack(len(data)) + data
+
+
+def _persistent_load(pid):
+    if pid[0] == 'error':
+        kind, klass, args, state = pid
+        obj = klass.__new__(klass)
+        obj.args = args
+    else:
+        kind, klass, state = pid
+        obj = klass.__new__(klass)
+    obj.__dict__.update(state)
+    return obj
+
+
+def _read(f):
+    """
+    Read a frame, or return None at the end of the stream.
+    """
+    header = f.read(_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        raise DaemonError('Connection to daemon lost')
+    size, = _HEADER.unpack(header)
+    data = f.read(size)
+    if len(data) < size:
+        raise DaemonError('Connection to daemon lost')
+    unpickler = pickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = _persistent_load
+    return unpickler.load()
+
+
+def _complete(backend, function, args, kwargs, fields, count, condition, more):
+    """
+    Call a method of a backend, and complete results like applications do.
+    """
+    res = getattr(backend, function)(*args, **kwargs)
+    if not hasattr(res, '__iter__') or isinstance(res, basestring):
+        if isinstance(res, CapBaseObject) and (fields is None or len(fields) > 0):
+            backend.fillobj(res, fields)
+        return res
+    return _complete_iter(backend, function, res, fields, count, condition, more)
+
+
+def _complete_iter(backend, function, res, fields, count, condition, more):
+    sorted_on = backend.SORTED_RESULTS.get(function)
+    if fields is None or len(fields) > 0:
+        res = backend.fillobj_many(res, fields)
+    i = 0
+    for sub in res:
+        if isinstance(sub, CapBaseObject):
+            sub.backend = backend.name
+        if condition and not condition.is_valid(sub):
+            if sorted_on is not None and condition.is_exhausted(sub, *sorted_on):
+                return
+            continue
+        if count and i == count:
+            if more is not None:
+                raise more()
+            return
+        i += 1
+        yield sub
+
+
+class DaemonRequestHandler(StreamRequestHandler):
+    """
+    Handle a call, and stream its results.
+
+    The client sends a request, and the daemon replies with ``result`` and
+    ``error`` frames as soon as they are available, then with an ``end``
+    frame. If the client closes the connection, the call is cancelled.
+    """
+    # Frames are buffered while results are available at once.
+    wbufsize = 65536
+
+    def send(self, frame):
+        self.wfile.write(_dumps(frame, self.server.weboob.modules_loader.loaded))
+
+    def send_error(self, name, error, backtrace):
+        try:
+            frame = _dumps(('error', name, error, backtrace), self.server.weboob.modules_loader.loaded)
+        except Exception:
+            # The error can't be pickled.
+            frame = _dumps(('error', name, Exception(repr(error)), backtrace))
+        self.wfile.write(frame)
+
+    def handle(self):
+        try:
+            request = _read(self.rfile)
+        except Exception as e:
+            self.server.logger.warning('Unable to read request: %s' % e)
+            return
+        if request is None:
+            return
+
+        weboob = self.server.weboob
+        backends = []
+        for name in request['backends']:
+            try:
+                backends.append(weboob.get_backend(name))
+            except KeyError:
+                self.send_error(name, DaemonError('Backend "%s" is not loaded by the daemon' % name), '')
+
+        self.server.logger.debug('Calling %s on %s' % (request['function'], ', '.join(b.name for b in backends)))
+        call = weboob.do(_complete, request['function'], request['args'], request['kwargs'],
+                         request['fields'], request['count'], request['condition'], request['more'],
+                         backends=backends, call_timeout=request['timeout'], call_min_results=request['min_results'])
+        try:
+            for backend, result in call.iter_responses():
+                try:
+                    self.send(('result', backend.name, result))
+                except (IOError, socket.error):
+                    raise
+                except Exception as e:
+                    self.send_error(backend.name, e, '')
+                if call.responses.empty():
+                    self.wfile.flush()
+            for backend, error, backtrace in call.errors:
+                self.send_error(backend.name, error, backtrace)
+            self.send(('end',))
+        except (IOError, socket.error):
+            # The client has gone.
+            call.cancel()
+
+    def finish(self):
+        try:
+            StreamRequestHandler.finish(self)
+        except (IOError, socket.error):
+            pass
+
+
+class DaemonServer(ThreadingMixIn, UnixStreamServer):
+    """
+    Server of a daemon which keeps backends of a weboob instance loaded and
+    logged in, and serves calls of clients, as :class:`DaemonClient`.
+
+    It listens on a Unix socket only readable by its user, and refuses
+    connections of other users. Calls are run in the pool of workers of
+    the weboob instance, so clients share backends and their sessions.
+
+    :param weboob: weboob instance
+    :type weboob: :class:`weboob.core.ouiboube.Weboob`
+    :param path: path of the socket (default: ``daemon.sock`` in the working
+                 directory)
+    :type path: :class:`str`
+    """
+    daemon_threads = True
+
+    def __init__(self, weboob, path=None):
+        self.logger = getLogger('daemon')
+        self.weboob = weboob
+        if path is None:
+            path = get_socket_path(weboob)
+
+        if os.path.exists(path):
+            if DaemonClient(weboob, path).is_running():
+                raise DaemonError('A daemon is already listening on %s' % path)
+            os.remove(path)
+
+        UnixStreamServer.__init__(self, path, DaemonRequestHandler)
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        # Nobody can connect before listen() is called by server_activate(),
+        # so the socket is protected in time without changing the umask of
+        # the whole process.
+        os.chmod(self.server_address, 0o600)
+
+    def verify_request(self, request, client_address):
+        if SO_PEERCRED is None:
+            return True
+        pid, uid, gid = struct.unpack('3i', request.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, struct.calcsize('3i')))
+        if uid != os.getuid():
+            self.logger.warning('Refused connection of process %d of user %d' % (pid, uid))
+            return False
+        return True
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+class RemoteCall(object):
+    """
+    Results of a call done by a daemon.
+
+    It can be used like :class:`weboob.core.bcall.BackendsCall`: results
+    are iterated as they are received, and :class:`CallErrors` is raised
+    at the end if backends have failed.
+    """
+
+    def __init__(self, sock, backends):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+        self.backends = dict((backend.name, backend) for backend in backends)
+        self.errors = []
+
+    def iter_responses(self):
+        try:
+            while self.sock is not None:
+                frame = _read(self.rfile)
+                if frame is None:
+                    raise DaemonError('Connection to daemon lost')
+                if frame[0] == 'result':
+                    yield self.backends.get(frame[1], frame[1]), frame[2]
+                elif frame[0] == 'error':
+                    self.errors.append((self.backends.get(frame[1], frame[1]), frame[2], frame[3]))
+                else:
+                    break
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Close the connection. If the call is not finished, the daemon
+        cancels it.
+        """
+        if self.sock is not None:
+            self.rfile.close()
+            self.sock.close()
+            self.sock = None
+
+    def wait(self):
+        for response in self.iter_responses():
+            pass
+
+        if self.errors:
+            raise CallErrors(self.errors)
+
+    def __iter__(self):
+        for response in self.iter_responses():
+            yield response
+
+        if self.errors:
+            raise CallErrors(self.errors)
+
+
+class DaemonClient(object):
+    """
+    Client of a :class:`DaemonServer`.
+
+    :param weboob: weboob instance, whose backends are the ones of the daemon
+    :type weboob: :class:`weboob.core.ouiboube.Weboob`
+    :param path: path of the socket (default: ``daemon.sock`` in the working
+                 directory)
+    :type path: :class:`str`
+    """
+
+    def __init__(self, weboob, path=None):
+        self.weboob = weboob
+        self.path = path or get_socket_path(weboob)
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except socket.error as e:
+            sock.close()
+            raise DaemonError('Unable to connect to daemon on %s: %s' % (self.path, e))
+        return sock
+
+    def is_running(self):
+        try:
+            self.connect().close()
+        except DaemonError:
+            return False
+        return True
+
+    def do(self, function, *args, **kwargs):
+        """
+        Call a method of backends in the daemon, like
+        :func:`weboob.core.ouiboube.Weboob.do`.
+
+        Objects are completed by the daemon before they are sent.
+
+        :param function: backends' method name
+        :type function: :class:`str`
+        :param fields: fields to fill on objects (None for all fields)
+        :type fields: list[:class:`str`]
+        :param count: maximum number of results of each backend
+        :type count: :class:`int`
+        :param condition: condition results have to match
+        :type condition: :class:`weboob.tools.application.results.ResultsCondition`
+        :param more: exception raised by a backend when it has more than
+                     *count* results
+        :type more: :class:`type`
+        :rtype: :class:`RemoteCall`
+        """
+        backends = self.weboob._select_backends(kwargs)
+        request = {'function':    function,
+                   'backends':    [backend.name for backend in backends],
+                   'fields':      kwargs.pop('fields', []),
+                   'count':       kwargs.pop('count', None),
+                   'condition':   kwargs.pop('condition', None),
+                   'more':        kwargs.pop('more', None),
+                   'timeout':     kwargs.pop('call_timeout', None),
+                   'min_results': kwargs.pop('call_min_results', 0),
+                   'args':        args,
+                   'kwargs':      kwargs,
+                  }
+        data = _dumps(request)
+
+        sock = self.connect()
+        try:
+            sock.sendall(data)
+        except socket.error as e:
+            sock.close()
+            raise DaemonError('Unable to send call to daemon: %s' % e)
+        return RemoteCall(sock, backends)
+
+
+def test():
+    import shutil
+    import tempfile
+    from threading import Thread
+    from weboob.capabilities.base import NotLoaded, NotAvailable
+    from weboob.capabilities.bank import Transaction
+    from weboob.core.ouiboube import WebNip
+    from weboob.tools.application.base import MoreResultsAvailable
+    from weboob.tools.application.results import ResultsCondition
+
+    class Backend(object):
+        SORTED_RESULTS = {}
+
+        def __init__(self, name):
+            self.name = name
+            self.calls = 0
+
+        def __enter__(self):
+            pass
+
+        def __exit__(self, t, v, tb):
+            pass
+
+        def has_caps(self, caps):
+            return True
+
+        def fillobj(self, obj, fields):
+            obj.label = obj.raw.title()
+
+        def fillobj_many(self, objs, fields):
+            for obj in objs:
+                self.fillobj(obj, fields)
+                yield obj
+
+        def iter_history(self, count):
+            self.calls += 1
+            for i in xrange(count):
+                tr = Transaction(i)
+                tr.raw = u'transaction %d' % i
+                tr.category = NotAvailable
+                yield tr
+
+        def get_balance(self):
+            raise ValueError('unable to get balance')
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_daemon_')
+    try:
+        weboob = WebNip(modules_path=tmpdir)
+        weboob.workdir = tmpdir
+        weboob.backend_instances = {'a': Backend('a'), 'b': Backend('b')}
+        server = DaemonServer(weboob)
+        assert os.stat(server.server_address).st_mode & 0o777 == 0o600
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        client = DaemonClient(weboob)
+        assert client.is_running()
+
+        results = list(client.do('iter_history', 3, backends=['a'], fields=None))
+        assert [(backend.name, tr.id, tr.label) for backend, tr in results] == \
+               [('a', u'0', u'Transaction 0'), ('a', u'1', u'Transaction 1'), ('a', u'2', u'Transaction 2')]
+        tr = results[0][1]
+        assert tr.backend == 'a' and tr.category is NotAvailable and tr.date is NotLoaded
+
+        # count and condition are applied by the daemon
+        results = list(client.do('iter_history', 10, backends=['a', 'b'], count=2,
+                                 condition=ResultsCondition('raw!=transaction 0')))
+        assert sorted((backend.name, tr.id) for backend, tr in results) == \
+               [('a', u'1'), ('a', u'2'), ('b', u'1'), ('b', u'2')]
+        try:
+            list(client.do('iter_history', 10, backends=['a'], count=2, more=MoreResultsAvailable))
+        except CallErrors as e:
+            assert [(b.name, type(error)) for b, error, bt in e.errors] == [('a', MoreResultsAvailable)]
+        else:
+            assert False
+
+        try:
+            client.do('get_balance').wait()
+        except CallErrors as e:
+            assert sorted((b.name, str(error)) for b, error, bt in e.errors) == \
+                   [('a', 'unable to get balance'), ('b', 'unable to get balance')]
+        else:
+            assert False
+
+        # a call abandoned by the client is cancelled
+        call = client.do('iter_history', 100000, backends=['a'])
+        next(iter(call))
+        call.close()
+
+        try:
+            DaemonServer(weboob)
+        except DaemonError:
+            pass
+        else:
+            assert False
+
+        server.shutdown()
+        server.server_close()
+        assert not client.is_running()
+        assert not os.path.exists(server.server_address)
+        weboob.pool.stop(wait=True)
+    finally:
+        shutil.rmtree(tmpdir)
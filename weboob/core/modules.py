@@ -20,12 +20,15 @@
 import os
 import imp
 import logging
+from functools import partial
+from threading import RLock
 
+from weboob.capabilities.base import IBaseCap
 from weboob.tools.backend import BaseBackend
 from weboob.tools.log import getLogger
 
 
-__all__ = ['Module', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
+__all__ = ['LazyBackend', 'Module', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
 
 
 class ModuleLoadError(Exception):
@@ -99,6 +102,114 @@ class Module(object):
         return backend_instance
 
 
+class LazyBackend(object):
+    """
+    Proxy to a backend whose module is imported at the first use.
+
+    It is built from the module information of the repositories index, so
+    backends can be loaded, listed and selected by capabilities without
+    importing their modules. Methods of capabilities implemented by the
+    backend can be got without importing the module, which is only done when
+    they are called.
+
+    :param loader: loader of modules
+    :type loader: :class:`ModulesLoader`
+    :param minfo: information about the module
+    :type minfo: :class:`weboob.core.repositories.ModuleInfo`
+    :param weboob: weboob instance
+    :type weboob: :class:`weboob.core.ouiboube.Weboob`
+    :param name: name of backend
+    :type name: :class:`str`
+    :param config: configuration of backend
+    :type config: :class:`dict`
+    :param storage: storage object
+    :type storage: :class:`weboob.tools.storage.IStorage`
+    """
+    _backend = None
+
+    def __init__(self, loader, minfo, weboob, name, config, storage):
+        self.loader = loader
+        self.minfo = minfo
+        self.weboob = weboob
+        self.name = name
+        self.config_params = config
+        self.storage_backend = storage
+        self.NAME = minfo.name
+        self.lock = RLock()
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, t, v, tb):
+        self.lock.release()
+
+    def __repr__(self):
+        return u"<Backend %r>" % self.name
+
+    def __getattr__(self, attr):
+        if self._backend is None and not attr.startswith('_'):
+            for cap in self.iter_caps_classes():
+                if callable(getattr(cap, attr, None)):
+                    return partial(self._call, attr)
+        return getattr(self.load(), attr)
+
+    def _call(self, attr, *args, **kwargs):
+        return getattr(self.load(), attr)(*args, **kwargs)
+
+    def is_loaded(self):
+        return self._backend is not None
+
+    def load(self):
+        """
+        Import module and create the backend, if not already done.
+
+        :rtype: :class:`weboob.tools.backend.BaseBackend`
+        """
+        with self.lock:
+            if self._backend is None:
+                module = self.loader.get_or_load_module(self.NAME)
+                backend = module.create_instance(self.weboob, self.name, self.config_params, self.storage_backend)
+                # Callers may already hold our lock.
+                backend.lock = self.lock
+                self._backend = backend
+        return self._backend
+
+    def deinit(self):
+        if self._backend is not None:
+            self._backend.deinit()
+
+    def save_browser_session(self):
+        if self._backend is not None:
+            self._backend.save_browser_session()
+
+    def iter_caps_classes(self):
+        """
+        Iter on capabilities classes of the backend which are already imported.
+        """
+        classes = [IBaseCap]
+        while classes:
+            klass = classes.pop()
+            if klass.__name__ in self.minfo.capabilities:
+                yield klass
+            classes.extend(klass.__subclasses__())
+
+    def has_caps(self, *caps):
+        """
+        Check if this backend implements at least one of these capabilities.
+        """
+        for c in caps:
+            if isinstance(c, basestring):
+                if c in self.minfo.capabilities:
+                    return True
+            elif issubclass(c, IBaseCap):
+                # like isinstance(), also match parents of our capabilities
+                if c is IBaseCap or any(issubclass(klass, c) for klass in self.iter_caps_classes()):
+                    return True
+            elif isinstance(self.load(), c):
+                return True
+        return False
+
+
 class ModulesLoader(object):
     """
     Load modules.
@@ -107,15 +218,18 @@ class ModulesLoader(object):
         self.version = version
         self.path = path
         self.loaded = {}
+        self.lock = RLock()
         self.logger = getLogger('modules')
 
     def get_or_load_module(self, module_name):
         """
         Can raise a ModuleLoadError exception.
         """
-        if module_name not in self.loaded:
-            self.load_module(module_name)
-        return self.loaded[module_name]
+        # Lazy backends may load modules from several threads.
+        with self.lock:
+            if module_name not in self.loaded:
+                self.load_module(module_name)
+            return self.loaded[module_name]
 
     def iter_existing_module_names(self):
         for name in os.listdir(self.path):
@@ -182,3 +296,64 @@ class RepositoryModulesLoader(ModulesLoader):
             raise ModuleLoadError(module_name, 'Module %s is not installed' % module_name)
 
         return minfo.path
+
+
+def test():
+    import shutil
+    import sys
+    import tempfile
+    from threading import Thread
+    from weboob.capabilities.bank import ICapBank
+    from weboob.capabilities.collection import ICapCollection
+    from weboob.capabilities.messages import ICapMessages
+    from weboob.core.ouiboube import WebNip
+    from weboob.core.repositories import ModuleInfo
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_modules_')
+    try:
+        os.mkdir(os.path.join(tmpdir, 'lazytest'))
+        with open(os.path.join(tmpdir, 'lazytest', '__init__.py'), 'w') as f:
+            f.write('from .backend import LazyTestBackend\n')
+        with open(os.path.join(tmpdir, 'lazytest', 'backend.py'), 'w') as f:
+            f.write('from time import sleep\n'
+                    'from weboob.capabilities.bank import ICapBank\n'
+                    'from weboob.tools.backend import BaseBackend\n'
+                    'instances = []\n'
+                    'class LazyTestBackend(BaseBackend, ICapBank):\n'
+                    '    NAME = "lazytest"\n'
+                    '    VERSION = %r\n'
+                    '    def __init__(self, *args, **kwargs):\n'
+                    '        sleep(0.05)\n'
+                    '        instances.append(self)\n'
+                    '        BaseBackend.__init__(self, *args, **kwargs)\n'
+                    '    def iter_accounts(self):\n'
+                    '        return ["account"]\n' % WebNip.VERSION)
+
+        minfo = ModuleInfo('lazytest')
+        minfo.capabilities = ['ICapBank']
+        loader = ModulesLoader(tmpdir, WebNip.VERSION)
+        backend = LazyBackend(loader, minfo, None, 'mybank', {}, None)
+
+        # capabilities and their methods are known without importing the module
+        assert backend.has_caps(ICapBank) and backend.has_caps('ICapBank')
+        assert backend.has_caps(ICapCollection) and backend.has_caps(IBaseCap)
+        assert not backend.has_caps(ICapMessages)
+        iter_accounts = backend.iter_accounts
+        assert not backend.is_loaded()
+        assert 'lazytest' not in sys.modules
+
+        # the backend is created once by concurrent calls
+        loaded = []
+        threads = [Thread(target=lambda: loaded.append(backend.load())) for i in xrange(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert backend.is_loaded()
+        assert len(sys.modules['lazytest.backend'].instances) == 1
+        assert len(set(loaded)) == 1 and loaded[0].lock is backend.lock
+        assert iter_accounts() == ['account']
+    finally:
+        for name in ('lazytest', 'lazytest.backend'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(tmpdir)
@@ -20,11 +20,12 @@
 
 import os
 
-from weboob.core.bcall import BackendsCall
-from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError
+from weboob.core.bcall import AsyncBackendsCall, BackendsCall
+from weboob.core.modules import LazyBackend, ModulesLoader, RepositoryModulesLoader, ModuleLoadError
 from weboob.core.backendscfg import BackendsConfig
 from weboob.core.repositories import Repositories, IProgress
 from weboob.core.scheduler import Scheduler
+from weboob.core.workers import WorkersPool
 from weboob.tools.backend import BaseBackend
 from weboob.tools.config.iconfig import ConfigError
 from weboob.tools.log import getLogger
@@ -50,10 +51,14 @@ class WebNip(object):
     :type storage: :class:`weboob.tools.storage.IStorage`
     :param scheduler: what scheduler to use; default is :class:`weboob.core.scheduler.Scheduler`
     :type scheduler: :class:`weboob.core.scheduler.IScheduler`
+    :param max_workers: maximum number of threads used to call backends;
+                        default is :attr:`MAX_WORKERS`
+    :type max_workers: :class:`int`
     """
     VERSION = '0.i'
+    MAX_WORKERS = 20
 
-    def __init__(self, modules_path=None, storage=None, scheduler=None):
+    def __init__(self, modules_path=None, storage=None, scheduler=None, max_workers=None):
         self.logger = getLogger('weboob')
         self.backend_instances = {}
         self.callbacks = {'login':   lambda backend_name, value: None,
@@ -71,6 +76,10 @@ class WebNip(object):
             scheduler = Scheduler()
         self.scheduler = scheduler
 
+        if max_workers is None:
+            max_workers = int(os.environ.get('WEBOOB_MAX_WORKERS', self.MAX_WORKERS))
+        self.pool = WorkersPool(max_workers, 'bcall.workers')
+
         self.storage = storage
 
     def __deinit__(self):
@@ -82,6 +91,7 @@ class WebNip(object):
         properly unload all correctly.
         """
         self.unload_backends()
+        self.pool.stop(wait=True)
 
     def build_backend(self, module_name, params=None, storage=None, name=None):
         """
@@ -155,6 +165,12 @@ class WebNip(object):
         for name in names:
             backend = self.backend_instances.pop(name)
             with backend:
+                # The backend has to be deinitialized even if its session
+                # can't be stored.
+                try:
+                    backend.save_browser_session()
+                except Exception as e:
+                    self.logger.error(u'Unable to save the session of backend "%s": %s' % (backend.name, e))
                 backend.deinit()
             unloaded[backend.name] = backend
 
@@ -199,31 +215,14 @@ class WebNip(object):
                 with backend:
                     yield backend
 
-    def do(self, function, *args, **kwargs):
-        r"""
-        Do calls on loaded backends with specified arguments, in separated
-        threads.
-
-        This function has two modes:
-
-        - If *function* is a string, it calls the method with this name on
-          each backends with the specified arguments;
-        - If *function* is a callable, it calls it in a separated thread with
-          the locked backend instance at first arguments, and \*args and
-          \*\*kwargs.
-
-        :param function: backend's method name, or a callable object
-        :type function: :class:`str`
-        :param backends: list of backends to iterate on
-        :type backends: list[:class:`str`]
-        :param caps: iterate on backends which implement this caps
-        :type caps: list[:class:`weboob.capabilities.base.IBaseCap`]
-        :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
+    def _select_backends(self, kwargs):
+        """
+        Get backends to call, and remove 'backends' and 'caps' from kwargs.
         """
         backends = self.backend_instances.values()
         _backends = kwargs.pop('backends', None)
         if _backends is not None:
-            if isinstance(_backends, BaseBackend):
+            if isinstance(_backends, (BaseBackend, LazyBackend)):
                 backends = [_backends]
             elif isinstance(_backends, basestring):
                 if len(_backends) > 0:
@@ -248,11 +247,71 @@ class WebNip(object):
             caps = kwargs.pop('caps')
             backends = [backend for backend in backends if backend.has_caps(caps)]
 
+        return backends
+
+    def do(self, function, *args, **kwargs):
+        r"""
+        Do calls on loaded backends with specified arguments, in threads of
+        the :attr:`pool` of workers.
+
+        This function has two modes:
+
+        - If *function* is a string, it calls the method with this name on
+          each backends with the specified arguments;
+        - If *function* is a callable, it calls it in a worker thread with
+          the locked backend instance at first arguments, and \*args and
+          \*\*kwargs.
+
+        :param function: backend's method name, or a callable object
+        :type function: :class:`str`
+        :param backends: list of backends to iterate on
+        :type backends: list[:class:`str`]
+        :param caps: iterate on backends which implement this caps
+        :type caps: list[:class:`weboob.capabilities.base.IBaseCap`]
+        :param call_timeout: delay in seconds after which backends which
+                             have not finished are abandoned, and reported
+                             as :class:`weboob.core.bcall.CallTimeout` errors
+        :type call_timeout: :class:`float`
+        :param call_min_results: when the timeout is reached, wait until at
+                                 least this number of results has been
+                                 received
+        :type call_min_results: :class:`int`
+
+        Other keyword arguments are given to the called function, so the
+        names of these parameters are prefixed to not collide with them.
+        :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
+        """
+        backends = self._select_backends(kwargs)
+
         # The return value MUST BE the BackendsCall instance. Please never iterate
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
-        return BackendsCall(backends, function, *args, **kwargs)
+        return BackendsCall(backends, function, *args, call_pool=self.pool, **kwargs)
+
+    def ado(self, function, *args, **kwargs):
+        """
+        Asynchronous version of :func:`do`, to use in an asyncio event loop
+        (see :class:`weboob.core.bcall.AsyncBackendsCall` for Python 2)::
+
+            async for backend, obj in weboob.ado('iter_accounts', caps=ICapBank):
+                ...
+
+        Backends are called in threads of the same :attr:`pool` than
+        :func:`do`.
+
+        It takes the same parameters than :func:`do`, and:
+
+        :param loop: event loop where results are delivered; default is the
+                     current event loop
+        :type loop: :class:`asyncio.AbstractEventLoop`
+        :raises: :class:`ImportError` if neither asyncio nor trollius is available
+        :rtype: A :class:`weboob.core.bcall.AsyncBackendsCall` object (asynchronous iterable)
+        """
+        loop = kwargs.pop('loop', None)
+        backends = self._select_backends(kwargs)
+
+        return AsyncBackendsCall(loop, backends, function, *args, call_pool=self.pool, **kwargs)
 
     def schedule(self, interval, function, *args):
         """
@@ -313,11 +372,13 @@ class Weboob(WebNip):
     :type backends_filename: str
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
+    :param max_workers: maximum number of threads used to call backends
+    :type max_workers: :class:`int`
     """
     BACKENDS_FILENAME = 'backends'
 
-    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None):
-        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage)
+    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None, max_workers=None):
+        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage, max_workers=max_workers)
 
         # Create WORKDIR
         if workdir is not None:
@@ -382,7 +443,7 @@ class Weboob(WebNip):
 
         return super(Weboob, self).build_backend(module_name, params, storage, name)
 
-    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None):
+    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None, lazy=False):
         """
         Load backends listed in config file.
 
@@ -398,6 +459,10 @@ class Weboob(WebNip):
         :type storage: :class:`weboob.tools.storage.IStorage`
         :param errors: if specified, store every errors in this list
         :type errors: list[:class:`LoadError`]
+        :param lazy: if True, modules described by the repositories index are
+                     only imported at the first call on their backends (see
+                     :class:`weboob.core.modules.LazyBackend`)
+        :type lazy: :class:`bool`
         :returns: loaded backends
         :rtype: dict[:class:`str`, :class:`weboob.tools.backend.BaseBackend`]
         """
@@ -428,6 +493,15 @@ class Weboob(WebNip):
             if not minfo.is_installed():
                 self.repositories.install(minfo)
 
+            if lazy and minfo.has_required_config(params):
+                if instance_name in self.backend_instances:
+                    self.logger.warning(u'Oops, the backend "%s" is already loaded. Unload it before reloading...' % instance_name)
+                    self.unload_backends(instance_name)
+
+                backend_instance = LazyBackend(self.modules_loader, minfo, self, instance_name, params, storage)
+                self.backend_instances[instance_name] = loaded[instance_name] = backend_instance
+                continue
+
             module = None
             try:
                 module = self.modules_loader.get_or_load_module(module_name)
@@ -69,6 +69,10 @@ class ModuleInfo(object):
         self.license = u''
         self.icon = u''
         self.urls = u''
+        # name of the backend class
+        self.backend = None
+        # configuration keys, required ones are suffixed by '*' (None if unknown)
+        self.config = None
 
     def load(self, items):
         self.version = int(items['version'])
@@ -78,6 +82,10 @@ class ModuleInfo(object):
         self.license = to_unicode(items['license'])
         self.icon = items['icon'].strip() or None
         self.urls = items['urls']
+        # These keys are missing in indexes built by older versions.
+        self.backend = items.get('backend') or None
+        if 'config' in items:
+            self.config = items['config'].split()
 
     def has_caps(self, caps):
         if not isinstance(caps, (list, tuple)):
@@ -89,6 +97,20 @@ class ModuleInfo(object):
                 return True
         return False
 
+    def has_required_config(self, params):
+        """
+        Check if every required configuration keys are in params, without
+        loading the module.
+
+        Returns False if the index doesn't describe the configuration.
+        """
+        if self.config is None:
+            return False
+        for key in self.config:
+            if key.endswith('*') and not params.get(key[:-1]):
+                return False
+        return True
+
     def is_installed(self):
         return self.path is not None
 
@@ -103,7 +125,8 @@ class ModuleInfo(object):
                 ('license', self.license),
                 ('icon', self.icon or ''),
                 ('urls', self.urls),
-               )
+                ('backend', self.backend or ''),
+               ) + ((('config', ' '.join(self.config)),) if self.config is not None else ())
 
 
 class RepositoryUnavailable(Exception):
@@ -300,6 +323,8 @@ class Repository(object):
                 m.maintainer = module.maintainer
                 m.license = module.license
                 m.icon = module.icon or ''
+                m.backend = module.klass.__name__
+                m.config = [key + ('*' if value.required else '') for key, value in module.config.iteritems()]
                 self.modules[module.name] = m
 
         self.update = int(datetime.now().strftime('%Y%m%d%H%M'))
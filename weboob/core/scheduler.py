@@ -20,17 +20,22 @@
 
 from __future__ import print_function
 
-from threading import Event, RLock
+import heapq
+import random
+from collections import deque
+from threading import Condition, Event, Lock, RLock, Thread
+from time import time
 try:
     from threading import _Timer as Timer
 except ImportError:
     from threading import Timer
 
+from weboob.core.workers import WorkersPool
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace
 
 
-__all__ = ['Scheduler']
+__all__ = ['Scheduler', 'HeapScheduler']
 
 
 class IScheduler(object):
@@ -140,3 +145,311 @@ class Scheduler(IScheduler):
                 # Contrary to _wait_to_stop(), don't call t.join
                 # because want_stop() have to be non-blocking.
             self.queue = {}
+
+
+class ScheduledJob(object):
+    """
+    A function scheduled by :class:`HeapScheduler`.
+    """
+
+    def __init__(self, id, interval, function, args, repeat):
+        self.id = id
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.repeat = repeat
+        # time of the next run, without jitter
+        self.next_run = None
+        self.canceled = False
+        self.running = False
+        self.rerun = False
+
+        self.stats = {'runs':       0,
+                      'errors':     0,
+                      'misfires':   0,
+                      'total_time': 0.0,
+                      'max_time':   0.0,
+                      'last_run':   None,
+                     }
+
+    @property
+    def name(self):
+        return getattr(self.function, '__name__', repr(self.function))
+
+
+class HeapScheduler(IScheduler):
+    """
+    Scheduler using a single timer thread.
+
+    Jobs are kept in a heap sorted by their next run time. The timer thread
+    sleeps until the first one is due, and then gives it to a
+    :class:`weboob.core.workers.WorkersPool` of at most *max_workers*
+    threads, so only a few threads are needed for hundreds of jobs.
+
+    A repeated job is called at once, and then every *interval* seconds. It
+    never runs concurrently with itself.
+
+    A run is a misfire when the job is still running, or when it is late by
+    more than *misfire_grace* seconds (for example after a suspend). With
+    the :attr:`MISFIRE_RUN` policy, it is run once as soon as possible, and
+    with :attr:`MISFIRE_SKIP` it is skipped. Missed runs of a repeated job
+    are never run more than once.
+
+    :param max_workers: maximum number of threads running jobs
+    :type max_workers: :class:`int`
+    :param jitter: every run is delayed by a random number of seconds
+                   between 0 and *jitter*, to spread jobs with the same
+                   interval
+    :type jitter: :class:`float`
+    :param misfire: policy for misfires, :attr:`MISFIRE_RUN` or
+                    :attr:`MISFIRE_SKIP`
+    :type misfire: :class:`str`
+    :param misfire_grace: number of seconds a run can be late
+    :type misfire_grace: :class:`float`
+    """
+
+    MISFIRE_RUN = 'run'
+    MISFIRE_SKIP = 'skip'
+
+    IDLE_TIMEOUT = 60
+
+    def __init__(self, max_workers=4, jitter=0, misfire=MISFIRE_RUN, misfire_grace=1):
+        assert misfire in (self.MISFIRE_RUN, self.MISFIRE_SKIP)
+
+        self.logger = getLogger('scheduler')
+        self.jitter = jitter
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+
+        self.cond = Condition(Lock())
+        self.stop_event = Event()
+        self.pool = WorkersPool(max_workers, name='scheduler')
+        self.thread = None
+        self.count = 0
+        # id -> ScheduledJob
+        self.jobs = {}
+        # (time, id) of next runs
+        self.heap = []
+        # misfired jobs to run again as soon as they are finished
+        self.reruns = deque()
+
+    def schedule(self, interval, function, *args):
+        return self._schedule(interval, function, args, False)
+
+    def repeat(self, interval, function, *args):
+        return self._schedule(interval, function, args, True)
+
+    def _schedule(self, interval, function, args, repeat):
+        if self.stop_event.isSet():
+            return
+
+        with self.cond:
+            self.count += 1
+            job = ScheduledJob(self.count, interval, function, args, repeat)
+            job.next_run = time() + (0 if repeat else interval)
+            self.jobs[job.id] = job
+            self._push(job)
+            self.logger.debug('function "%s" will be called in %s seconds' % (job.name, job.next_run - time()))
+
+            if self.thread is None:
+                self.thread = Thread(target=self._timer_run, name='scheduler-timer')
+                self.thread.daemon = True
+                self.thread.start()
+            else:
+                self.cond.notify()
+            return job.id
+
+    def _push(self, job):
+        when = job.next_run
+        if self.jitter:
+            when += random.uniform(0, self.jitter)
+        heapq.heappush(self.heap, (when, job.id))
+
+    def _timer_run(self):
+        with self.cond:
+            while not self.stop_event.isSet():
+                while self.reruns:
+                    job = self.reruns.popleft()
+                    if job.canceled:
+                        job.running = False
+                    else:
+                        self.pool.submit(job.id, self._run_job, job)
+
+                now = time()
+                while self.heap and self.heap[0][0] <= now:
+                    when, id = heapq.heappop(self.heap)
+                    job = self.jobs.get(id)
+                    if job is not None:
+                        self._fire(job, now - when, now)
+
+                # wait for the next job, or for a notify() when a job is added
+                # or has to be run again
+                if self.heap:
+                    self.cond.wait(self.heap[0][0] - now)
+                else:
+                    self.cond.wait()
+
+    def _fire(self, job, late, now):
+        if job.running or late > self.misfire_grace:
+            job.stats['misfires'] += 1
+            self.logger.debug('function "%s" misfired (%.1fs late%s)' % (job.name, late,
+                                                                        ', still running' if job.running else ''))
+            if self.misfire == self.MISFIRE_RUN:
+                if job.running:
+                    job.rerun = True
+                else:
+                    self._submit(job)
+        else:
+            self._submit(job)
+
+        if job.repeat:
+            job.next_run += job.interval
+            if job.next_run <= now:
+                # do not try to catch up missed runs
+                job.next_run += (int((now - job.next_run) / job.interval) + 1) * job.interval
+            self._push(job)
+        else:
+            self.jobs.pop(job.id, None)
+
+    def _submit(self, job):
+        job.running = True
+        self.pool.submit(job.id, self._run_job, job)
+
+    def _run_job(self, job):
+        with self.cond:
+            if job.canceled:
+                job.running = False
+                return
+
+        start = time()
+        error = False
+        try:
+            job.function(*job.args)
+        except Exception:
+            # do not stop a repeated job because of an exception
+            self.logger.error('Uncaught exception in scheduled function "%s":\n%s' % (job.name, get_backtrace()))
+            error = True
+        finally:
+            elapsed = time() - start
+            with self.cond:
+                job.stats['runs'] += 1
+                job.stats['errors'] += int(error)
+                job.stats['total_time'] += elapsed
+                job.stats['max_time'] = max(job.stats['max_time'], elapsed)
+                job.stats['last_run'] = start
+
+                if job.rerun and not job.canceled and not self.stop_event.isSet():
+                    # The job is still marked as running until the timer
+                    # thread submits it again, as a job submitted by a worker
+                    # is run at once by this worker, which would keep it
+                    # busy with the same job.
+                    self.reruns.append(job)
+                    self.cond.notify()
+                else:
+                    job.running = False
+                job.rerun = False
+
+    def cancel(self, ev):
+        with self.cond:
+            job = self.jobs.pop(ev, None)
+            if job is None:
+                return False
+            # the job is removed from heap when it is due
+            job.canceled = True
+            self.logger.debug('scheduled function "%s" is canceled' % job.name)
+            return True
+
+    def get_stats(self):
+        """
+        Get statistics about scheduled jobs.
+
+        :returns: statistics of every jobs, by identifier
+        :rtype: :class:`dict`
+        """
+        with self.cond:
+            stats = {}
+            for job in self.jobs.itervalues():
+                s = dict(job.stats)
+                s['function'] = job.name
+                s['interval'] = job.interval
+                s['avg_time'] = s['total_time'] / s['runs'] if s['runs'] else 0.0
+                stats[job.id] = s
+            return stats
+
+    def idle(self):
+        """
+        Called in loop by :meth:`run` until the scheduler is stopped.
+
+        Override it to handle other events in the main thread.
+        """
+        # A timeout is needed to get KeyboardInterrupt.
+        self.stop_event.wait(self.IDLE_TIMEOUT)
+
+    def _wait_to_stop(self):
+        self.want_stop()
+        if self.thread is not None:
+            self.thread.join()
+        self.pool.stop(wait=True)
+
+    def run(self):
+        try:
+            while not self.stop_event.isSet():
+                self.idle()
+        except KeyboardInterrupt:
+            self._wait_to_stop()
+            raise
+        else:
+            self._wait_to_stop()
+        return True
+
+    def want_stop(self):
+        self.stop_event.set()
+        with self.cond:
+            for job in self.jobs.itervalues():
+                job.canceled = True
+            self.jobs = {}
+            self.heap = []
+            self.reruns.clear()
+            self.cond.notify()
+        self.pool.stop()
+
+
+def test():
+    from threading import current_thread
+    from time import sleep
+
+    scheduler = HeapScheduler(max_workers=2)
+
+    done = Event()
+    calls = []
+    scheduler.schedule(0.05, lambda: (calls.append('once'), done.set()))
+    ev = scheduler.repeat(0.02, calls.append, 'repeat')
+    assert done.wait(5)
+    assert calls.count('once') == 1
+    assert calls.count('repeat') >= 2
+    assert scheduler.cancel(ev)
+    assert not scheduler.cancel(ev)
+    # a run started before cancel() can still be finishing
+    sleep(0.02)
+    count = calls.count('repeat')
+    sleep(0.1)
+    assert calls.count('repeat') == count
+
+    # a job still running when it is due misfires, and is run once after,
+    # by a worker of the pool
+    threads = []
+
+    def slow_job():
+        threads.append(current_thread().name)
+        sleep(0.1)
+    slow = scheduler.repeat(0.01, slow_job)
+    sleep(0.25)
+    stats = scheduler.get_stats()[slow]
+    assert stats['misfires'] > 0
+    assert stats['runs'] >= 2
+    assert stats['max_time'] >= 0.1
+    assert all(name.startswith('scheduler-') for name in threads)
+
+    scheduler.schedule(0, scheduler.want_stop)
+    assert scheduler.run()
+    assert scheduler.schedule(0, calls.append, 'after stop') is None
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from collections import deque
+from threading import Condition, Lock, Thread, current_thread, local
+from time import time
+
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
+
+
+__all__ = ['WorkersPool']
+
+
+class WorkersPool(object):
+    """
+    Bounded pool of threads used to run jobs on backends.
+
+    Threads are created on demand, up to *max_workers*, and are then kept
+    alive to run next jobs.
+
+    Jobs are submitted with a key (usually the backend). Jobs sharing the same
+    key are never run concurrently: they are queued and run in order, so a
+    worker never waits on the lock of a backend busy with another job.
+
+    :param max_workers: maximum number of threads
+    :type max_workers: :class:`int`
+    :param name: name of pool, used in logs and threads names
+    :type name: :class:`str`
+    """
+
+    def __init__(self, max_workers=10, name='workers'):
+        assert max_workers > 0
+
+        self.logger = getLogger(name)
+        self.name = name
+        self.max_workers = max_workers
+
+        self.cond = Condition(Lock())
+        self.workers = []
+        self.idle = 0
+        self.stopping = False
+        # key -> deque of (function, args, submit time)
+        self.pending = {}
+        # keys which have a job to run and no running job
+        self.ready = deque()
+        self.running = set()
+        self.local = local()
+
+        self.stats = {'submitted':       0,
+                      'completed':       0,
+                      'threads_created': 0,
+                      'queue_depth':     0,
+                      'max_queue_depth': 0,
+                      'total_wait':      0.0,
+                      'max_wait':        0.0,
+                     }
+
+    def is_worker(self):
+        """
+        Check if the current thread is a worker of this pool.
+        """
+        return getattr(self.local, 'worker', False)
+
+    def submit(self, key, function, *args):
+        """
+        Submit a job.
+
+        If the caller is itself a job of this pool, the new job is run at
+        once in the calling worker, to prevent every workers from waiting on
+        jobs they can't run without starting threads outside of the pool.
+
+        :param key: jobs with the same key are run one at a time
+        :param function: function to call
+        :type function: callable
+        :param args: arguments to give to function
+        """
+        if self.is_worker():
+            with self.cond:
+                self.stats['submitted'] += 1
+            self._run_job(function, args)
+            with self.cond:
+                self.stats['completed'] += 1
+            return
+
+        self.post(key, function, *args)
+
+    def post(self, key, function, *args):
+        """
+        Queue a job, even if the caller is a job of this pool.
+
+        As the job may wait for a free worker, a caller which needs its
+        result must be able to run it itself if it is not started yet.
+
+        :param key: jobs with the same key are run one at a time
+        :param function: function to call
+        :type function: callable
+        :param args: arguments to give to function
+        """
+        with self.cond:
+            self.stopping = False
+
+            jobs = self.pending.setdefault(key, deque())
+            jobs.append((function, args, time()))
+            if len(jobs) == 1 and key not in self.running:
+                self.ready.append(key)
+
+            self.stats['submitted'] += 1
+            self.stats['queue_depth'] += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.stats['queue_depth'])
+
+            # Idle workers which are already woken up are still counted, so
+            # compare them with the number of ready keys.
+            if len(self.ready) > self.idle and len(self.workers) < self.max_workers:
+                self._start_worker()
+            else:
+                self.cond.notify()
+
+    def _start_worker(self):
+        thread = Thread(target=self._worker_run, name='%s-%d' % (self.name, self.stats['threads_created']))
+        thread.daemon = True
+        self.workers.append(thread)
+        self.stats['threads_created'] += 1
+        thread.start()
+
+    def _next_job(self):
+        with self.cond:
+            while not self.ready:
+                if self.stopping:
+                    self.workers.remove(current_thread())
+                    return None, None
+                self.idle += 1
+                try:
+                    self.cond.wait()
+                finally:
+                    self.idle -= 1
+
+            key = self.ready.popleft()
+            function, args, submitted = self.pending[key].popleft()
+            self.running.add(key)
+
+            wait = time() - submitted
+            self.stats['queue_depth'] -= 1
+            self.stats['total_wait'] += wait
+            self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+
+            return key, (function, args)
+
+    def _job_done(self, key):
+        with self.cond:
+            self.running.discard(key)
+            self.stats['completed'] += 1
+            if self.pending[key]:
+                self.ready.append(key)
+            else:
+                self.pending.pop(key)
+
+    def _worker_run(self):
+        self.local.worker = True
+        while True:
+            key, job = self._next_job()
+            if job is None:
+                return
+
+            function, args = job
+            try:
+                self._run_job(function, args)
+            finally:
+                self._job_done(key)
+
+    def _run_job(self, function, args):
+        try:
+            function(*args)
+        except Exception:
+            self.logger.error('Uncaught exception in job %r:\n%s' % (function, get_backtrace()))
+
+    def get_stats(self):
+        """
+        Get statistics about this pool.
+
+        :rtype: :class:`dict`
+        """
+        with self.cond:
+            stats = dict(self.stats)
+            stats['threads'] = len(self.workers)
+            stats['idle'] = self.idle
+            stats['avg_wait'] = stats['total_wait'] / stats['completed'] if stats['completed'] else 0.0
+            return stats
+
+    def stop(self, wait=False):
+        """
+        Stop workers.
+
+        Running and queued jobs are completed before workers exit. The pool
+        can still be used after that, as new workers are created if needed.
+
+        :param wait: if True, wait for workers to exit
+        :type wait: :class:`bool`
+        """
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+            workers = list(self.workers)
+
+        if wait:
+            for thread in workers:
+                thread.join()
+
+
+def test():
+    from threading import Event, RLock
+
+    pool = WorkersPool(max_workers=2)
+
+    # jobs with the same key are never run concurrently
+    lock = RLock()
+    done = []
+    finished = Event()
+
+    def job(i):
+        assert lock.acquire(False)
+        try:
+            done.append(i)
+        finally:
+            lock.release()
+        if len(done) == 10:
+            finished.set()
+
+    for i in xrange(10):
+        pool.submit('key', job, i)
+    finished.wait(5)
+    assert done == range(10)
+
+    stats = pool.get_stats()
+    assert stats['submitted'] == 10
+    assert stats['threads'] <= 2
+
+    # nested jobs do not wait for a free worker, and are run by the worker
+    # which submits them
+    threads = pool.get_stats()['threads_created']
+    nested = []
+    outer_done = Event()
+
+    def outer():
+        caller = current_thread()
+        pool.submit('other', lambda: nested.append(current_thread() is caller))
+        if len(nested) == 2:
+            outer_done.set()
+
+    pool.submit('a', outer)
+    pool.submit('b', outer)
+    assert outer_done.wait(5)
+    assert nested == [True, True]
+    assert pool.get_stats()['threads_created'] == threads
+
+    # posted jobs are queued even by a worker, which may run them later
+    posted = []
+    posted_done = Event()
+    returned = Event()
+
+    def poster():
+        caller = current_thread()
+        pool.post('other', lambda: (posted.append(current_thread() is caller and not returned.is_set()),
+                                    posted_done.set()))
+        returned.set()
+
+    pool.submit('a', poster)
+    assert posted_done.wait(5)
+    assert posted == [False]
+
+    pool.stop(wait=True)
+    assert pool.get_stats()['threads'] == 0
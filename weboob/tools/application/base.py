@@ -161,6 +161,8 @@ class BaseApplication(object):
         logging_options.add_option('-v', '--verbose', action='store_true', help='display info messages')
         logging_options.add_option('--logging-file', action='store', type='string', dest='logging_file', help='file to save logs')
         logging_options.add_option('-a', '--save-responses', action='store_true', help='save every response')
+        logging_options.add_option('--replay-responses', action='store', type='string', dest='replay_responses',
+                                   metavar='DIR', help='serve responses saved with -a in DIR instead of requesting websites')
         self._parser.add_option_group(logging_options)
         self._parser.add_option('--shell-completion', action='store_true', help=optparse.SUPPRESS_HELP)
         self._is_default_count = True
@@ -180,17 +182,34 @@ class BaseApplication(object):
         :param localonly: If True, do not set it on the :class:`Weboob` object.
         :type localonly: :class:`bool`
         :rtype: :class:`weboob.tools.storage.IStorage`
-        """
-        if klass is None:
-            from weboob.tools.storage import StandardStorage
-            klass = StandardStorage
 
+        If klass is not given and the WEBOOB_STORAGE environment variable is
+        ``sqlite``, a :class:`weboob.tools.storage.SQLiteStorage` is used,
+        stored in path with a ``.db`` suffix. The YAML file is imported in
+        it if the database doesn't exist yet.
+        """
         if path is None:
             path = os.path.join(self.CONFDIR, self.APPNAME + '.storage')
         elif not os.path.sep in path:
             path = os.path.join(self.CONFDIR, path)
 
+        yaml_path = None
+        if klass is None:
+            if os.environ.get('WEBOOB_STORAGE', '').lower() == 'sqlite':
+                from weboob.tools.storage import SQLiteStorage
+                klass = SQLiteStorage
+                # same name than with tools/migrate_storage.py
+                if not os.path.exists(path + '.db') and os.path.exists(path):
+                    yaml_path = path
+                path += '.db'
+            else:
+                from weboob.tools.storage import StandardStorage
+                klass = StandardStorage
+
         storage = klass(path)
+        if yaml_path is not None:
+            self.logger.info(u'Import storage %s in %s' % (yaml_path, path))
+            storage.import_yaml(yaml_path)
         self.storage = ApplicationStorage(self.APPNAME, storage)
         self.storage.load(self.STORAGE)
 
@@ -259,11 +278,15 @@ class BaseApplication(object):
             backend.fillobj(obj, fields)
         return obj
 
-    def _do_complete_iter(self, backend, count, fields, res):
+    def _do_complete_iter(self, backend, count, fields, res, sorted_on=None):
         modif = 0
+        res = (self._do_complete_obj(backend, (), sub) for sub in res)
+        if fields is None or len(fields) > 0:
+            res = backend.fillobj_many(res, fields)
         for i, sub in enumerate(res):
-            sub = self._do_complete_obj(backend, fields, sub)
             if self.condition and not self.condition.is_valid(sub):
+                if sorted_on is not None and self.condition.is_exhausted(sub, *sorted_on):
+                    return
                 modif += 1
             else:
                 if count and i - modif == count:
@@ -281,7 +304,10 @@ class BaseApplication(object):
             res = getattr(backend, function)(*args, **kwargs)
 
         if hasattr(res, '__iter__'):
-            return self._do_complete_iter(backend, count, selected_fields, res)
+            sorted_on = None
+            if not callable(function):
+                sorted_on = backend.SORTED_RESULTS.get(function)
+            return self._do_complete_iter(backend, count, selected_fields, res, sorted_on)
         else:
             return self._do_complete_obj(backend, selected_fields, res)
 
@@ -360,6 +386,13 @@ class BaseApplication(object):
 
         handlers = []
 
+        if self.options.save_responses and self.options.replay_responses:
+            self._parser.error('options -a and --replay-responses are mutually exclusive')
+
+        if self.options.replay_responses:
+            log_settings['replay_responses'] = True
+            log_settings['responses_dirname'] = self.options.replay_responses
+
         if self.options.save_responses:
             responses_dirname = tempfile.mkdtemp(prefix='weboob_session_')
             print('Debug data will be saved in this directory: %s' % responses_dirname, file=sys.stderr)
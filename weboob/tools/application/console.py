@@ -35,6 +35,7 @@ from weboob.capabilities.account import ICapAccount, Account, AccountRegisterErr
 from weboob.core.backendscfg import BackendAlreadyExists
 from weboob.core.modules import ModuleLoadError
 from weboob.core.repositories import ModuleInstallError
+from weboob.tools.backend import BaseBackend
 from weboob.tools.exceptions import BrowserUnavailable, BrowserIncorrectPassword, BrowserForbidden
 from weboob.tools.value import Value, ValueBool, ValueFloat, ValueInt, ValueBackendPassword
 from weboob.tools.misc import to_unicode
@@ -543,6 +544,9 @@ class ConsoleApplication(BaseApplication):
             print(u'      %s   please contact: %s <%s@issues.weboob.org>' % (' ' * len(backend.name), backend.MAINTAINER, backend.NAME), file=sys.stderr)
         elif isinstance(error, UserError):
             print(u'Error(%s): %s' % (backend.name, to_unicode(error)), file=sys.stderr)
+        elif isinstance(error, (BaseBackend.ConfigError, ModuleLoadError)):
+            # Lazy backends are only created at their first call.
+            print(u'Error(%s): %s' % (backend.name, to_unicode(error)), file=sys.stderr)
         elif isinstance(error, MoreResultsAvailable):
             print(u'Hint: There are more results for backend %s' % (backend.name), file=sys.stderr)
         elif isinstance(error, SSLError):
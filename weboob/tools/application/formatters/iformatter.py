@@ -22,7 +22,7 @@ from __future__ import print_function
 
 import os
 import sys
-import subprocess
+import struct
 if sys.platform == 'win32':
     import WConio
 
@@ -60,12 +60,17 @@ else:
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 from weboob.capabilities.base import CapBaseObject
 from weboob.tools.application.console import ConsoleApplication
 from weboob.tools.ordereddict import OrderedDict
 
 
-__all__ = ['IFormatter', 'MandatoryFieldsNotFound']
+__all__ = ['IFormatter', 'MandatoryFieldsNotFound', 'OutputWriter']
 
 
 class MandatoryFieldsNotFound(Exception):
@@ -73,6 +78,74 @@ class MandatoryFieldsNotFound(Exception):
         Exception.__init__(self, u'Mandatory fields not found: %s.' % ', '.join(missing_fields))
 
 
+def get_term_rows(fp=sys.stdout):
+    """
+    Get the number of rows of the terminal, or 0 if it is unknown.
+    """
+    if sys.platform == 'win32':
+        return WConio.gettextinfo()[8]
+
+    if fcntl is not None:
+        try:
+            rows, cols = struct.unpack('hh', fcntl.ioctl(fp.fileno(), termios.TIOCGWINSZ, '    '))
+        except (IOError, AttributeError, struct.error):
+            pass
+        else:
+            if rows > 0:
+                return rows
+
+    try:
+        return int(os.environ.get('LINES', 0))
+    except ValueError:
+        return 0
+
+
+class OutputWriter(object):
+    """
+    Output of formatters.
+
+    Unicode strings are encoded, and a file given by its path is opened only
+    once, on the first write, and written through a buffer.
+
+    :param dest: path of a file, opened in append mode, or file object
+    :type dest: :class:`str` or :class:`file`
+    :param encoding: encoding of unicode strings
+    :type encoding: :class:`str`
+    """
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, dest, encoding='utf-8'):
+        self.dest = dest
+        self.encoding = encoding
+        self.fp = None
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        if self.fp is None:
+            if isinstance(self.dest, basestring):
+                self.fp = open(self.dest, 'ab', self.BUFFER_SIZE)
+            else:
+                self.fp = self.dest
+        self.fp.write(data)
+
+    def flush(self):
+        if self.fp is not None:
+            self.fp.flush()
+
+    def close(self):
+        """
+        Flush data, and close the file if it has been opened by this object.
+        """
+        if self.fp is None:
+            return
+        if self.fp is self.dest:
+            self.fp.flush()
+        else:
+            self.fp.close()
+        self.fp = None
+
+
 class IFormatter(object):
     MANDATORY_FIELDS = None
 
@@ -93,36 +166,66 @@ class IFormatter(object):
         self.interactive = False
         self.print_lines = 0
         self.termrows = 0
+        self._writer = None
         self.outfile = outfile
         # XXX if stdin is not a tty, it seems that the command fails.
 
         if os.isatty(sys.stdout.fileno()) and os.isatty(sys.stdin.fileno()):
-            if sys.platform == 'win32':
-                self.termrows = WConio.gettextinfo()[8]
-            else:
-                self.termrows = int(
-                    subprocess.Popen('stty size', shell=True, stdout=subprocess.PIPE).communicate()[0].split()[0]
-                )
+            self.termrows = get_term_rows(sys.stdout)
+
+    @property
+    def outfile(self):
+        """
+        Where formatted objects are written: a path or a file object.
+        """
+        return self._outfile
+
+    @outfile.setter
+    def outfile(self, outfile):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._outfile = outfile
+
+    @property
+    def writer(self):
+        """
+        :class:`OutputWriter` of :attr:`outfile`.
+        """
+        if self._writer is None:
+            self._writer = OutputWriter(self.outfile)
+        return self._writer
 
     def output(self, formatted):
         if self.outfile != sys.stdout:
-            with open(self.outfile, "a+") as outfile:
-                outfile.write(formatted.encode('utf-8') + os.linesep)
+            self.writer.write(formatted)
+            self.writer.write(os.linesep)
+
+        elif not self.termrows:
+            self.writer.write(formatted)
+            self.writer.write('\n')
 
         else:
             for line in formatted.split('\n'):
-                if self.termrows and (self.print_lines + 1) >= self.termrows:
-                    self.outfile.write(PROMPT)
-                    self.outfile.flush()
+                if (self.print_lines + 1) >= self.termrows:
+                    self.writer.write(PROMPT)
+                    self.writer.flush()
                     readch()
-                    self.outfile.write('\b \b' * len(PROMPT))
+                    self.writer.write('\b \b' * len(PROMPT))
                     self.print_lines = 0
 
-                if isinstance(line, unicode):
-                    line = line.encode('utf-8')
-                print(line)
+                self.writer.write(line)
+                self.writer.write('\n')
                 self.print_lines += 1
 
+    def flush_output(self):
+        """
+        Write buffered output. It is called by the application after
+        :meth:`flush`.
+        """
+        if self._writer is not None:
+            self._writer.flush()
+
     def start_format(self, **kwargs):
         pass
 
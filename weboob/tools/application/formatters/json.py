@@ -18,9 +18,7 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
-from __future__ import print_function
-
-from weboob.capabilities.base import NotAvailable, NotLoaded
+from weboob.capabilities.base import CapBaseObject, NotAvailable, NotLoaded
 from weboob.tools.json import json
 
 from .iformatter import IFormatter
@@ -32,32 +30,45 @@ class Encoder(json.JSONEncoder):
     "generic weboob object encoder"
 
     def default(self, obj):
-        try:
-            return json.JSONEncoder.default(self, obj)
-        except TypeError:
-            if obj is NotAvailable or obj is NotLoaded:
-                return None
+        # JSONEncoder.default() only raises TypeError, so do not call it.
+        if obj is NotAvailable or obj is NotLoaded:
+            return None
 
-            try:
-                dct = obj.to_dict()
-            except AttributeError:
-                return str(obj)
-            return dct
+        if isinstance(obj, CapBaseObject):
+            return obj.to_dict()
+
+        try:
+            dct = obj.to_dict()
+        except AttributeError:
+            return str(obj)
+        return dct
 
 
 class JsonFormatter(IFormatter):
     """
     Formats the whole list as a single JSON list object.
+
+    Objects are written as they come, so the list is not kept in memory.
     """
     def __init__(self):
         IFormatter.__init__(self)
-        self.queue = []
+        self.encoder = Encoder()
+        self.started = False
 
     def flush(self):
-        print(json.dumps(self.queue, cls=Encoder))
+        if self.started:
+            self.output(u']')
+        else:
+            self.output(u'[]')
+        self.started = False
 
     def format_dict(self, item):
-        self.queue.append(item)
+        if self.started:
+            self.writer.write(u', ')
+        else:
+            self.writer.write(u'[')
+            self.started = True
+        self.writer.write(self.encoder.encode(item))
 
 
 class JsonLineFormatter(IFormatter):
@@ -65,5 +76,9 @@ class JsonLineFormatter(IFormatter):
     Formats the list as received, with a JSON object per line.
     The advantage is that it can be streamed.
     """
+    def __init__(self):
+        IFormatter.__init__(self)
+        self.encoder = Encoder()
+
     def format_dict(self, item):
-        print(json.dumps(item, cls=Encoder))
+        self.output(self.encoder.encode(item))
@@ -18,7 +18,7 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
-from __future__ import print_function
+from cgi import escape
 
 from prettytable import PrettyTable
 
@@ -33,16 +33,33 @@ __all__ = ['TableFormatter', 'HTMLTableFormatter']
 class TableFormatter(IFormatter):
     HTML = False
 
+    MAX_QUEUE = 1000
+    """
+    Above this number of rows, the widths of columns are computed on the
+    first rows, and next rows are written as they come, so memory usage is
+    bounded. In this mode, every columns are displayed, and values larger than
+    their column are not truncated.
+    """
+
     def __init__(self):
         IFormatter.__init__(self)
         self.queue = []
         self.keys = None
         self.header = None
+        self.widths = None
 
     def flush(self):
+        if self.widths is not None:
+            if not self.HTML:
+                self.output(self.get_border())
+            else:
+                self.output(u'</table>')
+            self.widths = None
+            return
+
         s = self.get_formatted_table()
         if s is not None:
-            print(s.encode('utf-8'))
+            self.output(s)
 
     def get_formatted_table(self):
         if len(self.queue) == 0:
@@ -50,6 +67,7 @@ class TableFormatter(IFormatter):
 
         queue = [() for i in xrange(len(self.queue))]
         column_headers = []
+        headers = self.get_column_headers()
         # Do not display columns when all values are NotLoaded or NotAvailable
         for i in xrange(len(self.keys)):
             available = False
@@ -58,7 +76,7 @@ class TableFormatter(IFormatter):
                     available = True
                     break
             if available:
-                column_headers.append(self.keys[i].capitalize().replace('_', ' '))
+                column_headers.append(headers[i])
                 for j in xrange(len(self.queue)):
                     queue[j] += (self.queue[j][i],)
 
@@ -90,10 +108,57 @@ class TableFormatter(IFormatter):
 
         return s
 
+    def get_column_headers(self):
+        return [key.capitalize().replace('_', ' ') for key in self.keys]
+
+    def get_border(self):
+        return u'+%s+' % u'+'.join(u'-' * (width + 2) for width in self.widths)
+
+    def get_row(self, values, tag=u'td'):
+        if self.HTML:
+            return u'<tr>%s</tr>' % u''.join(u'<%s>%s</%s>' % (tag, escape(u'%s' % value), tag) for value in values)
+
+        cells = []
+        for width, value in zip(self.widths, values):
+            value = u'%s' % value
+            cells.append(value + u' ' * (width - len(value)))
+        return u'| %s |' % u' | '.join(cells)
+
+    def start_stream(self):
+        """
+        Write queued rows, with widths of columns computed on them, and write
+        next rows as they come.
+        """
+        headers = self.get_column_headers()
+        self.widths = [len(header) for header in headers]
+        for line in self.queue:
+            for i, value in enumerate(line):
+                self.widths[i] = max(self.widths[i], len(u'%s' % value))
+
+        lines = []
+        if self.display_header and self.header:
+            lines.append(u'<p>%s</p>' % self.header if self.HTML else self.header)
+        if self.HTML:
+            lines.append(u'<table>')
+            lines.append(self.get_row(headers, u'th'))
+        else:
+            lines += [self.get_border(), self.get_row(headers), self.get_border()]
+        lines += [self.get_row(line) for line in self.queue]
+        self.queue = []
+
+        self.output(u'\n'.join(lines))
+
     def format_dict(self, item):
         if self.keys is None:
             self.keys = item.keys()
+
+        if self.widths is not None:
+            self.output(self.get_row(item.values()))
+            return
+
         self.queue.append(item.values())
+        if len(self.queue) >= self.MAX_QUEUE:
+            self.start_stream()
 
     def set_header(self, string):
         self.header = string
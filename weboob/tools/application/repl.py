@@ -30,12 +30,14 @@ import sys
 
 from weboob.capabilities.base import FieldNotFound, CapBaseObject, UserError
 from weboob.core import CallErrors
+from weboob.core.daemon import DaemonClient
 from weboob.tools.application.formatters.iformatter import MandatoryFieldsNotFound
 from weboob.tools.misc import to_unicode
 from weboob.tools.path import WorkingPath
 from weboob.tools.ordereddict import OrderedDict
 from weboob.capabilities.collection import Collection, BaseCollection, ICapCollection, CollectionNotFound
 
+from .base import MoreResultsAvailable
 from .console import BackendNotGiven, ConsoleApplication
 from .formatters.load import FormattersLoader, FormatterLoadError
 from .results import ResultsCondition, ResultsConditionError
@@ -141,6 +143,8 @@ class ReplApplication(Cmd, ConsoleApplication):
         results_options.add_option('-n', '--count', type='int',
                                    help='limit number of results (from each backends)')
         results_options.add_option('-s', '--select', help='select result item keys to display (comma separated)')
+        results_options.add_option('--timeout', type='float',
+                                   help='stop waiting for backends after this delay (in seconds)')
         self._parser.add_option_group(results_options)
 
         formatting_options = OptionGroup(self._parser, 'Formatting Options')
@@ -152,6 +156,10 @@ class ReplApplication(Cmd, ConsoleApplication):
         formatting_options.add_option('-O', '--outfile', dest='outfile', help='file to export result')
         self._parser.add_option_group(formatting_options)
 
+        self._parser.add_option('--daemon', action='store_true',
+                                help='send calls to the daemon started by weboobd, which keeps backends logged in')
+        self.daemon = None
+
         self._interactive = False
         self.working_path = WorkingPath()
         self._change_prompt()
@@ -326,6 +334,9 @@ class ReplApplication(Cmd, ConsoleApplication):
     def do(self, function, *args, **kwargs):
         """
         Call Weboob.do(), passing count and selected fields given by user.
+
+        With the --daemon option, methods of backends are called by the
+        daemon, see :class:`weboob.core.daemon.DaemonClient`.
         """
         backends = kwargs.pop('backends', None)
         if backends is None:
@@ -343,6 +354,13 @@ class ReplApplication(Cmd, ConsoleApplication):
             fields = []
         elif '$full' in fields:
             fields = None
+        if self.options.timeout is not None:
+            kwargs.setdefault('call_timeout', self.options.timeout)
+        if self.daemon is not None and isinstance(function, basestring):
+            # Results are completed by the daemon.
+            more = MoreResultsAvailable if self._is_default_count else None
+            return self.daemon.do(function, *args, fields=fields, count=self.options.count,
+                                  condition=self.condition, more=more, **kwargs)
         return self.weboob.do(self._do_complete, self.options.count, fields, function, *args, **kwargs)
 
     # -- command tools ------------
@@ -513,6 +531,13 @@ class ReplApplication(Cmd, ConsoleApplication):
         else:
             self.condition = None
 
+        if self.options.daemon:
+            daemon = DaemonClient(self.weboob)
+            if daemon.is_running():
+                self.daemon = daemon
+            else:
+                logging.warning(u'No daemon is running, start it with weboobd. Backends are called by this process.')
+
         return super(ReplApplication, self)._handle_options()
 
     def get_command_help(self, command, short=False):
@@ -1242,3 +1267,4 @@ class ReplApplication(Cmd, ConsoleApplication):
 
     def flush(self):
         self.formatter.flush()
+        self.formatter.flush_output()
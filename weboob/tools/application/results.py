@@ -19,6 +19,7 @@
 
 import weboob.tools.date as date_utils
 from weboob.capabilities import UserError
+from weboob.capabilities.base import CapBaseObject, NotLoadedType, NotAvailableType
 from datetime import date
 
 
@@ -34,11 +35,63 @@ class ResultsConditionError(UserError):
     pass
 
 
+_INVALID = object()
+
+
 class Condition(object):
     def __init__(self, left, op, right):
         self.left = left  # Field of the object to test
         self.op = op
         self.right = right
+        self.function = functions[op]
+        # type of values -> right value converted to this type
+        self.typed = {}
+
+    def convert(self, value):
+        """
+        Get the right value converted to the type of *value*, or _INVALID.
+        """
+        try:
+            return self.typed[type(value)]
+        except KeyError:
+            pass
+
+        # We have to change the type of right value, always gived as string
+        # by application
+        try:
+            if isinstance(value, date_utils.date):
+                tocompare = date(*[int(x) for x in self.right.split('-')])
+            else:
+                tocompare = type(value)(self.right)
+        except Exception:
+            tocompare = _INVALID
+        self.typed[type(value)] = tocompare
+        return tocompare
+
+    def is_valid(self, value):
+        tocompare = self.convert(value)
+        if tocompare is _INVALID:
+            return False
+        try:
+            return self.function(tocompare, value)
+        except Exception:
+            return False
+
+    def is_exhausted(self, value, descending):
+        """
+        Check if no value after this one can be valid, when values are
+        sorted.
+        """
+        tocompare = self.convert(value)
+        if tocompare is _INVALID:
+            return False
+        try:
+            if descending:
+                return (self.op == '>' and value <= tocompare) or (self.op == '=' and value < tocompare)
+            else:
+                return (self.op == '<' and value >= tocompare) or (self.op == '=' and value > tocompare)
+        except Exception:
+            return False
 
 
 def is_egal(left, right):
@@ -91,32 +144,46 @@ class ResultsCondition(IResultsCondition):
         self.condition = or_list
         self.condition_str = condition_str
 
+    def get_value(self, obj, d, field):
+        """
+        Get value of a field, read on object, or in *d* if the object is not
+        a :class:`CapBaseObject`.
+        """
+        if d is not None:
+            try:
+                return d[field]
+            except KeyError:
+                raise ResultsConditionError(u'Field "%s" is not valid.' % field)
+
+        if field == 'id':
+            if obj.id is None:
+                raise ResultsConditionError(u'Field "%s" is not valid.' % field)
+            return obj.id
+        if field not in obj._fields:
+            raise ResultsConditionError(u'Field "%s" is not valid.' % field)
+        return getattr(obj, field)
+
     def is_valid(self, obj):
-        d = obj.to_dict()
+        # Fields are read directly on objects, instead of building a dict of
+        # all of them.
+        d = None if isinstance(obj, CapBaseObject) else obj.to_dict()
         # We evaluate all member of a list at each iteration.
         for _or in self.condition:
             myeval = True
             for condition in _or:
-                if condition.left in d:
-                    # in the case of id, test id@backend and id
-                    if condition.left == 'id':
-                        tocompare = condition.right
-                        evalfullid = functions[condition.op](tocompare, d['id'])
-                        evalid = functions[condition.op](tocompare, obj.id)
-                        myeval = evalfullid or evalid
+                value = self.get_value(obj, d, condition.left)
+                # in the case of id, test id@backend and id
+                if condition.left == 'id':
+                    tocompare = condition.right
+                    if d is not None:
+                        fullid = value
                     else:
-                        # We have to change the type of v, always gived as string by application
-                        typed = type(d[condition.left])
-                        try:
-                            if isinstance(d[condition.left], date_utils.date):
-                                tocompare = date(*[int(x) for x in condition.right.split('-')])
-                            else:
-                                tocompare = typed(condition.right)
-                            myeval = functions[condition.op](tocompare, d[condition.left])
-                        except:
-                            myeval = False
+                        fullid = obj.fullid if obj.backend is not None else obj.id
+                    evalfullid = functions[condition.op](tocompare, fullid)
+                    evalid = functions[condition.op](tocompare, obj.id)
+                    myeval = evalfullid or evalid
                 else:
-                    raise ResultsConditionError(u'Field "%s" is not valid.' % condition.left)
+                    myeval = condition.is_valid(value)
                 # Do not try all AND conditions if one is false
                 if not myeval:
                     break
@@ -126,8 +193,86 @@ class ResultsCondition(IResultsCondition):
         # If we are here, all OR conditions are False
         return False
 
+    def is_exhausted(self, obj, field, descending=False):
+        """
+        Check if no object after this one can be valid, when objects are
+        sorted on a field.
+
+        It is used to stop iterating on results as soon as possible (see
+        :attr:`weboob.tools.backend.BaseBackend.SORTED_RESULTS`).
+
+        :param obj: last object
+        :type obj: :class:`CapBaseObject`
+        :param field: name of field on which objects are sorted
+        :type field: :class:`str`
+        :param descending: objects are sorted in descending order
+        :type descending: :class:`bool`
+        :rtype: :class:`bool`
+        """
+        if not isinstance(obj, CapBaseObject):
+            return False
+        try:
+            value = self.get_value(obj, None, field)
+        except ResultsConditionError:
+            return False
+        if value is None or isinstance(value, (NotLoadedType, NotAvailableType)):
+            return False
+
+        # Every OR conditions have to be false for next objects.
+        for _or in self.condition:
+            if not any(condition.left == field and condition.is_exhausted(value, descending) for condition in _or):
+                return False
+        return True
+
     def __str__(self):
         return unicode(self).encode('utf-8')
 
     def __unicode__(self):
         return self.condition_str
+
+
+def test():
+    from weboob.capabilities.base import NotAvailable
+    from datetime import timedelta
+    from weboob.capabilities.bank import Transaction
+
+    def transaction(day):
+        tr = Transaction(day)
+        tr.date = date(2014, 1, day)
+        # card payments are debited after they are made
+        tr.rdate = tr.date - timedelta(days=1)
+        return tr
+
+    # Newest transactions first.
+    condition = ResultsCondition('date>2014-01-10')
+    assert condition.is_valid(transaction(11))
+    assert not condition.is_exhausted(transaction(11), 'date', True)
+    assert condition.is_exhausted(transaction(10), 'date', True)
+    assert not condition.is_exhausted(transaction(10), 'date', False)
+    # Only conditions on the sorted field can stop the iteration.
+    assert not ResultsCondition('rdate>2014-01-10').is_exhausted(transaction(10), 'date', True)
+
+    condition = ResultsCondition('date=2014-01-10')
+    assert not condition.is_exhausted(transaction(10), 'date', True)
+    assert condition.is_exhausted(transaction(9), 'date', True)
+    assert condition.is_exhausted(transaction(11), 'date', False)
+
+    # Oldest transactions first.
+    condition = ResultsCondition('date<2014-01-10')
+    assert not condition.is_exhausted(transaction(9), 'date', False)
+    assert condition.is_exhausted(transaction(10), 'date', False)
+
+    # Every OR condition has to be exhausted, and one AND condition is
+    # enough.
+    condition = ResultsCondition('date>2014-01-10 OR date=2014-01-05')
+    assert not condition.is_exhausted(transaction(8), 'date', True)
+    assert condition.is_exhausted(transaction(4), 'date', True)
+    condition = ResultsCondition('amount>0 AND date>2014-01-10')
+    assert condition.is_exhausted(transaction(10), 'date', True)
+    condition = ResultsCondition('amount>0 OR date>2014-01-10')
+    assert not condition.is_exhausted(transaction(10), 'date', True)
+
+    # Unknown values never stop the iteration.
+    tr = transaction(1)
+    tr.date = NotAvailable
+    assert not ResultsCondition('date>2014-01-10').is_exhausted(tr, 'date', True)
@@ -19,12 +19,14 @@
 
 
 import os
-from threading import RLock
+import sys
+from collections import deque
+from threading import Event, Lock, RLock
 from copy import copy
 
 from weboob.capabilities.base import CapBaseObject, FieldNotFound, \
     IBaseCap, NotLoaded, NotAvailable
-from weboob.tools.misc import iter_fields
+from weboob.tools.misc import iter_fields, to_unicode
 from weboob.tools.log import getLogger
 from weboob.tools.value import ValuesDict
 
@@ -202,6 +204,56 @@ class BackendConfig(ValuesDict):
         self.weboob.backends_config.add_backend(self.instname, self.modname, dump, edit)
 
 
+class _FillJob(object):
+    """
+    Private object used by :meth:`BaseBackend.fillobj_many` to fill an
+    object in a worker and get it back.
+
+    The job is run at most once, either by a worker of the pool or by the
+    caller of :meth:`get` if no worker has started it yet.
+    """
+    def __init__(self, backend, obj, fields):
+        self.backend = backend
+        self.obj = obj
+        self.fields = fields
+        self.result = None
+        self.exc_info = None
+        self.started = False
+        self.lock = Lock()
+        self.done = Event()
+
+    def _start(self):
+        with self.lock:
+            started, self.started = self.started, True
+        return not started
+
+    def run(self):
+        if not self._start():
+            return
+        try:
+            if isinstance(self.obj, CapBaseObject):
+                self.result = self.backend.fillobj(self.obj, self.fields)
+            else:
+                self.result = self.obj
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.done.set()
+
+    def cancel(self):
+        self._start()
+
+    def get(self):
+        # The caller may be a worker of the pool itself, so it never waits
+        # for a job which is still queued.
+        self.run()
+        self.done.wait()
+        if self.exc_info is not None:
+            # Keep the traceback of the worker.
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
 class BaseBackend(object):
     """
     Base class for backends.
@@ -248,6 +300,18 @@ class BaseBackend(object):
     # When the method is called, fields are only the one which are
     # NOT yet filled.
     OBJECTS = {}
+    # Number of objects filled concurrently by fillobj_many(). Set it only
+    # if methods of OBJECTS can run while other methods of the backend are
+    # running (for example if they use their own browser).
+    FILL_WORKERS = 1
+    # Methods which return results sorted on a field. When the user gives a
+    # condition on this field, applications stop to iterate on results (and
+    # so the backend stops to load next pages) as soon as next results can't
+    # match it. Declare only methods which yield results while they load
+    # pages: a method which reads every page to sort results saves nothing.
+    # The key is the method name, and the value a tuple (field, descending),
+    # for example {'iter_history': ('date', True)}.
+    SORTED_RESULTS = {}
 
     class ConfigError(Exception):
         """
@@ -296,8 +360,64 @@ class BaseBackend(object):
         """
         if self._browser is None:
             self._browser = self.create_default_browser()
+            self.load_browser_session()
         return self._browser
 
+    def get_session_store(self):
+        """
+        Get the store of browser sessions, if the `_keep_session` option of
+        the backend is enabled.
+
+        :rtype: :class:`weboob.tools.browser2.sessions.SessionStore` or None
+        """
+        if self._private_config.get('_keep_session', '').lower() not in ('1', 'true', 'yes', 'on'):
+            return None
+        workdir = getattr(self.weboob, 'workdir', None)
+        if workdir is None:
+            return None
+
+        from weboob.tools.browser2.sessions import SessionStore
+        return SessionStore(os.path.join(workdir, 'sessions'))
+
+    def get_session_secret(self):
+        """
+        Get the secret used to store the session of the browser: the
+        configuration of the backend, which contains its credentials.
+        """
+        return u'\0'.join(u'%s=%s' % (key, to_unicode(value.get())) for key, value in sorted(self.config.iteritems()))
+
+    def load_browser_session(self):
+        """
+        Restore the session of the browser stored by
+        :meth:`save_browser_session`, if any.
+        """
+        store = self.get_session_store()
+        if store is None or not hasattr(self._browser, 'load_state'):
+            return
+
+        state = store.load(self.name, self.get_session_secret())
+        if state is not None:
+            self.logger.debug('Restore the session of browser')
+            self._browser.load_state(state)
+
+    def save_browser_session(self):
+        """
+        Store the session of the browser, if the `_keep_session` option of
+        the backend is enabled, so it is resumed by the next process instead
+        of login again.
+        """
+        if self._browser is None:
+            return
+        store = self.get_session_store()
+        if store is None or not hasattr(self._browser, 'dump_state'):
+            return
+
+        state = self._browser.dump_state()
+        if state is None:
+            store.delete(self.name, self.get_session_secret())
+        else:
+            store.save(self.name, self.get_session_secret(), state)
+
     def create_default_browser(self):
         """
         Method to overload to build the default browser in
@@ -425,3 +545,52 @@ class BaseBackend(object):
             setattr(obj, field, NotAvailable)
 
         return obj
+
+    def fillobj_many(self, objs, fields=None):
+        """
+        Fill several objects with the wanted fields.
+
+        It is a generator which yields objects in the same order than they
+        are read from *objs*, which can be an iterator. Objects which are not
+        :class:`CapBaseObject` instances are yielded as is.
+
+        If :attr:`FILL_WORKERS` is greater than 1, objects are filled by this
+        number of workers of the pool of weboob, while next objects are read
+        from *objs*, at most twice this number in advance.
+
+        Backends which can get several objects at once can override this
+        method.
+
+        :param objs: objects to fill
+        :type objs: iter[:class:`CapBaseObject`]
+        :param fields: what fields to fill; if None, all fields are filled
+        :type fields: :class:`list`
+        :rtype: iter[:class:`CapBaseObject`]
+        """
+        pool = getattr(self.weboob, 'pool', None)
+        if self.FILL_WORKERS <= 1 or pool is None:
+            for obj in objs:
+                if isinstance(obj, CapBaseObject):
+                    obj = self.fillobj(obj, fields)
+                yield obj
+            return
+
+        window = deque()
+        try:
+            for i, obj in enumerate(objs):
+                job = _FillJob(self, obj, fields)
+                if isinstance(obj, CapBaseObject):
+                    # Jobs with the same key are run one at a time, so at
+                    # most FILL_WORKERS objects are filled at once.
+                    pool.post((self, 'fill', i % self.FILL_WORKERS), job.run)
+                window.append(job)
+
+                while len(window) > 2 * self.FILL_WORKERS or (window and window[0].done.is_set()):
+                    yield window.popleft().get()
+
+            while window:
+                yield window.popleft().get()
+        finally:
+            # Results are not wanted anymore.
+            for job in window:
+                job.cancel()
@@ -44,6 +44,7 @@ import hashlib
 import time
 import urllib
 import urllib2
+import urlparse
 import mimetypes
 import logging
 from contextlib import closing
@@ -69,7 +70,7 @@ else:
 
 __all__ = ['BrowserIncorrectPassword', 'BrowserForbidden', 'BrowserBanned', 'BrowserUnavailable', 'BrowserRetry',
            'BrowserPasswordExpired', 'BrowserHTTPNotFound', 'BrowserHTTPError', 'BrokenPageError', 'BasePage',
-           'StandardBrowser', 'BaseBrowser']
+           'StandardBrowser', 'BaseBrowser', 'ReplayHandler']
 
 
 class BrowserRetry(Exception):
@@ -100,6 +101,32 @@ class BrokenPageError(Exception):
     pass
 
 
+class ReplayHandler(mechanize.BaseHandler):
+    """
+    Handler of mechanize serving responses saved in a directory instead of
+    requesting websites.
+
+    :param replay: saved responses
+    :type replay: :class:`weboob.tools.browser2.replay.ResponsesReplay`
+    """
+    # before handlers which really open connections
+    handler_order = 100
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    def http_open(self, request):
+        method = request.get_method()
+        url = request.get_full_url()
+        recorded = self.replay.lookup(method, url, request.get_data())
+        if recorded is None:
+            raise urllib2.URLError('No saved response for %s %s' % (method, url))
+        return mechanize.make_response(recorded.content, recorded.headers, recorded.url,
+                                       recorded.status_code, recorded.reason)
+
+    https_open = http_open
+
+
 class FormFieldConversionWarning(UserWarning):
     """
     A value has been set to a form's field and has been implicitly converted.
@@ -175,6 +202,7 @@ class StandardBrowser(mechanize.Browser):
     DEBUG_MECHANIZE = False
     DEFAULT_TIMEOUT = 15
     INSECURE = False  # if True, do not validate SSL
+    RATE_LIMIT = None  # weboob.tools.ratelimit.RateLimit instance
 
     logger = None
 
@@ -226,6 +254,11 @@ class StandardBrowser(mechanize.Browser):
         self.responses_dirname = responses_dirname
         self.responses_count = 0
 
+        if self.logger.settings['replay_responses']:
+            # serve responses saved in responses_dirname
+            from weboob.tools.browser2.replay import ResponsesReplay
+            self.add_handler(ReplayHandler(ResponsesReplay(self.responses_dirname)))
+
     def __enter__(self):
         self.lock.acquire()
 
@@ -235,6 +268,21 @@ class StandardBrowser(mechanize.Browser):
     def _openurl(self, *args, **kwargs):
         return mechanize.Browser.open(self, *args, **kwargs)
 
+    def _mech_open(self, url, *args, **kwargs):
+        # Every requests of mechanize (open, submit, follow_link...) are
+        # made here.
+        if self.RATE_LIMIT is not None and not self.logger.settings['replay_responses']:
+            try:
+                full_url = url.get_full_url()
+            except AttributeError:
+                full_url = url
+                if self._response is not None:
+                    full_url = urlparse.urljoin(self._response.geturl(), url)
+            waited = self.RATE_LIMIT.wait(full_url)
+            if waited > 0:
+                self.logger.debug('Waited %.2fs before requesting %s' % (waited, full_url))
+        return mechanize.Browser._mech_open(self, url, *args, **kwargs)
+
     @check_location
     @retry(BrowserHTTPError, tries=3)
     def openurl(self, *args, **kwargs):
@@ -308,8 +356,24 @@ class StandardBrowser(mechanize.Browser):
         with open(response_filepath, 'w') as f:
             f.write(result.read())
         result.seek(0)
+
+        request = getattr(self, 'request', None)
+        if request is not None:
+            with open(response_filepath + '-request.txt', 'w') as f:
+                f.write('%s %s\n\n\n' % (request.get_method(), request.get_full_url()))
+                for key, value in request.header_items():
+                    f.write('%s: %s\n' % (key, value))
+                if request.has_data():
+                    f.write('\n\n\n%s' % request.get_data())
+        code = getattr(result, 'code', None) or 200
+        msg = getattr(result, 'msg', None) or 'OK'
+        with open(response_filepath + '-response.txt', 'w') as f:
+            f.write('%s %s\n\n\n' % (code, msg))
+            f.write(str(result.info()))
+
         match_filepath = os.path.join(self.responses_dirname, 'url_response_match.txt')
         with open(match_filepath, 'a') as f:
+            f.write('# %d %s %s\n' % (code, msg, result.info().get('Content-Type', '')))
             f.write('%s\t%s\n' % (result.geturl(), os.path.basename(response_filepath)))
         self.responses_count += 1
 
@@ -28,6 +28,7 @@ import mimetypes
 import os
 import tempfile
 import sys
+from threading import Lock
 
 try:
     import requests
@@ -39,6 +40,7 @@ except ImportError:
 from weboob.tools.log import getLogger
 
 from .cookies import WeboobCookieJar
+from .replay import ReplayAdapter, ResponsesReplay
 
 
 class Profile(object):
@@ -116,6 +118,81 @@ class Wget(Profile):
             'User-Agent': 'Wget/%s' % self.version})
 
 
+class HTTPAdapters(object):
+    """
+    Process-wide registry of HTTP adapters, used by browsers which share their
+    pools of connections (see :attr:`BaseBrowser.SHARE_CONNECTIONS`).
+
+    An adapter keeps a pool of keep-alive connections for each host, so
+    browsers using the same adapter reuse connections (and do not redo TLS
+    handshakes) to hosts they have in common. Cookies are still stored in the
+    session of each browser.
+    """
+
+    POOL_CONNECTIONS = 100
+    """
+    Number of hosts for which a pool of connections is kept.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.adapters = {}
+
+    def get(self, pool_maxsize, max_retries):
+        """
+        Get the shared adapter for these parameters.
+
+        :param pool_maxsize: maximum number of connections kept for each host
+        :type pool_maxsize: int
+        :param max_retries: number of retries on connection errors
+        :type max_retries: int
+        :rtype: :class:`requests.adapters.HTTPAdapter`
+        """
+        key = (pool_maxsize, max_retries)
+        with self.lock:
+            if key not in self.adapters:
+                self.adapters[key] = requests.adapters.HTTPAdapter(pool_connections=self.POOL_CONNECTIONS,
+                                                                   pool_maxsize=pool_maxsize,
+                                                                   max_retries=max_retries)
+            return self.adapters[key]
+
+    def get_stats(self):
+        """
+        Get number of requests and of opened connections for each host.
+
+        :rtype: dict[str, dict]
+        """
+        stats = {}
+        with self.lock:
+            adapters = list(self.adapters.values())
+
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                try:
+                    pool = pools[key]
+                except KeyError:
+                    # Pool has been discarded meanwhile.
+                    continue
+                host = '%s://%s:%s' % (pool.scheme, pool.host, pool.port)
+                host_stats = stats.setdefault(host, {'requests': 0, 'connections': 0})
+                host_stats['requests'] += pool.num_requests
+                host_stats['connections'] += pool.num_connections
+        return stats
+
+    def clear(self):
+        """
+        Close every connections and forget adapters.
+        """
+        with self.lock:
+            for adapter in self.adapters.itervalues():
+                adapter.close()
+            self.adapters.clear()
+
+
+HTTP_ADAPTERS = HTTPAdapters()
+
+
 class BaseBrowser(object):
     """
     Simple browser class.
@@ -147,16 +224,46 @@ class BaseBrowser(object):
 
     MAX_RETRIES = 2
 
+    SHARE_CONNECTIONS = False
+    """
+    Use the process-wide pools of connections of :data:`HTTP_ADAPTERS`, so
+    several browsers on the same hosts (for example several backends of the
+    same module) reuse their keep-alive connections.
+    """
+
+    POOL_MAXSIZE = requests.adapters.DEFAULT_POOLSIZE
+    """
+    Maximum number of connections kept alive for each host.
+    """
+
+    CACHE = None
+    """
+    :class:`weboob.tools.browser2.cache.HTTPCache` instance used to cache
+    responses of GET requests. It is shared by all instances of the class.
+    """
+
+    CACHE_TTL = None
+    """
+    Default number of seconds during which a cached response is reused
+    without any request. With 0, responses are always revalidated, and with
+    None, responses are not cached. See :meth:`get_cache_ttl`.
+    """
+
+    RATE_LIMIT = None
+    """
+    :class:`weboob.tools.ratelimit.RateLimit` instance limiting the rate of
+    requests sent by this browser.
+    """
+
     def __init__(self, logger=None, proxy=None, responses_dirname=None):
         self.logger = getLogger('browser', logger)
         self.PROXIES = proxy
+        self.responses_dirname = responses_dirname
+        self.responses_count = 1
         self._setup_session(self.PROFILE)
         self.url = None
         self.response = None
 
-        self.responses_dirname = responses_dirname
-        self.responses_count = 1
-
     def _save(self, response, warning=False, **kwargs):
         if self.responses_dirname is None:
             self.responses_dirname = tempfile.mkdtemp(prefix='weboob_session_')
@@ -220,7 +327,13 @@ class BaseBrowser(object):
 
         # defines a max_retries. It's mandatory in case a server is not
         # handling keep alive correctly, like the proxy burp
-        a = requests.adapters.HTTPAdapter(max_retries=self.MAX_RETRIES)
+        if self.logger.settings['replay_responses']:
+            # serve responses saved in responses_dirname
+            a = ReplayAdapter(ResponsesReplay(self.responses_dirname))
+        elif self.SHARE_CONNECTIONS:
+            a = HTTP_ADAPTERS.get(self.POOL_MAXSIZE, self.MAX_RETRIES)
+        else:
+            a = requests.adapters.HTTPAdapter(pool_maxsize=self.POOL_MAXSIZE, max_retries=self.MAX_RETRIES)
         session.mount('http://', a)
         session.mount('https://', a)
 
@@ -257,6 +370,7 @@ class BaseBrowser(object):
                    verify=None,
                    cert=None,
                    proxies=None,
+                   cache_ttl=None,
                    **kwargs):
         """
         Make an HTTP request like a browser does:
@@ -285,6 +399,10 @@ class BaseBrowser(object):
         :param referrer: Force referrer. False to disable sending it, None for guessing
         :type referrer: str or False or None
 
+        :param cache_ttl: Number of seconds during which a cached response is
+                          reused, None to use :meth:`get_cache_ttl`
+        :type cache_ttl: float or None
+
         :rtype: :class:`requests.Response`
         """
         req = self.build_request(url, referrer, **kwargs)
@@ -305,6 +423,22 @@ class BaseBrowser(object):
         if timeout is None:
             timeout = self.TIMEOUT
 
+        cache = None
+        if self.CACHE is not None and not stream:
+            if cache_ttl is None:
+                cache_ttl = self.get_cache_ttl(preq.url)
+            if cache_ttl is not None:
+                cache = self.CACHE
+                response = cache.lookup(preq, cache_ttl)
+                if response is not None:
+                    self.logger.debug('Get %s from cache' % preq.url)
+                    return response
+
+        if self.RATE_LIMIT is not None and not self.logger.settings['replay_responses']:
+            waited = self.RATE_LIMIT.wait(preq.url)
+            if waited > 0:
+                self.logger.debug('Waited %.2fs before requesting %s' % (waited, preq.url))
+
         # call python-requests
         response = self.session.send(preq,
                                      allow_redirects=allow_redirects,
@@ -314,6 +448,9 @@ class BaseBrowser(object):
                                      cert=cert,
                                      proxies=proxies)
 
+        if cache is not None:
+            response = cache.update(preq, response)
+
         if allow_redirects:
             response = self.handle_refresh(response)
 
@@ -348,6 +485,19 @@ class BaseBrowser(object):
 
         return req
 
+    def get_cache_ttl(self, url):
+        """
+        Get the number of seconds during which a cached response of this URL
+        is reused. None means that the response is not cached.
+
+        This method aims to be overloaded by children classes.
+
+        :param url: absolute URL
+        :type url: str
+        :rtype: float or None
+        """
+        return self.CACHE_TTL
+
     def prepare_request(self, req):
         """
         Get a prepared request from a Request object.
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import os
+import tempfile
+from datetime import timedelta
+from hashlib import sha1
+from threading import Lock
+from time import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from weboob.tools.compat import unicode
+from weboob.tools.log import getLogger
+from weboob.tools.ordereddict import OrderedDict
+
+
+__all__ = ['HTTPCache']
+
+
+class CacheEntry(object):
+    """
+    A response stored in :class:`HTTPCache`.
+    """
+
+    def __init__(self, response, vary):
+        self.url = response.url
+        self.status_code = response.status_code
+        self.reason = response.reason
+        self.headers = dict(response.headers)
+        self.encoding = response.encoding
+        self.content = response.content
+        self.vary = vary
+        self.stored = time()
+
+    @property
+    def etag(self):
+        return CaseInsensitiveDict(self.headers).get('ETag')
+
+    @property
+    def last_modified(self):
+        return CaseInsensitiveDict(self.headers).get('Last-Modified')
+
+    def is_fresh(self, ttl):
+        return ttl > 0 and time() - self.stored < ttl
+
+    def revalidated(self, response):
+        """
+        Update entry after a 304 Not Modified response.
+        """
+        for key in ('ETag', 'Last-Modified', 'Expires', 'Cache-Control', 'Date'):
+            if key in response.headers:
+                self.headers[key] = response.headers[key]
+        self.stored = time()
+
+    def build_response(self, request):
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response._content = self.content
+        response._content_consumed = True
+        response.request = request
+        response.elapsed = timedelta(0)
+        response.from_cache = True
+        return response
+
+
+class HTTPCache(object):
+    """
+    Cache of HTTP responses, used by :class:`weboob.tools.browser2.BaseBrowser`
+    when its :attr:`CACHE` attribute is set.
+
+    Responses are kept in memory, in a LRU of at most *max_entries* entries,
+    and optionally stored in the *path* directory, so they survive to the
+    process.
+
+    A response younger than its TTL is returned without any request. Once
+    expired, a response with an `ETag` or a `Last-Modified` header is
+    revalidated with a conditional request, and is reused if the server
+    replies `304 Not Modified`.
+
+    Only successful GET requests are cached. As the cache is not aware of
+    cookies, use it only on public pages.
+
+    :param max_entries: maximum number of responses kept in memory
+    :type max_entries: :class:`int`
+    :param path: directory where responses are stored (optional)
+    :type path: :class:`str`
+    """
+
+    def __init__(self, max_entries=100, path=None):
+        assert max_entries > 0
+
+        self.logger = getLogger('browser.cache')
+        self.max_entries = max_entries
+        self.path = path
+        if self.path is not None and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.stats = {'hits':        0,
+                      'misses':      0,
+                      'revalidated': 0,
+                      'stored':      0,
+                      'evicted':     0,
+                     }
+
+    @staticmethod
+    def get_key(request):
+        return '%s %s' % (request.method, request.url)
+
+    @staticmethod
+    def get_vary(response):
+        """
+        Get values of request headers the response varies on.
+        """
+        names = [name.strip().lower() for name in response.headers.get('Vary', '').split(',')]
+        return dict((name, response.request.headers.get(name)) for name in names if name)
+
+    @staticmethod
+    def is_cacheable(response):
+        if response.request.method != 'GET' or response.status_code != 200:
+            return False
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if 'no-store' in cache_control or response.headers.get('Vary', '').strip() == '*':
+            return False
+        return True
+
+    def _filename(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path, sha1(key).hexdigest())
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+                return entry
+
+        if self.path is None:
+            return None
+
+        try:
+            with open(self._filename(key), 'rb') as f:
+                entry = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError) as e:
+            if not isinstance(e, IOError):
+                self.logger.warning('Unable to read cache entry of %s: %s' % (key, e))
+            return None
+
+        self._set(key, entry, store=False)
+        return entry
+
+    def _set(self, key, entry, store=True):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+        if self.path is None or not store:
+            return
+
+        fd, tmpname = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmpname, self._filename(key))
+        except (IOError, OSError) as e:
+            self.logger.warning('Unable to store cache entry of %s: %s' % (key, e))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def lookup(self, request, ttl):
+        """
+        Look for a cached response for this request.
+
+        If the response is fresh, it is returned. Otherwise, if the cached
+        response can be revalidated, conditional headers are added to the
+        request.
+
+        :param request: request to send
+        :type request: :class:`requests.PreparedRequest`
+        :param ttl: number of seconds during which a cached response is fresh
+        :type ttl: :class:`float`
+        :returns: the cached response, or None if the request has to be sent
+        :rtype: :class:`requests.Response` or None
+        """
+        if request.method != 'GET':
+            return None
+
+        entry = self._get(self.get_key(request))
+        if entry is None or any(request.headers.get(name) != value for name, value in entry.vary.iteritems()):
+            return None
+
+        if entry.is_fresh(ttl):
+            with self.lock:
+                self.stats['hits'] += 1
+            return entry.build_response(request)
+
+        if entry.etag is not None:
+            request.headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            request.headers['If-Modified-Since'] = entry.last_modified
+        return None
+
+    def update(self, request, response):
+        """
+        Handle the response of a request which has been looked up in cache.
+
+        :param request: sent request
+        :type request: :class:`requests.PreparedRequest`
+        :param response: received response
+        :type response: :class:`requests.Response`
+        :returns: the response to use: a cached one if the server has replied
+                  304 Not Modified, or *response* otherwise
+        :rtype: :class:`requests.Response`
+        """
+        if request.method != 'GET':
+            return response
+
+        key = self.get_key(request)
+        if response.status_code == 304:
+            entry = self._get(key)
+            if entry is not None:
+                entry.revalidated(response)
+                self._set(key, entry)
+                with self.lock:
+                    self.stats['revalidated'] += 1
+                return entry.build_response(request)
+            return response
+
+        with self.lock:
+            self.stats['misses'] += 1
+
+        if self.is_cacheable(response):
+            self._set(key, CacheEntry(response, self.get_vary(response)))
+            with self.lock:
+                self.stats['stored'] += 1
+        return response
+
+    def get_stats(self):
+        """
+        Get statistics about this cache.
+
+        :rtype: :class:`dict`
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.entries)
+            lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+            stats['hit_ratio'] = float(stats['hits'] + stats['revalidated']) / lookups if lookups else 0.0
+            return stats
+
+    def clear(self):
+        """
+        Forget every cached responses.
+        """
+        with self.lock:
+            self.entries.clear()
+            if self.path is not None:
+                for name in os.listdir(self.path):
+                    os.remove(os.path.join(self.path, name))
+
+
+def test():
+    import shutil
+    from threading import Thread
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+    from .browser import BaseBrowser
+
+    requests_count = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_count.append(self.path)
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', '5')
+            self.end_headers()
+            self.wfile.write('hello')
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%d/feed' % server.server_address[1]
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_cache_')
+    try:
+        class Browser(BaseBrowser):
+            CACHE = HTTPCache(path=tmpdir)
+            CACHE_TTL = 60
+
+        b = Browser()
+        assert b.open(url).content == 'hello'
+        # fresh response, no request
+        assert b.open(url).content == 'hello'
+        assert len(requests_count) == 1
+        # expired response, revalidated with a 304
+        assert b.open(url, cache_ttl=0).content == 'hello'
+        assert len(requests_count) == 2
+
+        stats = Browser.CACHE.get_stats()
+        assert (stats['hits'], stats['revalidated'], stats['misses']) == (1, 1, 1)
+
+        # responses are read back from disk
+        Browser.CACHE = HTTPCache(path=tmpdir)
+        assert Browser().open(url).content == 'hello'
+        assert len(requests_count) == 2
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmpdir)
@@ -22,6 +22,8 @@ try:
 except ImportError:
     import http.cookiejar as cookielib
 
+from weboob.tools.compat import unicode
+
 
 __all__ = ['WeboobCookieJar']
 
@@ -41,6 +43,31 @@ class WeboobCookieJar(requests.cookies.RequestsCookieJar):
         cj = requests.cookies.merge_cookies(cookielib.LWPCookieJar(), self)
         cj.save(filename, ignore_discard=True, ignore_expires=True)
 
+    _DUMPED_ATTRS = ('version', 'name', 'value', 'port', 'domain', 'path', 'secure', 'expires',
+                     'discard', 'comment', 'comment_url', 'rfc2109')
+
+    def dump(self):
+        """
+        Get all cookies, regardless of expiration, etc., as a list of dicts
+        which can be serialized, and loaded with :meth:`load`.
+
+        :rtype: :class:`list`
+        """
+        return [dict([(attr, getattr(cookie, attr)) for attr in self._DUMPED_ATTRS] + [('rest', cookie._rest)])
+                for cookie in self]
+
+    def load(self, cookies):
+        """
+        Add cookies dumped by :meth:`dump`.
+
+        :param cookies: dumped cookies
+        :type cookies: :class:`list`
+        """
+        for attrs in cookies:
+            attrs = dict((str(key), value.encode('utf-8') if isinstance(value, unicode) else value)
+                         for key, value in attrs.iteritems())
+            self.set_cookie(requests.cookies.create_cookie(**attrs))
+
     def _cookies_from_attrs_set(self, attrs_set, request):
         for tup in self._normalized_cookie_tuples(attrs_set):
             cookie = self._cookie_from_cookie_tuple(tup, request)
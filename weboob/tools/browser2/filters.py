@@ -23,6 +23,8 @@ from dateutil.parser import parse as parse_date
 import datetime
 from decimal import Decimal, InvalidOperation
 import re
+from threading import Lock
+import lxml.etree as etree
 import lxml.html as html
 
 from weboob.tools.exceptions import ParseError
@@ -34,6 +36,60 @@ from weboob.capabilities.base import empty
 _NO_DEFAULT = object()
 
 
+class XPathCache(object):
+    """
+    Cache of compiled XPath expressions.
+
+    Compiling an expression costs as much as evaluating it on a small
+    element, so filters, which are evaluated on every items of a list, use
+    compiled expressions.
+    """
+
+    MAX_SIZE = 1000
+    """
+    The cache is cleared when it exceeds this number of expressions, as they
+    may be built from parsed data.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.expressions = {}
+
+    def get(self, path):
+        """
+        Get a compiled expression.
+
+        :param path: XPath expression
+        :type path: :class:`str`
+        :rtype: :class:`lxml.etree.XPath`
+        """
+        try:
+            return self.expressions[path]
+        except KeyError:
+            xpath = etree.XPath(path)
+            with self.lock:
+                if len(self.expressions) >= self.MAX_SIZE:
+                    self.expressions.clear()
+                self.expressions[path] = xpath
+            return xpath
+
+
+XPATH_CACHE = XPathCache()
+
+
+def xpath(el, path, **kwargs):
+    """
+    Evaluate an XPath expression on an element, like :meth:`el.xpath`, but
+    with a compiled expression.
+
+    Keyword arguments are XPath variables, except `namespaces` and
+    `extensions` which require to compile the expression for this call.
+    """
+    if 'namespaces' in kwargs or 'extensions' in kwargs:
+        return el.xpath(path, **kwargs)
+    return XPATH_CACHE.get(path)(el, **kwargs)
+
+
 class FilterError(ParseError):
     pass
 
@@ -94,6 +150,8 @@ class Filter(_Filter):
     @classmethod
     def select(cls, selector, item):
         if isinstance(selector, basestring):
+            if isinstance(item, (etree._Element, etree._ElementTree)):
+                return xpath(item, selector)
             return item.xpath(selector)
         elif callable(selector):
             return selector(item)
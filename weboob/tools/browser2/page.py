@@ -25,8 +25,19 @@ except ImportError:
     from urllib import unquote
 import requests
 import re
+import sre_constants
+import sre_parse
 import sys
-from copy import deepcopy
+import datetime
+from copy import copy, deepcopy
+from decimal import Decimal
+from threading import Event, Thread
+from types import FunctionType
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+from weakref import WeakSet
 from io import BytesIO
 import lxml.html as html
 import lxml.etree as etree
@@ -34,12 +45,14 @@ import lxml.etree as etree
 from weboob.tools.json import json
 from weboob.tools.ordereddict import OrderedDict
 from weboob.tools.regex_helper import normalize
-from weboob.tools.compat import basestring
+from weboob.capabilities.base import NotAvailableType, NotLoadedType
+from weboob.tools.compat import basestring, long
 
 from weboob.tools.log import getLogger
 
 from .browser import DomainBrowser
-from .filters import _Filter, CleanText, AttributeNotFound, XPathNotFound
+from .cookies import WeboobCookieJar
+from .filters import _Filter, CleanText, AttributeNotFound, XPathNotFound, xpath
 
 
 class UrlNotResolvable(Exception):
@@ -54,19 +67,52 @@ class DataError(Exception):
     """
 
 
+_compiled_regexps = {}
+
+
+def compile_url_regexp(regex, base):
+    """
+    Compile a regexp of :class:`URL`, prefixed with *base* if it is not
+    absolute.
+
+    Compiled regexps are kept for the life of the process, as there are
+    only few of them for each browser.
+    """
+    key = (regex, base)
+    try:
+        return _compiled_regexps[key]
+    except KeyError:
+        pass
+
+    if re.match(r'^\w+://.*', regex):
+        compiled = re.compile(regex)
+    else:
+        compiled = re.compile(re.escape(base).rstrip('/') + '/' + regex.lstrip('/'))
+    _compiled_regexps[key] = compiled
+    return compiled
+
+
 class URL(object):
     """
     A description of an URL on the PagesBrowser website.
 
     It takes one or several regexps to match urls, and an optional BasePage
     class which is instancied by PagesBrowser.open if the page matches a regex.
+
+    The optional `ttl` keyword argument is the number of seconds during which
+    responses of this URL are got from cache, if the browser has a
+    :attr:`weboob.tools.browser2.browser.BaseBrowser.CACHE`::
+
+        rss = URL(r'/rss\.xml', RSSPage, ttl=300)
     """
     _creation_counter = 0
 
-    def __init__(self, *args):
+    def __init__(self, *args, **kwargs):
         self.urls = []
         self.klass = None
         self.browser = None
+        self.ttl = kwargs.pop('ttl', None)
+        assert not kwargs, 'Unexpected arguments: %s' % ', '.join(kwargs)
         for arg in args:
             if isinstance(arg, basestring):
                 self.urls.append(arg)
@@ -75,6 +121,7 @@ class URL(object):
 
         self._creation_counter = URL._creation_counter
         URL._creation_counter += 1
+        self._patterns = None
 
     def is_here(self, **kwargs):
         """
@@ -143,9 +190,7 @@ class URL(object):
         :raises: :class:`UrlNotResolvable` if unable to resolve a correct url with the given arguments.
         """
         browser = kwargs.pop('browser', self.browser)
-        patterns = []
-        for url in self.urls:
-            patterns += normalize(url)
+        patterns = self.get_patterns()
 
         for pattern, _ in patterns:
             url = pattern
@@ -155,7 +200,7 @@ class URL(object):
                 if search in pattern:
                     url = url.replace(search, unicode(kwargs.pop(kwkey)))
             # if there are named substitutions left, ignore pattern
-            if re.search('%\([A-z_]+\)s', url):
+            if self._SUBSTITUTION_RE.search(url):
                 continue
             # if not all kwargs were used
             if len(kwargs):
@@ -165,6 +210,27 @@ class URL(object):
 
         raise UrlNotResolvable('Unable to resolve URL with %r. Available are %s' % (kwargs, ', '.join([pattern for pattern, _ in patterns])))
 
+    _SUBSTITUTION_RE = re.compile('%\([A-z_]+\)s')
+
+    def get_patterns(self):
+        """
+        Get patterns used by :meth:`build`, computed from regexps once.
+
+        :rtype: list of tuples (pattern, args)
+        """
+        if self._patterns is None:
+            patterns = []
+            for url in self.urls:
+                patterns += normalize(url)
+            self._patterns = patterns
+        return self._patterns
+
+    def get_regexps(self, base):
+        """
+        Get compiled regexps of this object, relatively to *base*.
+        """
+        return [compile_url_regexp(regex, base) for regex in self.urls]
+
     def match(self, url, base=None):
         """
         Check if the given url match this object.
@@ -173,10 +239,8 @@ class URL(object):
             assert self.browser is not None
             base = self.browser.BASEURL
 
-        for regex in self.urls:
-            if not re.match(r'^\w+://.*', regex):
-                regex = re.escape(base).rstrip('/') + '/' + regex.lstrip('/')
-            m = re.match(regex, url)
+        for regex in self.get_regexps(base):
+            m = regex.match(url)
             if m:
                 return m
 
@@ -206,6 +270,171 @@ class URL(object):
         return inner
 
 
+class _URLRouter(object):
+    """
+    Routing table of URL objects of a PagesBrowser class, for a base URL.
+
+    Regexps are compiled once, and routes are indexed by the host their
+    regexp starts with. An url is only tried against routes of its host and
+    routes without a literal host, in the order of declaration of URLs.
+    The literal prefix of a regexp is also checked before the regexp
+    itself.
+
+    :param urls: URL objects by name
+    :type urls: :class:`OrderedDict`
+    :param base: base url of relative regexps
+    :type base: :class:`str`
+    """
+
+    def __init__(self, urls, base):
+        routes = []
+        for name, url in urls.iteritems():
+            for regex in url.get_regexps(base):
+                routes.append((len(routes), name, self.get_prefix(regex), regex))
+
+        self.others = []
+        by_host = {}
+        for route in routes:
+            host = self.get_host(route[2])
+            if host is None:
+                self.others.append(route)
+            else:
+                by_host.setdefault(host, []).append(route)
+        self.hosts = dict((host, sorted(host_routes + self.others)) for host, host_routes in by_host.iteritems())
+
+    @staticmethod
+    def get_prefix(regex):
+        """
+        Get the ASCII literal prefix of every strings matched by a
+        compiled regexp.
+        """
+        if regex.flags & (re.IGNORECASE | re.LOCALE):
+            return ''
+        try:
+            items = sre_parse.parse(regex.pattern, regex.flags)
+        except (sre_constants.error, TypeError, ValueError):
+            return ''
+        prefix = []
+        for op, av in items:
+            if op == sre_constants.AT and av in (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING):
+                continue
+            if op != sre_constants.LITERAL or av >= 128:
+                break
+            prefix.append(chr(av))
+        return ''.join(prefix)
+
+    @staticmethod
+    def get_host(url):
+        """
+        Get the scheme and the host of an url, or None if the url stops
+        before the end of its host.
+        """
+        scheme_end = url.find('://')
+        if scheme_end < 0:
+            return None
+        host_end = url.find('/', scheme_end + 3)
+        if host_end < 0:
+            return None
+        return url[:host_end]
+
+    def iter_matches(self, url):
+        """
+        Iter on URL objects matching an url, in their order of declaration.
+
+        :returns: tuples (name, match)
+        """
+        host = self.get_host(url)
+        # an url without any path, like http://example.org, can't match
+        # regexps with a literal host, as they end with a slash
+        routes = self.others if host is None else self.hosts.get(host, self.others)
+
+        last = None
+        for index, name, prefix, regex in routes:
+            if name == last or not url.startswith(prefix):
+                continue
+            m = regex.match(url)
+            if m:
+                last = name
+                yield name, m
+
+
+class Prefetch(object):
+    """
+    A GET request sent in background by :meth:`PagesBrowser.prefetch`.
+
+    The request is sent with a copy of the cookies of the browser, and
+    cookies it receives are only stored in the browser when the response is
+    used, so they are set in the same order as without prefetching.
+
+    If the browser has changed its cookies or its location since the
+    request has been sent, the response is not used, as the request would
+    have been different.
+    """
+
+    def __init__(self, browser, request):
+        self.browser = browser
+        self.url = browser.url
+        self.response = None
+        self.error = None
+        self.done = Event()
+
+        self.session = copy(browser.session)
+        self.session.cookies = WeboobCookieJar.from_cookiejar(browser.session.cookies)
+        self.cookies = self.get_cookies(browser.session.cookies)
+        self.preq = browser.prepare_request(browser.build_request(request))
+        if hasattr(self.preq, '_cookies'):
+            # see BaseBrowser.open()
+            self.preq._cookies = WeboobCookieJar.from_cookiejar(self.preq._cookies)
+
+        thread = Thread(target=self.run, name='prefetch %s' % self.preq.url)
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def get_cookies(jar):
+        return sorted((c.domain, c.path, c.name, c.value) for c in jar)
+
+    def run(self):
+        browser = self.browser
+        try:
+            if browser.RATE_LIMIT is not None and not browser.logger.settings['replay_responses']:
+                browser.RATE_LIMIT.wait(self.preq.url)
+            self.response = self.session.send(self.preq,
+                                              timeout=browser.TIMEOUT,
+                                              verify=self.session.verify,
+                                              proxies=browser.PROXIES)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def get_response(self):
+        """
+        Wait for the response and get it, if it can be used.
+
+        :returns: the response, or None if the request has to be sent again
+        :rtype: :class:`requests.Response` or None
+        """
+        self.done.wait()
+        browser = self.browser
+        browser._prefetches.discard(self)
+
+        if self.error is not None:
+            browser.logger.debug('Unable to prefetch %s: %s' % (self.preq.url, self.error))
+            return None
+        if browser.url != self.url or self.get_cookies(browser.session.cookies) != self.cookies:
+            browser.logger.debug('Prefetched %s is outdated' % self.preq.url)
+            return None
+
+        browser.session.cookies.clear()
+        browser.session.cookies.update(self.session.cookies)
+        browser.logger.debug('Use prefetched %s' % self.preq.url)
+
+        response = browser.handle_refresh(self.response)
+        response.raise_for_status()
+        return response
+
+
 class _PagesBrowserMeta(type):
     """
     Private meta-class used to keep order of URLs instances of PagesBrowser.
@@ -220,6 +449,8 @@ class _PagesBrowserMeta(type):
         else:
             new_class._urls = deepcopy(new_class._urls)
         new_class._urls.update(urls)
+        # routing tables by base url, see PagesBrowser.get_router()
+        new_class._routers = {}
         return new_class
 
 class PagesBrowser(DomainBrowser):
@@ -252,6 +483,12 @@ class PagesBrowser(DomainBrowser):
     _urls = None
     __metaclass__ = _PagesBrowserMeta
 
+    MAX_PREFETCH = 1
+    """
+    Maximum number of pages requested in background by :meth:`prefetch`
+    and not used yet.
+    """
+
     def __getattr__(self, name):
         if self._urls is not None and name in self._urls:
             return self._urls[name]
@@ -266,6 +503,63 @@ class PagesBrowser(DomainBrowser):
         self._urls = deepcopy(self._urls)
         for url in self._urls.itervalues():
             url.browser = self
+        self._prefetches = WeakSet()
+
+    def get_router(self):
+        """
+        Get the routing table of :class:`URL` objects for the current
+        :attr:`BASEURL`. It is built once for each class of browser.
+
+        :rtype: :class:`_URLRouter`
+        """
+        routers = self.__class__._routers
+        router = routers.get(self.BASEURL)
+        if router is None:
+            router = routers[self.BASEURL] = _URLRouter(self.__class__._urls, self.BASEURL)
+        return router
+
+    def get_cache_ttl(self, url):
+        """
+        Get the TTL of the first :class:`URL` object which matches this url
+        and has one, or :attr:`CACHE_TTL`.
+        """
+        for name, m in self.get_router().iter_matches(url):
+            url_obj = self._urls[name]
+            if url_obj.ttl is not None:
+                return url_obj.ttl
+        return super(PagesBrowser, self).get_cache_ttl(url)
+
+    def prefetch(self, request):
+        """
+        Send a GET request in background, to use its response later with
+        the `prefetched` argument of :meth:`open` or :meth:`location`.
+
+        Nothing is done if the request isn't a GET, or if there are already
+        :attr:`MAX_PREFETCH` prefetched pages not used yet. Responses are
+        not looked up in :attr:`CACHE`.
+
+        :param request: url or Request object
+        :rtype: :class:`Prefetch` or None
+        """
+        if len(self._prefetches) >= self.MAX_PREFETCH:
+            return None
+
+        if isinstance(request, requests.Request):
+            if (request.method or ('POST' if request.data else 'GET')) != 'GET':
+                return None
+            # the request may be sent again, so do not change it
+            request = copy(request)
+            request.headers = dict(request.headers)
+            request.url = self.absurl(request.url)
+            url = request.url
+        else:
+            url = request = self.absurl(request)
+        if not self.url_allowed(url):
+            return None
+
+        prefetch = Prefetch(self, request)
+        self._prefetches.add(prefetch)
+        return prefetch
 
     def open(self, *args, **kwargs):
         """
@@ -273,16 +567,24 @@ class PagesBrowser(DomainBrowser):
         :meth:`weboob.tools.browser2.browser.DomainBrowser.open`, but the
         response contains an attribute `page` if the url matches any
         :class:`URL` object.
+
+        The optional `prefetched` keyword argument is a :class:`Prefetch`
+        of this request, whose response is used if possible.
         """
-        response = super(PagesBrowser, self).open(*args, **kwargs)
+        prefetched = kwargs.pop('prefetched', None)
+        response = None
+        if prefetched is not None:
+            response = prefetched.get_response()
+        if response is None:
+            response = super(PagesBrowser, self).open(*args, **kwargs)
         response.page = None
 
         # Try to handle the response page with an URL instance.
-        for url in self._urls.itervalues():
-            page = url.handle(response)
-            if page is not None:
-                self.logger.debug('Handle %s with %s' % (response.url, page.__class__.__name__))
-                response.page = page
+        for name, m in self.get_router().iter_matches(response.url):
+            url = self._urls[name]
+            if url.klass is not None:
+                response.page = url.klass(self, response, m.groupdict())
+                self.logger.debug('Handle %s with %s' % (response.url, url.klass.__name__))
                 break
 
         if response.page is None:
@@ -296,9 +598,10 @@ class PagesBrowser(DomainBrowser):
         url matches any :class:`URL` object, an attribute `page` is added to
         response, and the attribute :attr:`PagesBrowser.page` is set.
         """
-        if self.page is not None:
+        previous = self.page
+        if previous is not None:
             # Call leave hook.
-            self.page.on_leave()
+            previous.on_leave()
 
         response = self.open(*args, **kwargs)
 
@@ -306,6 +609,10 @@ class PagesBrowser(DomainBrowser):
         self.page = response.page
         self.url = response.url
 
+        if previous is not None and previous is not self.page:
+            # Documents of previous pages are not kept in memory.
+            previous.release()
+
         if self.page is not None:
             # Call load hook.
             self.page.on_load()
@@ -343,7 +650,7 @@ class PagesBrowser(DomainBrowser):
                 for r in func(*args, **kwargs):
                     yield r
             except NextPage as e:
-                self.location(e.request)
+                self.location(e.request, prefetched=e.prefetched)
             else:
                 return
 
@@ -379,7 +686,7 @@ def pagination(func):
                 for r in func(page, *args, **kwargs):
                     yield r
             except NextPage as e:
-                result = page.browser.location(e.request)
+                result = page.browser.location(e.request, prefetched=e.prefetched)
                 page = result.page
             else:
                 return
@@ -392,10 +699,13 @@ class NextPage(Exception):
     go on the next page.
 
     See :meth:`PagesBrowser.pagination` or decorator :func:`pagination`.
+
+    *prefetched* is an optional :class:`Prefetch` of the request.
     """
-    def __init__(self, request):
+    def __init__(self, request, prefetched=None):
         super(NextPage, self).__init__()
         self.request = request
+        self.prefetched = prefetched
 
 
 def need_login(func):
@@ -404,7 +714,8 @@ def need_login(func):
     """
     def inner(browser, *args, **kwargs):
         if browser.page is None or not browser.page.logged:
-            browser.do_login()
+            if not isinstance(browser, LoginBrowser) or not browser.resume_session():
+                browser.do_login()
         return func(browser, *args, **kwargs)
 
     return inner
@@ -418,6 +729,7 @@ class LoginBrowser(PagesBrowser):
         super(LoginBrowser, self).__init__(*args, **kwargs)
         self.username = username
         self.password = password
+        self._resume_url = None
 
     def do_login(self):
         """
@@ -427,13 +739,80 @@ class LoginBrowser(PagesBrowser):
         """
         raise NotImplementedError()
 
+    def dump_state(self):
+        """
+        Get the state of the browser, to resume its session later with
+        :meth:`load_state`, for example in another process.
+
+        There is a session to resume only if the current page is a logged
+        page. Children classes can add their own values to the state,
+        which have to be serializable in JSON.
+
+        :returns: the state, or None if there isn't any session to resume
+        :rtype: :class:`dict` or None
+        """
+        if self.page is None or not self.page.logged:
+            return None
+        return {'url': self.url, 'cookies': self.session.cookies.dump()}
+
+    def load_state(self, state):
+        """
+        Restore a state got by :meth:`dump_state`.
+
+        Nothing is requested: the session is checked by
+        :meth:`resume_session` the first time a login is needed.
+
+        :param state: the state, or None
+        :type state: :class:`dict` or None
+        """
+        if not state:
+            return
+        self.session.cookies.load(state['cookies'])
+        self._resume_url = state['url']
+
+    def resume_session(self):
+        """
+        Check if a session restored by :meth:`load_state` is still valid,
+        by going on the logged page where it has been saved.
+
+        If the session has expired, its cookies are removed, so a new login
+        can be done.
+
+        :returns: True if the browser is now on a logged page
+        :rtype: :class:`bool`
+        """
+        url, self._resume_url = self._resume_url, None
+        if url is None:
+            return False
+
+        try:
+            self.location(url)
+        except requests.exceptions.RequestException as e:
+            self.logger.debug('Unable to resume the session: %s' % e)
+        else:
+            if self.page is not None and self.page.logged:
+                self.logger.debug('Session resumed on %s' % url)
+                return True
+            self.logger.debug('Session has expired')
+
+        self.session.cookies.clear()
+        return False
+
 
 class BasePage(object):
     """
     Base page.
+
+    The document of the page, :attr:`doc`, is only built from the response
+    when it is used the first time, so pages which are only recognized, or
+    whose response is read directly, are never parsed.
     """
     logged = False
 
+    _NO_DOC = object()
+    _doc = _NO_DOC
+    _doc_built = False
+
     def __init__(self, browser, response, params=None):
         self.browser = browser
         self.logger = getLogger(self.__class__.__name__.lower(), browser.logger)
@@ -441,6 +820,40 @@ class BasePage(object):
         self.url = self.response.url
         self.params = params
 
+    @property
+    def doc(self):
+        """
+        Document of the page, built by :meth:`build_doc` on first access.
+        """
+        if self._doc is BasePage._NO_DOC:
+            self._doc = self.build_doc(self.response)
+            self._doc_built = True
+        return self._doc
+
+    @doc.setter
+    def doc(self, doc):
+        self._doc = doc
+        self._doc_built = False
+
+    def build_doc(self, response):
+        """
+        Abstract method to implement to build the document of the page
+        from the response.
+        """
+        raise NotImplementedError()
+
+    def release(self):
+        """
+        Forget the document of the page, to free memory.
+
+        It is called by :class:`PagesBrowser` on the previous page when it
+        goes on another one. If the document is used again, it is built
+        again. A document set explicitly is kept.
+        """
+        if self._doc_built:
+            self._doc = BasePage._NO_DOC
+            self._doc_built = False
+
     def on_load(self):
         """
         Event called when browser loads this page.
@@ -515,10 +928,19 @@ class Form(OrderedDict):
         return self.page.browser.location(self.request, **kwargs)
 
 
+def _iterparse(content, tag, **kwargs):
+    for event, el in etree.iterparse(BytesIO(content), tag=tag, **kwargs):
+        yield el
+        # free the element and its previous siblings, which are not needed
+        # anymore, to keep memory usage low
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+
+
 class JsonPage(BasePage):
-    def __init__(self, browser, response, *args, **kwargs):
-        super(JsonPage, self).__init__(browser, response, *args, **kwargs)
-        self.doc = json.loads(response.text)
+    def build_doc(self, response):
+        return json.loads(response.text)
 
 
 class XMLPage(BasePage):
@@ -528,16 +950,28 @@ class XMLPage(BasePage):
     It is recommended to use None for autodetection.
     """
 
-    def __init__(self, browser, response, *args, **kwargs):
-        super(XMLPage, self).__init__(browser, response, *args, **kwargs)
+    def build_doc(self, response):
         parser = etree.XMLParser(encoding=self.ENCODING or response.encoding)
-        self.doc = etree.parse(BytesIO(response.content), parser)
+        return etree.parse(BytesIO(response.content), parser)
+
+    def iterparse(self, tag):
+        """
+        Iter on elements of the page with the given tag, without building
+        the whole document, for large pages.
+
+        An element can only be used until the next one is yielded, as it is
+        cleared after that. Its children can be used, but not its siblings
+        nor its parents.
+
+        :param tag: tag of elements, or a sequence of tags
+        :type tag: :class:`str`
+        """
+        return _iterparse(self.response.content, tag, encoding=self.ENCODING or self.response.encoding)
 
 
 class RawPage(BasePage):
-    def __init__(self, browser, response, *args, **kwargs):
-        super(RawPage, self).__init__(browser, response, *args, **kwargs)
-        self.doc = response.content
+    def build_doc(self, response):
+        return response.content
 
 
 class HTMLPage(BasePage):
@@ -552,10 +986,18 @@ class HTMLPage(BasePage):
     It is recommended to use None for autodetection.
     """
 
-    def __init__(self, browser, response, *args, **kwargs):
-        super(HTMLPage, self).__init__(browser, response, *args, **kwargs)
+    def build_doc(self, response):
         parser = html.HTMLParser(encoding=self.ENCODING or response.encoding)
-        self.doc = html.parse(BytesIO(response.content), parser)
+        return html.parse(BytesIO(response.content), parser)
+
+    def iterparse(self, tag):
+        """
+        Iter on elements of the page with the given tag, without building
+        the whole document, for large pages.
+
+        See :meth:`XMLPage.iterparse`.
+        """
+        return _iterparse(self.response.content, tag, html=True, encoding=self.ENCODING or self.response.encoding)
 
     def get_form(self, xpath='//form', name=None, nr=None):
         """
@@ -592,6 +1034,78 @@ def method(klass):
     return inner
 
 
+_IMMUTABLE_TYPES = (basestring, int, long, float, bool, type(None), Decimal, datetime.date,
+                    datetime.time, datetime.timedelta, NotAvailableType, NotLoadedType)
+
+
+class ChainedEnv(MutableMapping):
+    """
+    Environment of an element.
+
+    Values set on an element are stored in its own dict, and other values are
+    read from the environment of its parent, so creating an element does not
+    copy the environment of its parent, and changes of a child are not seen
+    by its parent. Values themselves are shared.
+    """
+    _DELETED = object()
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.values = {}
+
+    def __getitem__(self, key):
+        env = self
+        while isinstance(env, ChainedEnv):
+            if key in env.values:
+                value = env.values[key]
+                if value is ChainedEnv._DELETED:
+                    break
+                return value
+            env = env.parent
+        else:
+            if env is not None:
+                return env[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.values[key] = ChainedEnv._DELETED
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    has_key = __contains__
+
+    def keys(self):
+        keys = set(self.parent.keys()) if self.parent is not None else set()
+        for key, value in self.values.items():
+            if value is ChainedEnv._DELETED:
+                keys.discard(key)
+            else:
+                keys.add(key)
+        return list(keys)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def copy(self):
+        return dict((key, self[key]) for key in self.keys())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
 class AbstractElement(object):
     def __init__(self, page, parent=None, el=None):
         self.page = page
@@ -604,15 +1118,17 @@ class AbstractElement(object):
             self.el = page.doc
 
         if parent is not None:
-            self.env = deepcopy(parent.env)
+            self.env = ChainedEnv(parent.env)
         else:
-            self.env = deepcopy(page.params)
+            self.env = ChainedEnv(page.params)
 
     def use_selector(self, func):
         if isinstance(func, _Filter):
             value = func(self)
         elif callable(func):
             value = func()
+        elif isinstance(func, _IMMUTABLE_TYPES):
+            value = func
         else:
             value = deepcopy(func)
 
@@ -621,15 +1137,40 @@ class AbstractElement(object):
     def parse(self, obj):
         pass
 
-    def xpath(self, *args, **kwargs):
-        return self.el.xpath(*args, **kwargs)
+    def xpath(self, path, **kwargs):
+        return xpath(self.el, path, **kwargs)
+
+
+class _ListElementMeta(type):
+    """
+    Private meta-class used to find once the elements classes of
+    :class:`ListElement` which handle each item.
+    """
+    def __new__(mcs, name, bases, attrs):
+        new_class = super(_ListElementMeta, mcs).__new__(mcs, name, bases, attrs)
+        new_class._item_classes = []
+        for attrname in dir(new_class):
+            attr = getattr(new_class, attrname)
+            if isinstance(attr, type) and issubclass(attr, AbstractElement) and attr is not new_class:
+                new_class._item_classes.append(attr)
+        return new_class
 
 
 class ListElement(AbstractElement):
+    __metaclass__ = _ListElementMeta
+
+    _item_classes = None
     item_xpath = None
     flush_at_end = False
     ignore_duplicate = False
 
+    prefetch_next_page = False
+    """
+    If True, the next page is found before items, and is requested in
+    background while items are parsed. Only use it if `next_page` doesn't
+    depend on items.
+    """
+
     def __init__(self, *args, **kwargs):
         super(ListElement, self).__init__(*args, **kwargs)
         self.logger = getLogger(self.__class__.__name__.lower())
@@ -644,8 +1185,14 @@ class ListElement(AbstractElement):
     def __iter__(self):
         self.parse(self.el)
 
+        prefetched = None
+        if self.prefetch_next_page:
+            next_page = self.get_next_page()
+            if next_page is not None:
+                prefetched = self.page.browser.prefetch(next_page)
+
         if self.item_xpath is not None:
-            for el in self.el.xpath(self.item_xpath):
+            for el in self.xpath(self.item_xpath):
                 for obj in self.handle_element(el):
                     if not self.flush_at_end:
                         yield obj
@@ -658,18 +1205,24 @@ class ListElement(AbstractElement):
             for obj in self.objects.itervalues():
                 yield obj
 
-        self.check_next_page()
+        if self.prefetch_next_page:
+            if next_page is not None:
+                raise NextPage(next_page, prefetched)
+        else:
+            self.check_next_page()
 
-    def check_next_page(self):
+    def get_next_page(self):
         if not hasattr(self, 'next_page'):
-            return
+            return None
 
         next_page = getattr(self, 'next_page')
         try:
-            value = self.use_selector(next_page)
+            return self.use_selector(next_page)
         except (AttributeNotFound, XPathNotFound):
-            return
+            return None
 
+    def check_next_page(self):
+        value = self.get_next_page()
         if value is None:
             return
 
@@ -688,9 +1241,8 @@ class ListElement(AbstractElement):
         return obj
 
     def handle_element(self, el):
-        for attrname in dir(self):
-            attr = getattr(self, attrname)
-            if isinstance(attr, type) and issubclass(attr, AbstractElement) and attr != type(self):
+        for attr in self._item_classes:
+            if attr is not type(self):
                 for obj in attr(self.page, self, el):
                     obj = self.store(obj)
                     if obj:
@@ -706,7 +1258,14 @@ class SkipItem(Exception):
 class _ItemElementMeta(type):
     """
     Private meta-class used to keep order of obj_* attributes in :class:`ItemElement`.
+
+    It also resolves once these attributes, to build the list of
+    (field name, attribute name, value, kind) of the class.
     """
+    PLAN_CONSTANT = 0
+    PLAN_METHOD = 1
+    PLAN_GETATTR = 2
+
     def __new__(mcs, name, bases, attrs):
         _attrs = []
         for base in bases:
@@ -719,13 +1278,32 @@ class _ItemElementMeta(type):
 
         new_class = super(_ItemElementMeta, mcs).__new__(mcs, name, bases, attrs)
         new_class._attrs = _attrs + [f[0] for f in filters]
+        new_class._plan = [mcs.plan_attr(new_class, attr) for attr in new_class._attrs]
         return new_class
 
+    @classmethod
+    def plan_attr(mcs, klass, attr):
+        attrname = 'obj_%s' % attr
+        for base in klass.__mro__:
+            if attrname in base.__dict__:
+                value = base.__dict__[attrname]
+                break
+        else:
+            return (attr, attrname, None, mcs.PLAN_GETATTR)
+
+        if isinstance(value, FunctionType):
+            return (attr, attrname, value, mcs.PLAN_METHOD)
+        if hasattr(value, '__get__'):
+            # other descriptors (properties, etc.) are resolved on instances
+            return (attr, attrname, None, mcs.PLAN_GETATTR)
+        return (attr, attrname, value, mcs.PLAN_CONSTANT)
+
 
 class ItemElement(AbstractElement):
     __metaclass__ = _ItemElementMeta
 
     _attrs = None
+    _plan = None
     klass = None
     condition = None
     validate = None
@@ -757,8 +1335,12 @@ class ItemElement(AbstractElement):
             if self.obj is None:
                 self.obj = self.build_object()
             self.parse(self.el)
-            for attr in self._attrs:
-                self.handle_attr(attr, getattr(self, 'obj_%s' % attr))
+            for attr, attrname, value, kind in self._plan:
+                if attrname in self.__dict__ or kind == _ItemElementMeta.PLAN_GETATTR:
+                    value = getattr(self, attrname)
+                elif kind == _ItemElementMeta.PLAN_METHOD:
+                    value = value.__get__(self, type(self))
+                self.handle_attr(attr, value)
         except SkipItem:
             return
 
@@ -772,7 +1354,28 @@ class ItemElement(AbstractElement):
         setattr(self.obj, key, value)
 
 
+class _TableElementMeta(_ListElementMeta):
+    """
+    Private meta-class used to find once the col_* attributes of
+    :class:`TableElement`.
+    """
+    def __new__(mcs, name, bases, attrs):
+        new_class = super(_TableElementMeta, mcs).__new__(mcs, name, bases, attrs)
+        new_class._columns = {}
+        for attrname in dir(new_class):
+            m = re.match('col_(.*)', attrname)
+            if m:
+                cols = getattr(new_class, attrname)
+                if not isinstance(cols, (list,tuple)):
+                    cols = [cols]
+                new_class._columns[m.group(1)] = [s.lower() for s in cols]
+        return new_class
+
+
 class TableElement(ListElement):
+    __metaclass__ = _TableElementMeta
+
+    _columns = None
     head_xpath = None
     cleaner = CleanText
 
@@ -781,18 +1384,9 @@ class TableElement(ListElement):
 
         self._cols = {}
 
-        columns = {}
-        for attrname in dir(self):
-            m = re.match('col_(.*)', attrname)
-            if m:
-                cols = getattr(self, attrname)
-                if not isinstance(cols, (list,tuple)):
-                    cols = [cols]
-                columns[m.group(1)] = [s.lower() for s in cols]
-
-        for colnum, el in enumerate(self.el.xpath(self.head_xpath)):
+        for colnum, el in enumerate(self.xpath(self.head_xpath)):
             title = self.cleaner.clean(el).lower()
-            for name, titles in columns.iteritems():
+            for name, titles in self._columns.iteritems():
                 if title in titles:
                     self._cols[name] = colnum
 
@@ -809,3 +1403,123 @@ class LoggedPage(object):
     pages with a login form.
     """
     logged = True
+
+
+def test():
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from time import sleep
+
+    from weboob.capabilities.base import CapBaseObject
+    from .filters import Link
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            num = int(self.path.rsplit('/', 1)[1])
+            items = ''.join('<li>%d.%d</li>' % (num, i) for i in xrange(3))
+            link = '<a class="next" href="/list/%d">next</a>' % (num + 1) if num < 2 else ''
+            content = '<html><body><ul>%s</ul>%s</body></html>' % (items, link)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('Set-Cookie', 'page=%d; Path=/' % num)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    class ListPage(HTMLPage):
+        @pagination
+        @method
+        class iter_rows(ListElement):
+            item_xpath = '//li'
+            next_page = Link('//a[@class="next"]')
+            prefetch_next_page = True
+
+            class item(ItemElement):
+                klass = CapBaseObject
+
+                obj_id = CleanText('.')
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    class Browser(PagesBrowser):
+        BASEURL = 'http://127.0.0.1:%d' % server.server_address[1]
+        list = URL('/list/(?P<num>\d+)', ListPage)
+
+    try:
+        # documents are only built when they are used
+        b = Browser()
+        b.list.go(num=0)
+        page = b.page
+        assert isinstance(page, ListPage)
+        assert b.list.is_here(num=0)
+        assert page._doc is BasePage._NO_DOC
+        assert len(page.doc.xpath('//li')) == 3
+        # iterparse() doesn't build the document, and clears elements once
+        # they are used
+        page = b.open('/list/1').page
+        elements = []
+        for el in page.iterparse('li'):
+            assert el.text == '1.%d' % len(elements)
+            elements.append(el)
+        assert len(elements) == 3
+        assert all(el.text is None for el in elements)
+        assert page._doc is BasePage._NO_DOC
+        # documents built lazily are released when the browser leaves the
+        # page, but not documents which are set explicitly
+        page = b.page
+        b.list.go(num=1)
+        assert page._doc is BasePage._NO_DOC
+        assert len(page.doc.xpath('//li')) == 3
+        b.page.doc = doc = etree.fromstring('<ul/>')
+        page = b.page
+        b.list.go(num=0)
+        assert page.doc is doc
+
+        # prefetched pages are used, and their cookies are set when they
+        # are reached
+        del hits[:]
+        b = Browser()
+        b.list.go(num=0)
+        ids = []
+        for obj in b.page.iter_rows():
+            assert b.session.cookies['page'] == obj.id.split('.')[0]
+            if obj.id == '0.0':
+                # the next page is requested while this one is parsed
+                for i in xrange(500):
+                    if '/list/1' in hits:
+                        break
+                    sleep(0.01)
+                assert '/list/1' in hits
+            ids.append(obj.id)
+        assert ids == ['%d.%d' % (p, i) for p in xrange(3) for i in xrange(3)]
+        assert hits == ['/list/0', '/list/1', '/list/2']
+        assert len(b._prefetches) == 0
+
+        # the response is discarded when the browser has gone elsewhere
+        del hits[:]
+        prefetched = b.prefetch('/list/1')
+        b.list.go(num=0)
+        b.location('/list/1', prefetched=prefetched)
+        assert b.session.cookies['page'] == '1'
+        assert sorted(hits) == ['/list/0', '/list/1', '/list/1']
+
+        # or when its cookies have changed
+        del hits[:]
+        prefetched = b.prefetch('/list/2')
+        b.session.cookies.set('other', 'value')
+        b.location('/list/2', prefetched=prefetched)
+        assert len(hits) == 2
+        assert len(b._prefetches) == 0
+
+        # only GET requests are prefetched
+        assert b.prefetch(requests.Request('POST', '/list/0', data={'a': 'b'})) is None
+    finally:
+        server.shutdown()
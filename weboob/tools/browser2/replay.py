@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import os
+from datetime import timedelta
+from io import BytesIO
+from threading import Lock
+try:
+    from http.client import HTTPMessage
+except ImportError:
+    from httplib import HTTPMessage
+try:
+    from urllib.parse import urlsplit, urlunsplit
+except ImportError:
+    from urlparse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from weboob.tools.log import getLogger
+
+
+__all__ = ['RecordedResponse', 'ResponsesReplay', 'ReplayAdapter']
+
+
+class RecordedResponse(object):
+    """
+    A response saved in a directory by the save_responses option of
+    browsers.
+
+    Method, body, status and headers are only known if they have been
+    saved.
+    """
+
+    def __init__(self, dirname, filename, url):
+        self.path = os.path.join(dirname, filename)
+        self.url = url
+        self.request_url = url
+        self.method = None
+        self.body = None
+        self.status_code = 200
+        self.reason = 'OK'
+        self.headers = []
+        self._content = None
+
+        if os.path.exists(self.path + '-request.txt'):
+            with open(self.path + '-request.txt', 'rb') as f:
+                parts = f.read().split('\n\n\n', 2)
+            self.method, self.request_url = parts[0].split(' ', 1)
+            if len(parts) > 2:
+                self.body = parts[2]
+
+        if os.path.exists(self.path + '-response.txt'):
+            with open(self.path + '-response.txt', 'rb') as f:
+                data = f.read()
+            if data.startswith('Time:'):
+                data = data.partition('\n')[2]
+            status, _, headers = data.partition('\n\n\n')
+            status, _, self.reason = status.partition(' ')
+            self.status_code = int(status)
+            self.headers = [tuple(line.split(': ', 1)) for line in headers.splitlines() if ': ' in line]
+
+    @property
+    def content(self):
+        if self._content is None:
+            with open(self.path, 'rb') as f:
+                self._content = f.read()
+        return self._content
+
+
+class ResponsesReplay(object):
+    """
+    Responses saved in a directory, which are served instead of requesting
+    websites.
+
+    A request is matched against saved requests on its method, URL and
+    body. If there isn't any such request, the body is ignored, and then
+    the query string of URL, with a warning. When several saved responses
+    match, they are served in the order they have been saved, and the last
+    one is served again after that.
+
+    Saved responses are read and indexed on their method and URL when the
+    replay is built.
+
+    :param dirname: directory where responses have been saved
+    :type dirname: :class:`str`
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.logger = getLogger('browser.replay')
+        self.lock = Lock()
+        self.responses = []
+        # (method, URL) -> positions of responses, with a None method if
+        # it is unknown
+        self.by_url = {}
+        # (method, URL without query) -> positions of responses
+        self.by_path = {}
+        self.served = set()
+        self.load()
+
+    @staticmethod
+    def strip_query(url):
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        return urlunsplit((scheme, netloc, path, '', ''))
+
+    def load(self):
+        self.responses = []
+        self.by_url = {}
+        self.by_path = {}
+        try:
+            f = open(os.path.join(self.dirname, 'url_response_match.txt'), 'rb')
+        except IOError as e:
+            self.logger.warning('Unable to read saved responses in %s: %s' % (self.dirname, e))
+            return
+
+        with f:
+            for line in f:
+                if line.startswith('#') or '\t' not in line:
+                    continue
+                url, filename = line.rstrip('\r\n').rsplit('\t', 1)
+                response = RecordedResponse(self.dirname, filename, url)
+                position = len(self.responses)
+                self.responses.append(response)
+                self.by_url.setdefault((response.method, response.request_url), []).append(position)
+                self.by_path.setdefault((response.method, self.strip_query(response.request_url)), []).append(position)
+
+    def _find(self, index, method, url):
+        positions = index.get((method, url), [])
+        if method is not None:
+            positions = sorted(positions + index.get((None, url), []))
+        return [self.responses[i] for i in positions]
+
+    def lookup(self, method, url, body=None):
+        """
+        Find the saved response of a request.
+
+        :rtype: :class:`RecordedResponse` or None
+        """
+        with self.lock:
+            candidates = self._find(self.by_url, method, url)
+            if not candidates:
+                candidates = self._find(self.by_path, method, self.strip_query(url))
+                if candidates:
+                    # the page served may not be the one requested
+                    self.logger.warning(u'No saved response for %s, ignore its query string' % url)
+            exact = [r for r in candidates if r.body == body]
+            candidates = exact or candidates
+            if not candidates:
+                return None
+
+            for response in candidates:
+                if response not in self.served:
+                    self.served.add(response)
+                    return response
+            return candidates[-1]
+
+
+class _FakeOriginalResponse(object):
+    def __init__(self, headers):
+        self.msg = HTTPMessage(BytesIO(''.join('%s: %s\r\n' % (key, value) for key, value in headers)))
+
+
+class _FakeRawResponse(object):
+    def __init__(self, headers):
+        # used by requests to extract cookies
+        self._original_response = _FakeOriginalResponse(headers)
+
+    def release_conn(self):
+        pass
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Transport adapter of python-requests serving responses of a
+    :class:`ResponsesReplay` instead of requesting websites.
+    """
+
+    def __init__(self, replay):
+        super(ReplayAdapter, self).__init__()
+        self.replay = replay
+
+    def send(self, request, **kwargs):
+        recorded = self.replay.lookup(request.method, request.url, request.body)
+        if recorded is None:
+            raise requests.exceptions.ConnectionError('No saved response for %s %s' % (request.method, request.url),
+                                                      request=request)
+
+        response = requests.Response()
+        response.status_code = recorded.status_code
+        response.reason = recorded.reason
+        response.headers = CaseInsensitiveDict(recorded.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _FakeRawResponse(recorded.headers)
+        response.url = request.url
+        response._content = recorded.content
+        response._content_consumed = True
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(0)
+        return response
+
+    def close(self):
+        pass
+
+
+def test():
+    import logging
+    import shutil
+    import tempfile
+    from threading import Thread
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+    from weboob.tools.log import settings
+    from .browser import BaseBrowser
+
+    hits = []
+    warnings = []
+
+    class WarningsHandler(logging.Handler):
+        def emit(self, record):
+            warnings.append(record.getMessage())
+
+    replay_logger = getLogger('browser.replay')
+    warnings_handler = WarningsHandler(logging.WARNING)
+
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, code, content, *headers):
+            self.send_response(code)
+            for header in headers:
+                self.send_header(*header)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            hits.append(self.path)
+            if self.path == '/login':
+                self.reply(302, '', ('Location', '/home'), ('Set-Cookie', 'session=42; Path=/'))
+            else:
+                self.reply(200, 'GET %s %d' % (self.path, len(hits)))
+
+        def do_POST(self):
+            hits.append(self.path)
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            self.reply(200, 'POST %s' % body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    root = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_replay_')
+    old_settings = dict(settings)
+    try:
+        settings['save_responses'] = True
+        b = BaseBrowser(responses_dirname=tmpdir)
+        b.location(root + '/login')
+        recorded = [b.open(root + '/page?id=1').content,
+                    b.open(root + '/page?id=1').content,
+                    b.open(root + '/search', data={'q': 'a'}).content,
+                    b.open(root + '/search', data={'q': 'b'}).content]
+        server.shutdown()
+        del settings['save_responses']
+
+        settings['replay_responses'] = True
+        b = BaseBrowser(responses_dirname=tmpdir)
+        b.location(root + '/login')
+        assert b.url == root + '/home'
+        assert b.session.cookies.get('session') == '42'
+        # responses are served in the order they have been saved
+        assert [b.open(root + '/page?id=1').content,
+                b.open(root + '/page?id=1').content,
+                b.open(root + '/search', data={'q': 'a'}).content,
+                b.open(root + '/search', data={'q': 'b'}).content] == recorded
+        assert recorded[0] != recorded[1] and recorded[2] != recorded[3]
+        # then the last one again, and the query string is ignored if
+        # needed, with a warning
+        replay_logger.addHandler(warnings_handler)
+        assert b.open(root + '/page?id=1').content == recorded[1]
+        assert warnings == []
+        assert b.open(root + '/page?id=2').content == recorded[1]
+        assert len(warnings) == 1 and '/page?id=2' in warnings[0]
+        try:
+            b.open(root + '/unknown')
+        except requests.exceptions.ConnectionError:
+            pass
+        else:
+            assert False, 'no saved response should be found'
+        assert len(hits) == 6
+    finally:
+        replay_logger.removeHandler(warnings_handler)
+        server.shutdown()
+        settings.clear()
+        settings.update(old_settings)
+        shutil.rmtree(tmpdir)
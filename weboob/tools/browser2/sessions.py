@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import hashlib
+import hmac
+import os
+import struct
+import tempfile
+
+from weboob.tools.compat import unicode
+from weboob.tools.json import json
+from weboob.tools.log import getLogger
+
+
+__all__ = ['SessionStore']
+
+
+def _pbkdf2(secret, salt, iterations, length):
+    if hasattr(hashlib, 'pbkdf2_hmac'):
+        return hashlib.pbkdf2_hmac('sha256', secret, salt, iterations, length)
+
+    # python < 2.7.8
+    key = ''
+    block = 1
+    while len(key) < length:
+        u = hmac.new(secret, salt + struct.pack('>I', block), hashlib.sha256).digest()
+        result = int(u.encode('hex'), 16)
+        for i in xrange(iterations - 1):
+            u = hmac.new(secret, u, hashlib.sha256).digest()
+            result ^= int(u.encode('hex'), 16)
+        key += ('%064x' % result).decode('hex')
+        block += 1
+    return key[:length]
+
+
+def _compare_digest(a, b):
+    if hasattr(hmac, 'compare_digest'):
+        return hmac.compare_digest(a, b)
+
+    # python < 2.7.7
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+class SessionStore(object):
+    """
+    Store of browser sessions, so a backend can resume its session in
+    another process instead of login again.
+
+    A session is stored in the *path* directory, in a file named from a
+    HMAC of the backend name and of its credentials, and is encrypted with
+    a key derived from the credentials. So a session can only be read with
+    the same credentials, and is forgotten when they change. The HMAC key
+    is randomly generated and stored in the directory, so file names can't
+    be used to check guesses of credentials without it.
+
+    Sessions are encrypted with HMAC-SHA256 in counter mode, and
+    authenticated with HMAC-SHA256, so only the standard library is
+    required.
+
+    :param path: directory where sessions are stored
+    :type path: :class:`str`
+    """
+    VERSION = 'WS1'
+    ITERATIONS = 10000
+    KEY_FILE = '.key'
+
+    def __init__(self, path):
+        self.logger = getLogger('browser.sessions')
+        self.path = path
+
+    @staticmethod
+    def _bytes(value):
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+    def _read_key(self):
+        try:
+            with open(os.path.join(self.path, self.KEY_FILE), 'rb') as f:
+                key = f.read()
+        except IOError:
+            return None
+        if len(key) != 32:
+            self.logger.warning('Invalid key file in %s' % self.path)
+            return None
+        return key
+
+    def _get_key(self):
+        """
+        Get the key used to name session files, and create it if needed.
+        """
+        key = self._read_key()
+        if key is not None:
+            return key
+
+        fd, tmpname = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(32))
+            try:
+                # Contrary to rename(), link() doesn't replace the key of
+                # another process which has created it at the same time.
+                os.link(tmpname, os.path.join(self.path, self.KEY_FILE))
+            except OSError:
+                pass
+        finally:
+            os.remove(tmpname)
+        key = self._read_key()
+        if key is None:
+            raise IOError('Unable to create the key file in %s' % self.path)
+        return key
+
+    def _filename(self, name, secret, key):
+        digest = hmac.new(key, self._bytes(name) + '\0' + self._bytes(secret), hashlib.sha256).hexdigest()
+        return os.path.join(self.path, digest)
+
+    @classmethod
+    def _keys(cls, secret, salt):
+        key = _pbkdf2(cls._bytes(secret), salt, cls.ITERATIONS, 64)
+        return key[:32], key[32:]
+
+    @staticmethod
+    def _xor_stream(key, nonce, data):
+        if not data:
+            return ''
+        stream = []
+        for i in xrange((len(data) + 31) // 32):
+            stream.append(hmac.new(key, nonce + struct.pack('>Q', i), hashlib.sha256).digest())
+        stream = ''.join(stream)[:len(data)]
+        return ('%0*x' % (len(data) * 2, int(data.encode('hex'), 16) ^ int(stream.encode('hex'), 16))).decode('hex')
+
+    @classmethod
+    def encrypt(cls, secret, data):
+        """
+        Encrypt and authenticate data with a key derived from *secret*.
+
+        :rtype: :class:`str`
+        """
+        salt = os.urandom(16)
+        nonce = os.urandom(16)
+        enc_key, mac_key = cls._keys(secret, salt)
+        message = cls.VERSION + salt + nonce + cls._xor_stream(enc_key, nonce, data)
+        return message + hmac.new(mac_key, message, hashlib.sha256).digest()
+
+    @classmethod
+    def decrypt(cls, secret, data):
+        """
+        Decrypt data encrypted by :meth:`encrypt`.
+
+        :returns: decrypted data, or None if it has been altered or if the
+                  secret is wrong
+        :rtype: :class:`str` or None
+        """
+        header = len(cls.VERSION) + 32
+        if len(data) < header + 32 or not data.startswith(cls.VERSION):
+            return None
+        message, tag = data[:-32], data[-32:]
+        salt, nonce = message[len(cls.VERSION):len(cls.VERSION) + 16], message[len(cls.VERSION) + 16:header]
+        enc_key, mac_key = cls._keys(secret, salt)
+        if not _compare_digest(hmac.new(mac_key, message, hashlib.sha256).digest(), tag):
+            return None
+        return cls._xor_stream(enc_key, nonce, message[header:])
+
+    def load(self, name, secret):
+        """
+        Load a stored session.
+
+        :param name: name of backend
+        :type name: :class:`str`
+        :param secret: credentials of backend
+        :type secret: :class:`str`
+        :returns: state of the browser, or None
+        :rtype: :class:`dict` or None
+        """
+        key = self._read_key()
+        if key is None:
+            return None
+        try:
+            with open(self._filename(name, secret, key), 'rb') as f:
+                data = f.read()
+        except IOError:
+            return None
+
+        data = self.decrypt(secret, data)
+        if data is None:
+            self.logger.warning('Unable to decrypt the session of %s' % name)
+            return None
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            self.logger.warning('Unable to read the session of %s: %s' % (name, e))
+            return None
+
+    def save(self, name, secret, state):
+        """
+        Store a session.
+
+        :param name: name of backend
+        :type name: :class:`str`
+        :param secret: credentials of backend
+        :type secret: :class:`str`
+        :param state: state of the browser, which can be serialized in JSON
+        :type state: :class:`dict`
+        """
+        data = self.encrypt(secret, json.dumps(state))
+        tmpname = None
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path, 0o700)
+            key = self._get_key()
+            fd, tmpname = tempfile.mkstemp(dir=self.path)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmpname, self._filename(name, secret, key))
+        except (IOError, OSError) as e:
+            self.logger.warning('Unable to store the session of %s: %s' % (name, e))
+            if tmpname is not None and os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def delete(self, name, secret):
+        """
+        Forget a stored session.
+        """
+        key = self._read_key()
+        if key is None:
+            return
+        try:
+            os.remove(self._filename(name, secret, key))
+        except OSError:
+            pass
+
+
+def test():
+    import shutil
+    from threading import Thread
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+    from .page import HTMLPage, LoggedPage, LoginBrowser, URL, need_login
+
+    assert SessionStore.decrypt('secret', SessionStore.encrypt('secret', 'data')) == 'data'
+    assert SessionStore.decrypt('secret', SessionStore.encrypt('secret', '')) == ''
+    assert SessionStore.decrypt('other', SessionStore.encrypt('secret', 'data')) is None
+    data = SessionStore.encrypt('secret', 'data')
+    assert SessionStore.decrypt('secret', data[:-40] + chr(ord(data[-40]) ^ 1) + data[-39:]) is None
+
+    sessions = set(['valid'])
+    requests_count = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_count.append(self.path)
+            logged = any(('s=%s' % s) in self.headers.get('Cookie', '') for s in sessions)
+            if self.path == '/login':
+                sessions.add('s%d' % len(requests_count))
+                self.send_response(302)
+                self.send_header('Set-Cookie', 's=s%d; Path=/' % len(requests_count))
+                self.send_header('Location', '/home')
+            elif self.path == '/home' and not logged:
+                self.send_response(302)
+                self.send_header('Location', '/login-form')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(self.path)))
+            self.end_headers()
+            self.wfile.write(self.path)
+
+        def log_message(self, *args):
+            pass
+
+    class HomePage(LoggedPage, HTMLPage):
+        pass
+
+    class LoginPage(HTMLPage):
+        pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    class Browser(LoginBrowser):
+        BASEURL = 'http://127.0.0.1:%d' % server.server_address[1]
+        home = URL('/home', HomePage)
+        login = URL('/login-form', LoginPage)
+
+        def do_login(self):
+            self.location('/login')
+
+        @need_login
+        def get_home(self):
+            return self.home.stay_or_go()
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_sessions_')
+    try:
+        store = SessionStore(tmpdir)
+        b = Browser('user', 'pass')
+        b.get_home()
+        assert requests_count == ['/login', '/home']
+        store.save('backend', 'user:pass', b.dump_state())
+        assert store.load('backend', 'user:wrong') is None
+
+        # the name of the file depends on the key of the store
+        keyfile = os.path.join(tmpdir, SessionStore.KEY_FILE)
+        assert os.stat(keyfile).st_mode & 0o777 == 0o600
+        key = store._read_key()
+        assert os.path.exists(store._filename('backend', 'user:pass', key))
+        assert not os.path.exists(os.path.join(tmpdir, hashlib.sha256('backend\0user:pass').hexdigest()))
+        assert store._filename('backend', 'user:pass', key) != store._filename('backend', 'user:pass', os.urandom(32))
+
+        # errors are logged, even when the directory can't be created
+        SessionStore(os.path.join(keyfile, 'sessions')).save('backend', 'user:pass', {})
+
+        # the session is resumed with one request
+        b = Browser('user', 'pass')
+        b.load_state(store.load('backend', 'user:pass'))
+        assert isinstance(b.get_home(), HomePage)
+        assert requests_count == ['/login', '/home', '/home']
+
+        # the session has expired, so the browser logs in again
+        sessions.clear()
+        b = Browser('user', 'pass')
+        b.load_state(store.load('backend', 'user:pass'))
+        assert isinstance(b.get_home(), HomePage)
+        assert requests_count[3:] == ['/home', '/login-form', '/login', '/home']
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmpdir)
@@ -21,9 +21,12 @@
 from decimal import Decimal, InvalidOperation
 import datetime
 import re
+import sre_constants
+import sre_parse
 
 from weboob.capabilities.bank import Transaction, Account
 from weboob.capabilities import NotAvailable, NotLoaded
+from weboob.tools.compat import unicode
 from weboob.tools.misc import to_unicode
 from weboob.tools.log import getLogger
 
@@ -41,6 +44,126 @@ class classproperty(object):
         return self.f(owner)
 
 
+class PatternsMatcher(object):
+    """
+    Find the first pattern of a list matching a string.
+
+    The characters a pattern can start with are computed from the regexp,
+    and patterns are indexed by them. A string is then only tried against
+    patterns able to match its first character, in their order in the list.
+
+    :param patterns: list of tuples (regexp, value)
+    :type patterns: :class:`list`
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.size = len(patterns)
+
+        anywhere = []
+        by_char = {}
+        for i, (pattern, value) in enumerate(patterns):
+            chars = self.get_first_chars(pattern)
+            if chars is None:
+                anywhere.append(i)
+            else:
+                for c in chars:
+                    by_char.setdefault(c, []).append(i)
+
+        self.default = tuple(patterns[i] for i in anywhere)
+        self.index = dict((c, tuple(patterns[i] for i in sorted(indexes + anywhere)))
+                          for c, indexes in by_char.iteritems())
+
+    @classmethod
+    def get_first_chars(cls, pattern):
+        """
+        Get the set of characters a string matched by this pattern can start
+        with, or None if it can be anything.
+        """
+        if pattern.flags & (re.IGNORECASE | re.UNICODE | re.LOCALE):
+            return None
+        try:
+            chars, nullable = cls._first_chars(sre_parse.parse(pattern.pattern, pattern.flags))
+        except (sre_constants.error, TypeError, ValueError):
+            return None
+        if nullable:
+            # it can match an empty string
+            return None
+        return chars
+
+    @classmethod
+    def _first_chars(cls, items):
+        """
+        Get the set of first characters of a parsed regexp, and if it can
+        match an empty string.
+        """
+        chars = set()
+        for op, av in items:
+            nullable = False
+            if op == sre_constants.AT and av in (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING):
+                continue
+            elif op == sre_constants.LITERAL:
+                sub = set([unichr(av)])
+            elif op == sre_constants.IN:
+                sub = cls._in_chars(av)
+            elif op == sre_constants.SUBPATTERN:
+                sub, nullable = cls._first_chars(av[-1])
+            elif op == sre_constants.BRANCH:
+                sub = set()
+                for alternative in av[1]:
+                    s, n = cls._first_chars(alternative)
+                    if s is None:
+                        return None, False
+                    sub |= s
+                    nullable = nullable or n
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+                sub, nullable = cls._first_chars(av[2])
+                nullable = nullable or av[0] == 0
+            else:
+                return None, False
+
+            if sub is None:
+                return None, False
+            chars |= sub
+            if not nullable:
+                return chars, False
+        return chars, True
+
+    @staticmethod
+    def _in_chars(items):
+        chars = set()
+        for op, av in items:
+            if op == sre_constants.LITERAL:
+                chars.add(unichr(av))
+            elif op == sre_constants.RANGE and av[1] - av[0] < 256:
+                chars.update(unichr(c) for c in xrange(av[0], av[1] + 1))
+            elif op == sre_constants.CATEGORY and av == sre_constants.CATEGORY_DIGIT:
+                chars.update(u'0123456789')
+            elif op == sre_constants.CATEGORY and av == sre_constants.CATEGORY_SPACE:
+                chars.update(u' \t\n\r\f\v')
+            else:
+                return None
+        return chars
+
+    def match(self, text):
+        """
+        Match a string against patterns.
+
+        :returns: the match object and the value of the first matching
+                  pattern, or (None, None)
+        """
+        if isinstance(text, unicode):
+            patterns = self.index.get(text[:1], self.default)
+        else:
+            # the index is built with unicode characters
+            patterns = self.patterns
+        for pattern, value in patterns:
+            m = pattern.match(text)
+            if m:
+                return m, value
+        return None, None
+
+
 class FrenchTransaction(Transaction):
     """
     Transaction with some helpers for french bank websites.
@@ -76,6 +199,18 @@ class FrenchTransaction(Transaction):
         else:
             self.amount = Decimal('0')
 
+    @classmethod
+    def get_patterns_matcher(klass):
+        """
+        Get the :class:`PatternsMatcher` of :attr:`PATTERNS`, built once per
+        class.
+        """
+        matcher = klass.__dict__.get('_patterns_matcher')
+        if matcher is None or matcher.patterns is not klass.PATTERNS or matcher.size != len(klass.PATTERNS):
+            matcher = PatternsMatcher(klass.PATTERNS)
+            klass._patterns_matcher = matcher
+        return matcher
+
     def parse_date(self, date):
         if date is None:
             return NotAvailable
@@ -125,54 +260,51 @@ class FrenchTransaction(Transaction):
         else:
             self.label = self.raw
 
-        for pattern, _type in self.PATTERNS:
-            m = pattern.match(self.raw)
-            if m:
-                args = m.groupdict()
-
-                def inargs(key):
-                    """
-                    inner function to check if a key is in args,
-                    and is not None.
-                    """
-                    return args.get(key, None) is not None
-
-                self.type = _type
-                if inargs('text'):
-                    self.label = args['text'].strip()
-                if inargs('category'):
-                    self.category = args['category'].strip()
-
-                # Set date from information in raw label.
-                if inargs('dd') and inargs('mm'):
-                    dd = int(args['dd'])
-                    mm = int(args['mm'])
-
-                    if inargs('yy'):
-                        yy = int(args['yy'])
-                    else:
-                        d = self.date
-                        try:
-                            d = d.replace(month=mm, day=dd)
-                        except ValueError:
-                            d = d.replace(year=d.year-1, month=mm, day=dd)
-
-                        yy = d.year
-                        if d > self.date:
-                            yy -= 1
+        m, _type = self.get_patterns_matcher().match(self.raw)
+        if m:
+            args = m.groupdict()
+
+            def inargs(key):
+                """
+                inner function to check if a key is in args,
+                and is not None.
+                """
+                return args.get(key, None) is not None
+
+            self.type = _type
+            if inargs('text'):
+                self.label = args['text'].strip()
+            if inargs('category'):
+                self.category = args['category'].strip()
+
+            # Set date from information in raw label.
+            if inargs('dd') and inargs('mm'):
+                dd = int(args['dd'])
+                mm = int(args['mm'])
+
+                if inargs('yy'):
+                    yy = int(args['yy'])
+                else:
+                    d = self.date
+                    try:
+                        d = d.replace(month=mm, day=dd)
+                    except ValueError:
+                        d = d.replace(year=d.year-1, month=mm, day=dd)
 
-                    if yy < 100:
-                        yy += 2000
+                    yy = d.year
+                    if d > self.date:
+                        yy -= 1
 
-                    try:
-                        if inargs('HH') and inargs('MM'):
-                            self.rdate = datetime.datetime(yy, mm, dd, int(args['HH']), int(args['MM']))
-                        else:
-                            self.rdate = datetime.date(yy, mm, dd)
-                    except ValueError as e:
-                        self._logger.warning('Unable to date in label %r: %s' % (self.raw, e))
+                if yy < 100:
+                    yy += 2000
 
-                return
+                try:
+                    if inargs('HH') and inargs('MM'):
+                        self.rdate = datetime.datetime(yy, mm, dd, int(args['HH']), int(args['MM']))
+                    else:
+                        self.rdate = datetime.date(yy, mm, dd)
+                except ValueError as e:
+                    self._logger.warning('Unable to date in label %r: %s' % (self.raw, e))
 
     @classproperty
     def TransactionElement(k):
@@ -222,7 +354,6 @@ class FrenchTransaction(Transaction):
 
     @classmethod
     def Raw(klass, *args, **kwargs):
-        patterns = klass.PATTERNS
         class Filter(CleanText):
             def __call__(self, item):
                 raw = super(Filter, self).__call__(item)
@@ -234,54 +365,51 @@ class FrenchTransaction(Transaction):
                 else:
                     item.obj.label = raw
 
-                for pattern, _type in patterns:
-                    m = pattern.match(raw)
-                    if m:
-                        args = m.groupdict()
-
-                        def inargs(key):
-                            """
-                            inner function to check if a key is in args,
-                            and is not None.
-                            """
-                            return args.get(key, None) is not None
-
-                        item.obj.type = _type
-                        if inargs('text'):
-                            item.obj.label = args['text'].strip()
-                        if inargs('category'):
-                            item.obj.category = args['category'].strip()
-
-                        # Set date from information in raw label.
-                        if inargs('dd') and inargs('mm'):
-                            dd = int(args['dd'])
-                            mm = int(args['mm'])
-
-                            if inargs('yy'):
-                                yy = int(args['yy'])
-                            else:
-                                d = item.obj.date
-                                try:
-                                    d = d.replace(month=mm, day=dd)
-                                except ValueError:
-                                    d = d.replace(year=d.year-1, month=mm, day=dd)
+                m, _type = klass.get_patterns_matcher().match(raw)
+                if m:
+                    args = m.groupdict()
+
+                    def inargs(key):
+                        """
+                        inner function to check if a key is in args,
+                        and is not None.
+                        """
+                        return args.get(key, None) is not None
+
+                    item.obj.type = _type
+                    if inargs('text'):
+                        item.obj.label = args['text'].strip()
+                    if inargs('category'):
+                        item.obj.category = args['category'].strip()
+
+                    # Set date from information in raw label.
+                    if inargs('dd') and inargs('mm'):
+                        dd = int(args['dd'])
+                        mm = int(args['mm'])
+
+                        if inargs('yy'):
+                            yy = int(args['yy'])
+                        else:
+                            d = item.obj.date
+                            try:
+                                d = d.replace(month=mm, day=dd)
+                            except ValueError:
+                                d = d.replace(year=d.year-1, month=mm, day=dd)
 
-                                yy = d.year
-                                if d > item.obj.date:
-                                    yy -= 1
+                            yy = d.year
+                            if d > item.obj.date:
+                                yy -= 1
 
-                            if yy < 100:
-                                yy += 2000
+                        if yy < 100:
+                            yy += 2000
 
-                            try:
-                                if inargs('HH') and inargs('MM'):
-                                    item.obj.rdate = datetime.datetime(yy, mm, dd, int(args['HH']), int(args['MM']))
-                                else:
-                                    item.obj.rdate = datetime.date(yy, mm, dd)
-                            except ValueError as e:
-                                self._logger.warning('Unable to date in label %r: %s' % (raw, e))
-
-                        break
+                        try:
+                            if inargs('HH') and inargs('MM'):
+                                item.obj.rdate = datetime.datetime(yy, mm, dd, int(args['HH']), int(args['MM']))
+                            else:
+                                item.obj.rdate = datetime.date(yy, mm, dd)
+                        except ValueError as e:
+                            self._logger.warning('Unable to date in label %r: %s' % (raw, e))
 
                 return raw
             def filter(self, text):
@@ -313,3 +441,27 @@ class FrenchTransaction(Transaction):
                     pass
 
             return Decimal('0')
+
+
+def test():
+    patterns = [(re.compile('^(?P<text>.*) CARTE \d+'), 'card'),
+                (re.compile('^VIR(EMENT)? (?P<text>.*)'), 'transfer'),
+                (re.compile('^(REMISE|REM CHQ) (?P<text>.*)'), 'deposit'),
+                (re.compile('^(F )?COTIS (?P<text>.*)'), 'bank'),
+                (re.compile('^\d+ (?P<text>.*)'), 'digits'),
+                (re.compile('^X*(?P<text>.*)'), 'empty'),
+               ]
+    assert PatternsMatcher.get_first_chars(patterns[0][0]) is None
+    assert PatternsMatcher.get_first_chars(patterns[1][0]) == set(u'V')
+    assert PatternsMatcher.get_first_chars(patterns[2][0]) == set(u'R')
+    assert PatternsMatcher.get_first_chars(patterns[3][0]) == set(u'FC')
+    assert PatternsMatcher.get_first_chars(patterns[5][0]) is None
+
+    matcher = PatternsMatcher(patterns)
+    for text in [u'VIR TOTO', u'VIR TOTO CARTE 12', u'REM CHQ 1', u'F COTIS X', u'COTIS X', u'12 X', u'', 'VIR TOTO']:
+        expected = None
+        for pattern, value in patterns:
+            if pattern.match(text):
+                expected = value
+                break
+        assert matcher.match(text)[1] == expected, text
@@ -20,12 +20,24 @@
 
 import hashlib
 import tempfile
+from StringIO import StringIO
+from threading import Lock
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageChops
 except ImportError:
     raise ImportError('Please install python-imaging')
 
+from weboob.tools.ordereddict import OrderedDict
+
+
+# fromstring() and tostring() are renamed in Pillow 2.0
+_frombytes = getattr(Image, 'frombytes', None) or Image.fromstring
+
+
+def _tobytes(img):
+    return img.tobytes() if hasattr(img, 'tobytes') else img.tostring()
+
 
 class VirtKeyboardError(Exception):
     def __init__(self, msg):
@@ -33,13 +45,30 @@ class VirtKeyboardError(Exception):
 
 
 class VirtKeyboard(object):
+    # Symbols found in the last keyboard images, by image and parameters.
+    # Set CACHE_SIZE to 0 to disable it.
+    CACHE_SIZE = 20
+    _cache = OrderedDict()
+    _cache_lock = Lock()
+
+    # modes with bands of 8 bits
+    BYTE_MODES = ('1', 'L', 'P', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr')
+
+    # mask pixel -> checksum character
+    CHECKSUM_TABLE = ''.join(chr(i) for i in xrange(256)).replace('\xff', '.').replace('\x00', ' ')
+
     def __init__(self, file, coords, color, convert=None):
         # file: virtual keyboard image
         # coords: dictionary <value to return>:<tuple(x1,y1,x2,y2)>
         # color: color of the symbols in the image
         #        depending on the image, it can be a single value or a tuple
         # convert: if not None, convert image to this target type (for example 'RGB')
-        img = Image.open(file)
+        if hasattr(file, 'read'):
+            data = file.read()
+        else:
+            with open(file, 'rb') as f:
+                data = f.read()
+        img = Image.open(StringIO(data))
 
         if convert is not None:
             img = img.convert(convert)
@@ -54,7 +83,18 @@ class VirtKeyboard(object):
         self.color = color
 
         (self.width, self.height) = img.size
+        self.img = img
         self.pixar = img.load()
+
+        key = (self.__class__, hashlib.md5(data).digest(), tuple(sorted(coords.iteritems())), color, convert)
+        with self._cache_lock:
+            cached = self._cache.pop(key, None)
+            if cached is not None:
+                self._cache[key] = cached
+        if cached is not None:
+            self.coords, self.md5 = dict(cached[0]), dict(cached[1])
+            return
+
         self.coords = {}
         self.md5 = {}
         for i in coords.keys():
@@ -64,48 +104,69 @@ class VirtKeyboard(object):
             self.coords[i] = coord
             self.md5[i] = self.checksum(self.coords[i])
 
+        if self.CACHE_SIZE > 0:
+            with self._cache_lock:
+                self._cache[key] = (dict(self.coords), dict(self.md5))
+                while len(self._cache) > self.CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+    @property
+    def mask(self):
+        """
+        Image in 'L' mode, where pixels matching :meth:`check_color` are
+        0xff and others 0.
+        """
+        try:
+            return self._mask
+        except AttributeError:
+            pass
+
+        self._mask = None
+        if self.check_color.__func__ is VirtKeyboard.check_color.__func__:
+            self._mask = self._get_color_mask()
+        if self._mask is None:
+            # check_color() is called only once per distinct color of image
+            colors = self.img.getcolors(self.width * self.height)
+            lookup = dict((color, '\xff' if self.check_color(color) else '\x00') for count, color in colors)
+            data = ''.join(map(lookup.__getitem__, self.img.getdata()))
+            self._mask = _frombytes('L', (self.width, self.height), data)
+        return self._mask
+
+    def _get_color_mask(self):
+        # Compare each band with the color in bulk, if bands are bytes and
+        # the color has the type of pixels: a number if there is only one
+        # band, else a tuple.
+        if len(self.bands) == 1:
+            color = (self.color,)
+        elif isinstance(self.color, tuple):
+            color = self.color
+        else:
+            return None
+        if self.img.mode not in self.BYTE_MODES or not all(isinstance(v, int) and 0 <= v <= 255 for v in color):
+            return None
+
+        img = self.img.convert('L') if self.img.mode == '1' else self.img
+        mask = None
+        for band, value in zip(img.split(), color):
+            data = _tobytes(band).translate('\x00' * value + '\xff' + '\x00' * (255 - value))
+            band = _frombytes('L', img.size, data)
+            mask = band if mask is None else ImageChops.darker(mask, band)
+        return mask
+
+    def _crop(self, (x1, y1, x2, y2)):
+        return self.mask.crop((x1, y1, min(x2 + 1, self.width), min(y2 + 1, self.height)))
+
     def check_color(self, pixel):
         return pixel == self.color
 
     def get_symbol_coords(self, (x1, y1, x2, y2)):
-        newY1 = -1
-        newY2 = -1
-        for y in range(y1, min(y2 + 1, self.height)):
-            empty_line = True
-            for x in range(x1, min(x2 + 1, self.width)):
-                if self.check_color(self.pixar[x, y]):
-                    empty_line = False
-                    if newY1 == -1:
-                        newY1 = y
-                        break
-                    else:
-                        break
-            if newY1 != -1 and not empty_line:
-                newY2 = y
-        newX1 = -1
-        newX2 = -1
-        for x in range(x1, min(x2 + 1, self.width)):
-            empty_column = True
-            for y in range(y1, min(y2 + 1, self.height)):
-                if self.check_color(self.pixar[x, y]):
-                    empty_column = False
-                    if newX1 == -1:
-                        newX1 = x
-                        break
-                    else:
-                        break
-            if newX1 != -1 and not empty_column:
-                newX2 = x
-        return (newX1, newY1, newX2, newY2)
+        bbox = self._crop((x1, y1, x2, y2)).getbbox()
+        if bbox is None:
+            return (-1, -1, -1, -1)
+        return (x1 + bbox[0], y1 + bbox[1], x1 + bbox[2] - 1, y1 + bbox[3] - 1)
 
     def checksum(self, (x1, y1, x2, y2)):
-        s = ''
-        for y in range(y1, min(y2 + 1, self.height)):
-            for x in range(x1, min(x2 + 1, self.width)):
-                if self.check_color(self.pixar[x, y]):
-                    s += "."
-                else:
-                    s += " "
+        s = _tobytes(self._crop((x1, y1, x2, y2))).translate(self.CHECKSUM_TABLE)
         return hashlib.md5(s).hexdigest()
 
     def get_symbol_code(self, md5sum):
@@ -154,3 +215,62 @@ class MappedVirtKeyboard(VirtKeyboard):
             coords[code] = tuple(area_coords)
 
         VirtKeyboard.__init__(self, file, coords, color, convert)
+
+
+def test():
+    from PIL import ImageDraw
+
+    img = Image.new('RGB', (200, 50), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    coords = {}
+    for i in xrange(10):
+        draw.text((i * 20 + 5, 15), str(i), fill=(0, 0, 0))
+        coords[str(i)] = (i * 20, 0, i * 20 + 19, 49)
+
+    def png(img):
+        f = StringIO()
+        img.save(f, 'PNG')
+        f.seek(0)
+        return f
+
+    def naive_symbols(vk):
+        # coords and checksums computed pixel by pixel, as before masks
+        symbols = {}
+        for code, (x1, y1, x2, y2) in coords.iteritems():
+            xs = xrange(x1, min(x2 + 1, vk.width))
+            ys = xrange(y1, min(y2 + 1, vk.height))
+            pixels = [(x, y) for y in ys for x in xs if vk.check_color(vk.pixar[x, y])]
+            if not pixels:
+                continue
+            x1, y1 = min(x for x, y in pixels), min(y for x, y in pixels)
+            x2, y2 = max(x for x, y in pixels), max(y for x, y in pixels)
+            s = ''.join('.' if vk.check_color(vk.pixar[x, y]) else ' '
+                        for y in xrange(y1, y2 + 1) for x in xrange(x1, x2 + 1))
+            symbols[code] = ((x1, y1, x2, y2), hashlib.md5(s).hexdigest())
+        return symbols
+
+    def check(img, color, convert=None, klass=VirtKeyboard):
+        # the second keyboard is read from cache
+        for i in xrange(2):
+            vk = klass(png(img), coords, color, convert)
+            symbols = naive_symbols(vk)
+            assert dict((code, (vk.coords[code], vk.md5[code])) for code in vk.coords) == symbols
+            for code in vk.coords:
+                assert vk.get_symbol_code(vk.md5[code]) == code
+        return symbols
+
+    assert sorted(check(img, (0, 0, 0))) == sorted(coords)
+    assert check(img, 0, 'L') == check(img, (0, 0, 0))
+
+    # pixels of palette images are indexes in palette
+    palette = img.convert('P', palette=Image.ADAPTIVE, colors=2)
+    black = palette.getpixel((0, 0)) ^ 1
+    assert check(palette, black) == check(img, (0, 0, 0))
+    # a tuple never matches them
+    assert check(palette, (black,)) == {}
+
+    # colors checked by a method of subclass
+    class GreyKeyboard(VirtKeyboard):
+        def check_color(self, pixel):
+            return max(pixel) < 128
+    assert check(img, (0, 0, 0), klass=GreyKeyboard) == check(img, (0, 0, 0))
@@ -19,15 +19,13 @@
 
 
 import warnings
-from time import time, sleep
-from tempfile import gettempdir
-import os
 import sys
 import traceback
 import types
 # keep compatibility
 from .date import local2utc, utc2local
 from .compat import unicode
+from .ratelimit import RateLimiter
 
 
 __all__ = ['get_backtrace', 'get_bytes_size', 'html2text', 'iter_fields',
@@ -129,25 +127,12 @@ def ratelimit(group, delay):
     This function is intended to be called just before the code that should be
     rate-limited.
 
-    This function is not thread-safe. For reasonably non-critical rate
-    limiting (like accessing a website), it should be sufficient nevertheless.
+    See :class:`weboob.tools.ratelimit.RateLimiter` for a limiter allowing
+    bursts.
 
     @param group [string]  rate limiting group name, alphanumeric
     @param delay [int]  delay in seconds between each call
     """
-
-    path = os.path.join(gettempdir(), 'weboob_ratelimit.%s' % group)
-    while True:
-        try:
-            offset = time() - os.stat(path).st_mtime
-        except OSError:
-            with open(path, 'w'):
-                pass
-            offset = 0
-
-        if delay < offset:
-            break
-
-        sleep(delay - offset)
-
-    os.utime(path, None)
+    if delay <= 0:
+        return
+    RateLimiter.get(group, 1. / delay).acquire()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import errno
+import os
+import re
+import stat
+from tempfile import gettempdir
+from threading import Lock
+from time import time, sleep
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from weboob.tools.log import getLogger
+
+
+__all__ = ['RateLimit', 'RateLimiter']
+
+
+def _get_buckets_dir():
+    """
+    Get the directory where buckets of the user are stored, or None if it
+    can't be used safely.
+    """
+    path = os.path.join(gettempdir(), 'weboob_ratelimit.%d' % os.getuid())
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            return None
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    # The directory may have been created by another user.
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None
+    return path
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the rate of an action.
+
+    The bucket holds at most *burst* tokens, and is refilled with *rate*
+    tokens per second. Each call to :meth:`acquire` takes a token, waiting
+    for it if the bucket is empty.
+
+    The bucket is shared between threads, and if possible between processes
+    of the same user, as its state is stored in a file of a private
+    directory in the temporary directory, locked with flock(). Every users
+    of the same group should use the same rate and burst.
+
+    Use :meth:`get` to get the limiter of a group, shared by the process.
+
+    :param group: name of the limited group of actions
+    :type group: :class:`str`
+    :param rate: number of actions per second
+    :type rate: :class:`float`
+    :param burst: number of actions which can be done without waiting
+    :type burst: :class:`int`
+    :param path: file storing the state of bucket; by default it depends on
+                 the group name
+    :type path: :class:`str`
+    """
+
+    _instances = {}
+    _instances_lock = Lock()
+
+    def __init__(self, group, rate, burst=1, path=None):
+        assert rate > 0 and burst >= 1
+
+        self.logger = getLogger('ratelimit')
+        self.group = group
+        self.rate = float(rate)
+        self.burst = burst
+        if path is None and fcntl is not None:
+            dirname = _get_buckets_dir()
+            if dirname is None:
+                self.logger.warning('Unable to use a private directory to share rate limit of %s with other processes' % group)
+            else:
+                path = os.path.join(dirname, '%s.bucket' % re.sub(r'[^\w.-]', '_', group))
+        self.path = path if fcntl is not None else None
+
+        self.lock = Lock()
+        self.tokens = float(burst)
+        self.updated = time()
+
+    @classmethod
+    def get(cls, group, rate, burst=1):
+        """
+        Get the limiter of a group, shared by the whole process.
+        """
+        with cls._instances_lock:
+            try:
+                return cls._instances[(group, rate, burst)]
+            except KeyError:
+                limiter = cls._instances[(group, rate, burst)] = cls(group, rate, burst)
+                return limiter
+
+    def _take(self, now):
+        self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = now
+        # A negative number of tokens reserves the next ones, so concurrent
+        # callers don't have to check the bucket again after waiting.
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def _take_shared(self, now):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+        try:
+            if os.fstat(fd).st_uid != os.getuid():
+                raise OSError(errno.EPERM, 'File is owned by another user', self.path)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                self.tokens, self.updated = [float(v) for v in os.read(fd, 64).split()]
+            except ValueError:
+                # new or corrupted file
+                self.tokens, self.updated = float(self.burst), now
+
+            wait = self._take(now)
+
+            data = '%r %r' % (self.tokens, self.updated)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+            return wait
+        finally:
+            # closing the file releases the lock
+            os.close(fd)
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available.
+
+        :returns: number of seconds waited
+        :rtype: :class:`float`
+        """
+        with self.lock:
+            now = time()
+            if self.path is not None:
+                try:
+                    wait = self._take_shared(now)
+                except (IOError, OSError) as e:
+                    self.logger.warning('Unable to share rate limit of %s with other processes: %s' % (self.group, e))
+                    self.path = None
+            if self.path is None:
+                wait = self._take(now)
+
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+
+class RateLimit(object):
+    """
+    Rate limit of the requests of a browser.
+
+    Set it in the ``RATE_LIMIT`` attribute of a browser class. Requests are
+    limited per host by default, and every browsers (of any class, in any
+    thread or process) doing requests to the same host share the limit::
+
+        class Browser(BaseBrowser):
+            RATE_LIMIT = RateLimit(2, burst=5)
+
+    :param rate: number of requests per second
+    :type rate: :class:`float`
+    :param burst: number of requests which can be done without waiting
+    :type burst: :class:`int`
+    :param group: name of the group of requests sharing the limit; by
+                  default, the host of the URL
+    :type group: :class:`str`
+    """
+
+    def __init__(self, rate, burst=1, group=None):
+        self.rate = rate
+        self.burst = burst
+        self.group = group
+
+    def get_group(self, url):
+        return self.group or urlparse(url).hostname or 'default'
+
+    def wait(self, url):
+        """
+        Wait until a request on this URL can be done.
+
+        :returns: number of seconds waited
+        :rtype: :class:`float`
+        """
+        return RateLimiter.get(self.get_group(url), self.rate, self.burst).acquire()
+
+
+def test():
+    import shutil
+    import tempfile
+    from threading import Thread
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_ratelimit_')
+    try:
+        path = os.path.join(tmpdir, 'bucket')
+        limiter = RateLimiter('test', 20, burst=3, path=path)
+
+        # burst
+        start = time()
+        for i in xrange(3):
+            limiter.acquire()
+        assert time() - start < 0.04
+
+        # threads share the rate
+        threads = [Thread(target=limiter.acquire) for i in xrange(4)]
+        start = time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time() - start >= 0.15
+
+        # another instance using the same file shares the bucket
+        if fcntl is not None:
+            other = RateLimiter('test', 20, burst=3, path=path)
+            assert other.acquire() > 0
+
+            # a symlink is not followed
+            target = os.path.join(tmpdir, 'target')
+            with open(target, 'w') as f:
+                f.write('data')
+            link = os.path.join(tmpdir, 'link')
+            os.symlink(target, link)
+            limiter = RateLimiter('test', 20, burst=3, path=link)
+            limiter.acquire()
+            assert limiter.path is None
+            with open(target) as f:
+                assert f.read() == 'data'
+
+            assert RateLimiter('test', 20).path.startswith(_get_buckets_dir())
+    finally:
+        shutil.rmtree(tmpdir)
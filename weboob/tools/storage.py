@@ -18,11 +18,187 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+import sqlite3
 from copy import deepcopy
+from threading import RLock
+from time import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
+from .config.iconfig import ConfigError
 from .config.yamlconfig import YamlConfig
 
 
+__all__ = ['IStorage', 'StandardStorage', 'SQLiteStorage']
+
+
+_MISSING = object()
+
+
+def _changing(method):
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._changed()
+        return result
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class _ListHead(object):
+    """
+    Value of the row of a list, which items are stored in their own rows.
+    """
+
+
+class _ListRows(dict):
+    """
+    Items of a list read from database, by index.
+    """
+    @classmethod
+    def restore(cls, value):
+        if isinstance(value, cls):
+            return [cls.restore(value[i]) for i in sorted(value)]
+        if isinstance(value, dict):
+            for key, sub in value.iteritems():
+                if isinstance(sub, dict):
+                    value[key] = cls.restore(sub)
+        return value
+
+
+class _Tracked(object):
+    """
+    Container returned by :meth:`SQLiteStorage.get`, which tells the
+    storage the path to save when it is changed in place.
+
+    Containers stored in a list or a set are saved with it, so they track
+    the path of this list or of this leaf.
+    """
+    # (storage, what, name, path, in a leaf)
+    _tracking = None
+
+    def _changed(self, *keys):
+        storage, what, name, path, leaf = self._tracking
+        storage._touch(what, name, path if leaf else path + keys)
+
+    def _wrap_child(self, value, *keys):
+        storage, what, name, path, leaf = self._tracking
+        if leaf or not isinstance(self, dict):
+            return storage._wrap(what, name, path, value, True)
+        return storage._wrap(what, name, path + keys, value)
+
+
+class _TrackedDict(_Tracked, dict):
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, self._wrap_child(value, key))
+        self._changed(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._removed(key)
+
+    def _removed(self, key):
+        self._changed(key)
+        if len(self) == 0:
+            # an empty dict is stored as a leaf
+            self._changed()
+
+    def pop(self, key, *args):
+        removed = key in self
+        value = dict.pop(self, key, *args)
+        if removed:
+            self._removed(key)
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._removed(item[0])
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    clear = _changing(dict.clear)
+
+    def __reduce_ex__(self, protocol):
+        # stored as a dict
+        return (dict, (dict(self),))
+
+
+class _TrackedList(_Tracked, list):
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [self._wrap_child(v) for v in value]
+        else:
+            value = self._wrap_child(value)
+        list.__setitem__(self, index, value)
+        self._changed()
+
+    def __setslice__(self, i, j, values):
+        list.__setslice__(self, i, j, [self._wrap_child(v) for v in values])
+        self._changed()
+
+    def _appended(self, start):
+        # only rows of new items are written
+        for index in xrange(start, len(self)):
+            self._changed(index)
+
+    def append(self, value):
+        list.append(self, self._wrap_child(value))
+        self._appended(len(self) - 1)
+
+    def insert(self, index, value):
+        list.insert(self, index, self._wrap_child(value))
+        self._changed()
+
+    def extend(self, values):
+        start = len(self)
+        list.extend(self, [self._wrap_child(v) for v in values])
+        self._appended(start)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    __delitem__ = _changing(list.__delitem__)
+    __delslice__ = _changing(list.__delslice__)
+    __imul__ = _changing(list.__imul__)
+    pop = _changing(list.pop)
+    remove = _changing(list.remove)
+    reverse = _changing(list.reverse)
+    sort = _changing(list.sort)
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+
+class _TrackedSet(_Tracked, set):
+    add = _changing(set.add)
+    discard = _changing(set.discard)
+    remove = _changing(set.remove)
+    pop = _changing(set.pop)
+    clear = _changing(set.clear)
+    update = _changing(set.update)
+    difference_update = _changing(set.difference_update)
+    intersection_update = _changing(set.intersection_update)
+    symmetric_difference_update = _changing(set.symmetric_difference_update)
+    __ior__ = _changing(set.__ior__)
+    __iand__ = _changing(set.__iand__)
+    __isub__ = _changing(set.__isub__)
+    __ixor__ = _changing(set.__ixor__)
+
+    def __reduce_ex__(self, protocol):
+        return (set, (list(self),))
+
+
 class IStorage(object):
     def load(self, what, name, default={}):
         """
@@ -81,3 +257,485 @@ class StandardStorage(IStorage):
 
     def get(self, what, name, *args, **kwargs):
         return self.config.get(what, name, *args, **kwargs)
+
+
+class SQLiteStorage(IStorage):
+    """
+    Storage in a SQLite database.
+
+    Each backend or application has its own namespace, read from an index
+    when it is loaded. The tree is stored with a row per leaf, and long
+    lists with a row per item, so :meth:`save` only writes the paths which
+    have been changed since the previous save, in one transaction, instead
+    of the whole file. For example, appending an item to a long list only
+    writes the row of this item.
+
+    Like :class:`StandardStorage`, :meth:`get` returns the stored object,
+    and changes made in place on it are saved too: dicts, lists and sets
+    returned by :meth:`get` are replaced in the tree by subclasses which
+    record the paths they change, so reading a subtree doesn't make the
+    next save write it.
+
+    :param path: path of the database
+    :type path: :class:`str`
+    :param commit_interval: minimal number of seconds between two commits.
+                            Saved changes are committed when this delay is
+                            expired, or by :meth:`commit` and :meth:`close`
+    :type commit_interval: :class:`float`
+    """
+
+    SEP = u'\x1f'
+    # lists with at least this number of items are stored with a row per
+    # item, and smaller ones in one row
+    LIST_ROWS = 64
+
+    def __init__(self, path, commit_interval=0):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.lock = RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS storage ('
+                        'what TEXT NOT NULL, name TEXT NOT NULL, key TEXT NOT NULL, '
+                        'path BLOB NOT NULL, value BLOB NOT NULL, '
+                        'PRIMARY KEY (what, name, key))')
+        self.db.commit()
+        self.last_commit = time()
+
+        # (what, name) -> tree
+        self.values = {}
+        # (what, name) -> set of paths to write on save
+        self.dirty = {}
+
+    @staticmethod
+    def get_key_part(a):
+        if isinstance(a, str):
+            try:
+                a = a.decode('ascii')
+            except UnicodeDecodeError:
+                pass
+        return repr(a).decode('ascii')
+
+    @classmethod
+    def get_key(cls, path):
+        return cls.SEP.join([cls.get_key_part(a) for a in path])
+
+    @staticmethod
+    def dumps(obj):
+        return sqlite3.Binary(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def loads(data):
+        return pickle.loads(str(data))
+
+    def _tree(self, what, name):
+        try:
+            return self.values[(what, name)]
+        except KeyError:
+            self.load(what, name)
+            return self.values[(what, name)]
+
+    def _touch(self, what, name, path):
+        with self.lock:
+            self.dirty.setdefault((what, name), set()).add(tuple(path))
+
+    def _wrap(self, what, name, path, value, leaf=False):
+        """
+        Get a tracked copy of a dict, a list or a set stored at *path*, and
+        of containers in it.
+        """
+        tracking = (self, what, name, path, leaf)
+        if isinstance(value, _Tracked) and value._tracking == tracking:
+            return value
+
+        if type(value) in (dict, _TrackedDict):
+            tracked = _TrackedDict()
+            tracked._tracking = tracking
+            for key, sub in value.iteritems():
+                dict.__setitem__(tracked, key, self._wrap(what, name, path if leaf else path + (key,), sub, leaf))
+        elif type(value) in (list, _TrackedList):
+            tracked = _TrackedList()
+            tracked._tracking = tracking
+            list.extend(tracked, [self._wrap(what, name, path, sub, True) for sub in value])
+        elif type(value) in (set, _TrackedSet):
+            tracked = _TrackedSet(value)
+            tracked._tracking = tracking
+        else:
+            return value
+        return tracked
+
+    def load(self, what, name, default={}):
+        with self.lock:
+            d = {}
+            cursor = self.db.execute('SELECT path, value FROM storage WHERE what = ? AND name = ? ORDER BY key',
+                                     (what, name))
+            for path, value in cursor:
+                path = self.loads(path)
+                value = self.loads(value)
+                if isinstance(value, _ListHead):
+                    value = _ListRows()
+                if not path:
+                    d = value
+                    continue
+                v = d
+                for a in path[:-1]:
+                    v = v.setdefault(a, {})
+                if isinstance(value, _ListRows):
+                    # rows of items may be read before the one of the list
+                    value.update(v.get(path[-1], {}))
+                v[path[-1]] = value
+            d = _ListRows.restore(d)
+
+            self.values[(what, name)] = deepcopy(default)
+            self.values[(what, name)].update(d)
+            self.dirty.pop((what, name), None)
+            # default values are stored on the next save
+            for key in default:
+                if key not in d:
+                    self._touch(what, name, (key,))
+
+    def save(self, what, name):
+        with self.lock:
+            paths = self.dirty.pop((what, name), None)
+            tree = self.values.get((what, name))
+            if paths and tree is not None:
+                roots = set()
+                for path in sorted(paths, key=len):
+                    if not any(path[:i] in roots for i in xrange(len(path))):
+                        roots.add(path)
+                for path in roots:
+                    self._write(what, name, tree, path)
+
+            if time() - self.last_commit >= self.commit_interval:
+                self.commit()
+
+    def _flatten(self, path, value):
+        """
+        Get (key, path, value) rows of leaves of a tree, and of items of
+        lists.
+        """
+        rows = []
+        stack = [(self.get_key(path), path, value)]
+        while stack:
+            key, path, value = stack.pop()
+            prefix = key + self.SEP if path else key
+            if isinstance(value, dict) and len(value) > 0:
+                for a, sub in value.iteritems():
+                    stack.append((prefix + self.get_key_part(a), path + (a,), sub))
+            elif isinstance(value, list) and len(value) >= self.LIST_ROWS:
+                rows.append((key, path, _ListHead()))
+                for a, sub in enumerate(value):
+                    stack.append((prefix + self.get_key_part(a), path + (a,), sub))
+            else:
+                rows.append((key, path, value))
+        return rows
+
+    def _is_stored_as_list(self, what, name, path):
+        cursor = self.db.execute('SELECT value FROM storage WHERE what = ? AND name = ? AND key = ?',
+                                 (what, name, self.get_key(path)))
+        row = cursor.fetchone()
+        return row is not None and isinstance(self.loads(row[0]), _ListHead)
+
+    def _write(self, what, name, tree, path):
+        v = tree
+        # containers of the value
+        ancestors = []
+        for i, a in enumerate(path):
+            if isinstance(v, list) and self._is_stored_as_list(what, name, path[:i]):
+                ancestors.append(v)
+                if isinstance(a, (int, long)) and 0 <= a < len(v):
+                    v = v[a]
+                    continue
+                v = _MISSING
+                break
+            if not isinstance(v, dict):
+                # stored as a whole with its first ancestor which is not a
+                # dict or a list stored item by item
+                path = path[:i]
+                break
+            ancestors.append(v)
+            try:
+                v = v[a]
+            except KeyError:
+                v = _MISSING
+                break
+
+        key = self.get_key(path)
+        if path:
+            cursor = self.db.execute('SELECT key, value FROM storage WHERE what = ? AND name = ? '
+                                     'AND (key = ? OR (key >= ? AND key < ?))',
+                                     (what, name, key, key + self.SEP, key + unichr(ord(self.SEP) + 1)))
+        else:
+            cursor = self.db.execute('SELECT key, value FROM storage WHERE what = ? AND name = ?', (what, name))
+        old = dict(cursor)
+
+        new = {}
+        if v is not _MISSING:
+            for k, p, value in self._flatten(path, v):
+                new[k] = (p, self.dumps(value))
+            # ancestors are not leaves anymore
+            self.db.executemany('DELETE FROM storage WHERE what = ? AND name = ? AND key = ?',
+                                [(what, name, self.get_key(path[:i])) for i in xrange(len(path))
+                                 if not isinstance(ancestors[i], list)])
+
+        self.db.executemany('DELETE FROM storage WHERE what = ? AND name = ? AND key = ?',
+                            [(what, name, k) for k in old if k not in new])
+        self.db.executemany('INSERT OR REPLACE INTO storage (what, name, key, path, value) VALUES (?, ?, ?, ?, ?)',
+                            [(what, name, k, self.dumps(p), value) for k, (p, value) in new.iteritems()
+                             if old.get(k) != value])
+
+    def set(self, what, name, *args):
+        with self.lock:
+            if len(args) == 1:
+                self.values[(what, name)] = args[0]
+                self._touch(what, name, ())
+                return
+
+            v = self._tree(what, name)
+            for a in args[:-2]:
+                try:
+                    v = v[a]
+                except KeyError:
+                    v[a] = {}
+                    v = v[a]
+                except TypeError:
+                    raise ConfigError()
+
+            v[args[-2]] = args[-1]
+            self._touch(what, name, args[:-1])
+
+    def delete(self, what, name, *args):
+        with self.lock:
+            if not args:
+                self.values[(what, name)] = {}
+                self._touch(what, name, ())
+                return
+
+            v = self._tree(what, name)
+            for a in args[:-1]:
+                try:
+                    v = v[a]
+                except KeyError:
+                    return
+                except TypeError:
+                    raise ConfigError()
+
+            v.pop(args[-1], None)
+            self._touch(what, name, args)
+            if len(v) == 0:
+                # an empty dict is stored as a leaf
+                self._touch(what, name, args[:-1])
+
+    def get(self, what, name, *args, **kwargs):
+        with self.lock:
+            v = self._tree(what, name)
+            # length of the path of the leaf which contains the value
+            leaf = None
+            for i, a in enumerate(args[:-1]):
+                if leaf is None and not isinstance(v, dict):
+                    leaf = i
+                try:
+                    v = v[a]
+                except KeyError:
+                    if 'default' in kwargs:
+                        v[a] = {}
+                        v = v[a]
+                        self._touch(what, name, args[:i + 1])
+                    else:
+                        raise ConfigError()
+                except TypeError:
+                    raise ConfigError()
+
+            parent = v
+            if args:
+                if leaf is None and not isinstance(v, dict):
+                    leaf = len(args) - 1
+                try:
+                    v = v[args[-1]]
+                except KeyError:
+                    return kwargs.get('default')
+
+            # It may be changed in place by caller.
+            if leaf is None:
+                tracked = self._wrap(what, name, tuple(args), v)
+            else:
+                tracked = self._wrap(what, name, tuple(args[:leaf]), v, True)
+            if tracked is not v:
+                if not args:
+                    self.values[(what, name)] = tracked
+                elif isinstance(parent, dict):
+                    dict.__setitem__(parent, args[-1], tracked)
+                elif isinstance(parent, list):
+                    list.__setitem__(parent, args[-1], tracked)
+                else:
+                    # can't be replaced, in a tuple for example
+                    self._touch(what, name, args[:leaf])
+                    return v
+                v = tracked
+            return v
+
+    def commit(self):
+        """
+        Commit saved changes in database.
+        """
+        with self.lock:
+            self.db.commit()
+            self.last_commit = time()
+
+    def close(self):
+        """
+        Commit saved changes and close database.
+        """
+        with self.lock:
+            self.commit()
+            self.db.close()
+
+    def import_yaml(self, path):
+        """
+        Import data from a file of :class:`StandardStorage`.
+
+        Namespaces already in database are replaced.
+
+        :param path: path of the YAML file
+        :type path: :class:`str`
+        :returns: number of imported namespaces
+        :rtype: :class:`int`
+        """
+        if not os.path.exists(path):
+            raise IOError('%s does not exist' % path)
+
+        config = YamlConfig(path)
+        config.load()
+
+        count = 0
+        with self.lock:
+            for what, names in config.values.iteritems():
+                for name, tree in names.iteritems():
+                    self.values[(what, name)] = tree
+                    self._write(what, name, tree, ())
+                    count += 1
+            self.commit()
+        return count
+
+
+def test():
+    import shutil
+    import tempfile
+
+    class Storage(SQLiteStorage):
+        # store every lists item by item
+        LIST_ROWS = 1
+
+    tmpdir = tempfile.mkdtemp(prefix='weboob_storage_')
+    try:
+        path = os.path.join(tmpdir, 'test.db')
+        storage = Storage(path)
+        storage.load('backends', 'a', {'seen': [], 'threads': {}})
+        storage.load('backends', 'b', {'seen': []})
+        storage.set('backends', 'a', 'threads', 'foo', 'comments', [1, 2])
+        storage.set('backends', 'a', 'threads', 42, 'comments', [3])
+        storage.get('backends', 'a', 'seen').append('foo')
+        storage.set('backends', 'b', 'seen', ['bar'])
+        storage.save('backends', 'a')
+        storage.save('backends', 'b')
+        storage.delete('backends', 'a', 'threads', 'foo')
+        storage.save('backends', 'a')
+        storage.close()
+
+        storage = Storage(path)
+        storage.load('backends', 'a', {'seen': [], 'threads': {}, 'other': 0})
+        assert storage.get('backends', 'a') == {'seen': ['foo'], 'threads': {42: {'comments': [3]}}, 'other': 0}
+        assert storage.get('backends', 'b', 'seen') == ['bar']
+        storage.delete('backends', 'a', 'threads', 42)
+        storage.save('backends', 'a')
+        storage.close()
+
+        storage = Storage(path)
+        storage.load('backends', 'a')
+        assert storage.get('backends', 'a') == {'seen': ['foo'], 'threads': {}, 'other': 0}
+        # reading doesn't make the next save write anything
+        assert not storage.dirty
+        # but changes made in place are saved, even after a first save
+        seen = storage.get('backends', 'a', 'seen')
+        storage.save('backends', 'a')
+        seen.append('bar')
+        threads = storage.get('backends', 'a', 'threads')
+        threads[7] = {'comments': []}
+        storage.get('backends', 'a', 'threads', 7, 'comments').append([1])
+        threads[7]['comments'][0].append(2)
+        storage.get('backends', 'a')['other'] = set([1])
+        storage.get('backends', 'a', 'other').add(2)
+        # appending to a list only marks the new item
+        assert storage.dirty == {('backends', 'a'): set([('seen', 1), ('threads', 7), ('threads', 7, 'comments'),
+                                                         ('threads', 7, 'comments', 0), ('other',)])}
+        storage.save('backends', 'a')
+        storage.close()
+
+        storage = Storage(path)
+        storage.load('backends', 'a')
+        a = storage.get('backends', 'a')
+        assert a == {'seen': ['foo', 'bar'], 'threads': {7: {'comments': [[1, 2]]}}, 'other': set([1, 2])}
+        # containers are stored as builtin types
+        assert type(pickle.loads(pickle.dumps(a, pickle.HIGHEST_PROTOCOL))['threads'][7]['comments']) is list
+        assert type(deepcopy(a)['other']) is set
+
+        # items of lists have their own rows, so appending one writes one row
+        changes = storage.db.total_changes
+        a['seen'].append('baz')
+        storage.save('backends', 'a')
+        assert storage.db.total_changes == changes + 1
+        storage.set('backends', 'a', 'seen', ['foo', 'baz'])
+        storage.save('backends', 'a')
+        storage.close()
+
+        storage = Storage(path)
+        storage.load('backends', 'a')
+        assert storage.get('backends', 'a', 'seen') == ['foo', 'baz']
+        assert storage.get('backends', 'a', 'threads', 7, 'comments') == [[1, 2]]
+        storage.close()
+
+        # lists stored as a whole are stored item by item on the next change
+        db = sqlite3.connect(path)
+        db.execute('DELETE FROM storage WHERE name = ? AND key LIKE ?', ('a', SQLiteStorage.get_key(('seen',)) + '%'))
+        db.execute('INSERT INTO storage VALUES (?, ?, ?, ?, ?)',
+                   ('backends', 'a', SQLiteStorage.get_key(('seen',)), SQLiteStorage.dumps(('seen',)),
+                    SQLiteStorage.dumps(['foo'])))
+        db.commit()
+        db.close()
+        storage = Storage(path)
+        storage.load('backends', 'a')
+        storage.get('backends', 'a', 'seen').append('bar')
+        storage.save('backends', 'a')
+        storage.close()
+        storage = Storage(path)
+        storage.load('backends', 'a')
+        assert storage.get('backends', 'a', 'seen') == ['foo', 'bar']
+        storage.close()
+
+        # short lists are stored in one row
+        storage = SQLiteStorage(path)
+        storage.load('backends', 'a')
+        storage.set('backends', 'a', 'seen', ['foo', 'bar', 'baz'])
+        storage.save('backends', 'a')
+        cursor = storage.db.execute('SELECT COUNT(*) FROM storage WHERE name = ? AND key LIKE ?',
+                                    ('a', SQLiteStorage.get_key(('seen',)) + '%'))
+        assert cursor.fetchone()[0] == 1
+        storage.close()
+        storage = SQLiteStorage(path)
+        storage.load('backends', 'a')
+        assert storage.get('backends', 'a', 'seen') == ['foo', 'bar', 'baz']
+        storage.close()
+
+        yaml = StandardStorage(os.path.join(tmpdir, 'test.storage'))
+        yaml.load('applications', 'app', {'bookmarks': ['x']})
+        yaml.set('backends', 'c', 'seen', u'é', True)
+        yaml.save('backends', 'c')
+
+        storage = Storage(path)
+        assert storage.import_yaml(yaml.config.path) == 2
+        storage.load('backends', 'c')
+        assert storage.get('backends', 'c', 'seen', u'é') is True
+        storage.load('applications', 'app')
+        assert storage.get('applications', 'app', 'bookmarks') == ['x']
+        storage.close()
+    finally:
+        shutil.rmtree(tmpdir)